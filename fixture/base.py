@@ -5,6 +5,9 @@ The more useful bits are in :mod:`fixture.loadable`
 
 """
 import sys, traceback
+import threading
+import Queue
+import gc, weakref
 try:
     from functools import wraps
 except ImportError:
@@ -18,7 +21,7 @@ except ImportError:
             return new_f
         return wrap_with_f
         
-from fixture.dataset import SuperSet
+from fixture.dataset import SuperSet, dataset_registry
 from compiler.consts import CO_GENERATOR
 
 def is_generator(func):
@@ -27,18 +30,187 @@ def is_generator(func):
     except AttributeError:
         return False
 
+def count_objects():
+    """returns {type name: number of live objects} after collecting garbage.
+    
+    Only objects tracked by the garbage collector are counted, i.e. 
+    instances, containers and classes but not strings or numbers.
+    """
+    gc.collect()
+    counts = {}
+    for obj in gc.get_objects():
+        try:
+            cls = obj.__class__
+        except Exception:
+            cls = type(obj)
+        name = "%s.%s" % (getattr(cls, '__module__', '?'), 
+                          getattr(cls, '__name__', repr(cls)))
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def _growth(before, after):
+    growth = {}
+    for name, count in after.items():
+        count = count - before.get(name, 0)
+        if count > 0:
+            growth[name] = count
+    return growth
+
+class MemoryReport(object):
+    """Accounts for objects created by :meth:`FixtureData.setup` and kept 
+    after :meth:`FixtureData.teardown`.
+    
+    It is made for each setup when the fixture was created with 
+    ``track_memory=True`` and is available as ``data.memory``.  Live objects 
+    are counted by type before setup, after setup and after teardown (see 
+    :func:`count_objects`), and each loaded DataSet and its stored objects 
+    are watched with weak references.  Counting walks every object in the 
+    process so only turn this on to find a leak.
+    """
+    def __init__(self):
+        self.before_setup = None
+        self.after_setup = None
+        self.after_teardown = None
+        self._watched = []
+    
+    def __str__(self):
+        lines = []
+        if self.after_setup is not None:
+            lines.append("loaded by setup:")
+            lines.extend(self._format(self.loaded()))
+        if self.after_teardown is not None:
+            lines.append("retained after teardown:")
+            lines.extend(self._format(self.retained()))
+            lines.append("retained DataSets (stored objects alive):")
+            lines.extend(self._format(self.retained_datasets()))
+        return "\n".join(lines)
+    
+    def _format(self, counts):
+        items = [(count, name) for name, count in counts.items()]
+        items.sort()
+        items.reverse()
+        return ["  %6d %s" % (count, name) for count, name in items]
+    
+    def setup_started(self):
+        """counts objects before loading"""
+        self.before_setup = count_objects()
+    
+    def setup_finished(self, datasets):
+        """counts objects after loading and watches the loaded datasets"""
+        self.after_setup = count_objects()
+        self._watched = []
+        for ds in datasets:
+            objects = []
+            for obj in ds.meta._stored_objects or []:
+                try:
+                    objects.append(weakref.ref(obj))
+                except TypeError:
+                    # i.e. a dict or a tuple
+                    pass
+            self._watched.append(
+                    (ds.__class__.__name__, weakref.ref(ds), objects))
+    
+    def teardown_finished(self):
+        """counts objects after unloading"""
+        self.after_teardown = count_objects()
+    
+    def loaded(self):
+        """returns {type name: number of objects} created by setup"""
+        return _growth(self.before_setup, self.after_setup)
+    
+    def retained(self):
+        """returns {type name: number of objects} created by setup that were 
+        still alive after teardown"""
+        return _growth(self.before_setup, self.after_teardown)
+    
+    def retained_datasets(self):
+        """returns {DataSet class name: number of stored objects alive} for 
+        each loaded DataSet that is still alive or has stored objects alive.
+        
+        Unlike the counts, this is checked when called.
+        """
+        gc.collect()
+        retained = {}
+        for name, ds_ref, objects in self._watched:
+            alive = len([o for o in objects if o() is not None])
+            if alive or ds_ref() is not None:
+                retained[name] = retained.get(name, 0) + alive
+        return retained
+
+class Worker(object):
+    """Runs calls one at a time on a thread of its own, until stopped.
+    
+    Connections to some databases, i.e. SQLite, can only be used by the 
+    thread that made them, so data loaded in the background is unloaded by 
+    the same worker.
+    """
+    def __init__(self):
+        self._calls = Queue.Queue()
+        self._thread = threading.Thread(target=self._work)
+        self._thread.setDaemon(True)
+        self._thread.start()
+    
+    def _work(self):
+        while True:
+            call = self._calls.get()
+            if call is None:
+                return
+            call()
+    
+    def submit(self, func):
+        """starts calling func on the worker's thread.
+        
+        Returns a function that waits for the call to finish and returns 
+        its result or raises its exception.
+        """
+        done = threading.Event()
+        outcome = {}
+        def call():
+            try:
+                outcome['result'] = func()
+            except:
+                outcome['error'] = sys.exc_info()
+            done.set()
+        self._calls.put(call)
+        def wait():
+            done.wait()
+            if 'error' in outcome:
+                etype, val, tb = outcome.pop('error')
+                raise etype, val, tb
+            return outcome.get('result')
+        return wait
+    
+    def stop(self):
+        """lets the thread finish once the calls submitted so far are done"""
+        self._calls.put(None)
+        self._thread.join()
+
 class FixtureData(object):
     """
     Loads one or more DataSet objects and provides an interface into that 
     data.
     
     Typically this is attached to a concrete Fixture class and constructed by ``data = fixture.data(...)``
+    
+    If ``track_memory`` is True, each setup creates a :class:`MemoryReport` 
+    in ``self.memory``.
+    
+    If the loader counts statements (i.e. with ``count_statements=True``), 
+    ``self.statements`` is the :class:`StatementCounter 
+    <fixture.loadable.loadable.StatementCounter>` of the last setup; 
+    teardown adds the statements made to unload to it.
     """
     def __init__(self, datasets, dataclass, loader):
         self.datasets = datasets
         self.dataclass = dataclass
         self.loader = loader
         self.data = None # instance of dataclass
+    
+    _worker = None
+    _pending = None
+    track_memory = False
+    memory = None
+    statements = None
 
     def __enter__(self):
         """enter a with statement block.
@@ -65,14 +237,177 @@ class FixtureData(object):
 
     def setup(self):
         """load all datasets, populating self.data."""
-        self.data = self.dataclass(*[
-                    ds.shared_instance( default_refclass=self.dataclass ) \
-                        for ds in iter(self.datasets)])
+        # a loader may keep shared DataSet instances in its own registry :
+        registry = getattr(self.loader, 'dataset_registry', None)
+        if self.track_memory:
+            self.memory = MemoryReport()
+            self.memory.setup_started()
+        if registry is not None:
+            dataset_registry.push(registry)
+        try:
+            self.data = self.dataclass(*[
+                        ds.shared_instance( default_refclass=self.dataclass ) \
+                            for ds in iter(self.datasets)])
+        finally:
+            if registry is not None:
+                dataset_registry.pop()
         self.loader.load(self.data)
+        self.statements = getattr(self.loader, 'statements', None)
+        if self.track_memory:
+            self.memory.setup_finished(self._loaded_datasets())
+    
+    def _loaded_datasets(self):
+        loaded = getattr(self.loader, 'loaded', None)
+        if loaded is not None and hasattr(loaded, 'unload_order'):
+            return loaded.unload_order()
+        return self.data.meta.datasets.values()
+
+    def setup_in_background(self):
+        """starts loading all datasets on a new thread and returns self.
+        
+        Call :meth:`wait` before using the data (:meth:`teardown` waits 
+        too).  The DataSet registry of the calling thread is used while 
+        loading, so leave shared DataSet instances alone until then.  The 
+        thread is kept (see :class:`Worker`) so that :meth:`teardown` 
+        unloads the data on it.
+        """
+        if self._worker is not None:
+            raise ValueError("%s is already set up in the background" % self)
+        self._worker = Worker()
+        self._pending = self._worker.submit(
+                        self._with_registry(self.setup))
+        return self
+    
+    def _with_registry(self, func):
+        # runs func with the DataSet registry of the calling thread
+        registry = dataset_registry.current()
+        def call():
+            dataset_registry.push(registry)
+            try:
+                return func()
+            finally:
+                dataset_registry.pop()
+        return call
+    
+    def _stop_worker(self):
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.stop()
+    
+    def wait(self):
+        """waits for :meth:`setup_in_background` to finish.
+        
+        If loading failed, its exception is raised here.
+        """
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        try:
+            pending()
+        except:
+            # nothing is left to unload on the thread :
+            etype, val, tb = sys.exc_info()
+            self._stop_worker()
+            raise etype, val, tb
 
     def teardown(self):
-        """unload all datasets."""
+        """unload all datasets.
+        
+        Data set up with :meth:`setup_in_background` is unloaded on the 
+        thread that loaded it.  If the loader releases data strictly 
+        (``strict_release=True``), ``self.data`` is dropped too.
+        """
+        self.wait()
+        if self._worker is None:
+            self._unload()
+            return
+        try:
+            self._worker.submit(self._with_registry(self._unload))()
+        finally:
+            self._stop_worker()
+    
+    def _unload(self):
         self.loader.unload()
+        if getattr(self.loader, 'strict_release', False):
+            self.data = None
+        if self.memory is not None:
+            self.memory.teardown_finished()
+
+def check_separate_loaders(data):
+    """raises ValueError unless each data object has a loader and a 
+    ``dataset_registry`` of its own.
+    
+    Without its own registry, a loader keeps shared DataSet instances in the 
+    registry of the thread that started it, and clears it when unloading.
+    """
+    loaders = set([id(d.loader) for d in data])
+    if len(loaders) != len(data):
+        raise ValueError(
+            "cannot set up data objects sharing a loader at the same time")
+    registries = [getattr(d.loader, 'dataset_registry', None) for d in data]
+    if None in registries or len(set([id(r) for r in registries])) != len(data):
+        raise ValueError(
+            "each loader needs its own dataset_registry to load data at the "
+            "same time as others")
+
+def setup_all(*data):
+    """sets up several :class:`FixtureData` objects at the same time.
+    
+    Each one is loaded on its own thread so each one needs its own loader, 
+    i.e. a fixture made with its own connection and ``dataset_registry``; 
+    a ValueError is raised otherwise.  If any of them fails, the others are 
+    torn down and the first error is raised.  Returns the list of data 
+    objects.
+    """
+    check_separate_loaders(data)
+    for d in data:
+        d.setup_in_background()
+    loaded = []
+    error = None
+    for d in data:
+        try:
+            d.wait()
+        except:
+            if error is None:
+                error = sys.exc_info()
+        else:
+            loaded.append(d)
+    if error is not None:
+        for d in loaded:
+            d.teardown()
+        etype, val, tb = error
+        raise etype, val, tb
+    return list(data)
+
+def teardown_all(*data):
+    """tears down several :class:`FixtureData` objects at the same time.
+    
+    Like :func:`setup_all`, each one needs its own loader and 
+    ``dataset_registry``.  Data set up in the background is torn down on 
+    the thread that set it up, other data on the calling thread.  The first 
+    error raised, if any, is raised after all have finished.
+    """
+    check_separate_loaders(data)
+    errors = []
+    def teardown(d):
+        try:
+            d.teardown()
+        except:
+            errors.append(sys.exc_info())
+    in_background = [d for d in data if d._worker is not None]
+    # these wait for their worker threads, so they can wait at the same time :
+    threads = [threading.Thread(target=teardown, args=(d,)) 
+                    for d in in_background]
+    for t in threads:
+        t.start()
+    for d in data:
+        if d not in in_background:
+            teardown(d)
+    for t in threads:
+        t.join()
+    if errors:
+        etype, val, tb = errors[0]
+        raise etype, val, tb
 
 class Fixture(object):
     """An environment for loading data.
@@ -87,17 +422,23 @@ class Fixture(object):
         class to instantiate with datasets (defaults to SuperSet)
     loader
         class to instantiate and load data sets with.
+    track_memory
+        if True, each :class:`FixtureData` reports objects created and 
+        retained by the data in a :class:`MemoryReport`
       
     """
     dataclass = SuperSet
     loader = None
     Data = FixtureData
+    track_memory = False
                 
-    def __init__(self, dataclass=None, loader=None):
+    def __init__(self, dataclass=None, loader=None, track_memory=False):
         if dataclass:
             self.dataclass = dataclass
         if loader:
             self.loader = loader
+        if track_memory:
+            self.track_memory = track_memory
     
     def __iter__(self):
         for k in self.__dict__:
@@ -218,5 +559,8 @@ class Fixture(object):
     
     def data(self, *datasets):
         """returns a :class:`FixtureData` object for datasets."""
-        return self.Data(datasets, self.dataclass, self.loader)
+        data = self.Data(datasets, self.dataclass, self.loader)
+        if self.track_memory:
+            data.track_memory = True
+        return data
         
\ No newline at end of file
@@ -6,7 +6,22 @@ See :ref:`Using the fixture command <using-fixture-command>` for examples.
 
 """
 
-import sys, os, optparse, inspect, pkg_resources
+import sys, os, optparse, inspect, pkg_resources, random, tempfile
+import filecmp
+import threading, Queue
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+json = None
+try:
+    # 2.6
+    import json
+except ImportError:
+    try:
+        import simplejson as json
+    except ImportError:
+        pass
 from warnings import warn
 from fixture.command.generate.template import templates, is_template
 handler_registry = []
@@ -22,6 +37,11 @@ class UnsupportedHandler(HandlerException):
     pass
 class MisconfiguredHandler(HandlerException):
     pass
+class UnknownColumn(HandlerException):
+    pass
+class StaleOutput(ValueError):
+    """code copied from a previous output does not match its index"""
+    pass
     
 def register_handler(handler):
     handler_registry.append(handler)
@@ -43,12 +63,17 @@ class FixtureCache(object):
     def __init__(self):
         self.registry = {}
         self.order_of_appearence = []
+        self.depends = {}
     
     def add(self, set):
         fxtid = set.obj_id()        
         self.push_fxtid(fxtid)
         if not self.registry.has_key(fxtid):
             self.registry[fxtid] = {}
+            self.depends[fxtid] = []
+        for v in set.data_dict.values():
+            if isinstance(v, FixtureSet) and v.obj_id() not in self.depends[fxtid]:
+                self.depends[fxtid].append(v.obj_id())
         
         # we want to add a new set but
         # MERGE in the data if the set exists.
@@ -65,20 +90,183 @@ class FixtureCache(object):
         except ValueError:
             pass
         o.append(fxtid)
+    
+    def merge(self, cache):
+        """adds all sets of another cache, keeping the sets already 
+        in this cache when both have the same set.
+        """
+        for fxtid in cache.order_of_appearence:
+            self.push_fxtid(fxtid)
+            sets = self.registry.setdefault(fxtid, {})
+            for set_id, set in cache.registry[fxtid].items():
+                sets.setdefault(set_id, set)
+            depends = self.depends.setdefault(fxtid, [])
+            for dep in cache.depends[fxtid]:
+                if dep not in depends:
+                    depends.append(dep)
+
+class Sampler(object):
+    """chooses which sets yielded by a handler go into the fixture.
+    
+    Each set is kept along with its foreign key closure (the sets it links 
+    to, recursively) so that the sample is always loadable.
+    
+    - limit: keep at most this many sets (per stratum, see below)
+    - fraction: keep each set with this probability
+    - seed: seed for fraction, so that a sample can be reproduced
+    - stratify: column name; limit applies to each distinct value of it
+    - caps: dict of set object id (i.e. table name) to the max number of 
+      rows of that object; sets that would need more are left out
+    
+    Sets are chosen in two steps.  choose() sees sets whose links are not 
+    resolved yet and applies fraction and limit, so that the links of sets 
+    left out are never fetched.  keep() sees the chosen sets once they are 
+    resolved and applies caps, which depend on the closure.  fraction is 
+    applied while reading rows, not in SQL, so that seed reproduces a sample 
+    on any backend; a plain limit can be read with a SQL LIMIT instead, see 
+    sql_limit().
+    """
+    def __init__(self, limit=None, fraction=None, seed=None, stratify=None, 
+                    caps=None):
+        self.limit = limit
+        self.fraction = fraction
+        self.random = random.Random(seed)
+        self.stratify = stratify
+        self.caps = caps or {}
+        self.kept = set()
+        self.counts = {}
+        self.chosen = {}
+        self.strata = {}
+    
+    def is_active(self):
+        return bool(self.limit is not None or self.fraction is not None 
+                    or self.caps)
+    
+    def sql_limit(self):
+        """returns the max number of rows to read, when it is known before 
+        reading them (otherwise None).
+        """
+        if self.fraction is None and self.stratify is None and not self.caps:
+            return self.limit
+        return None
+    
+    def closure(self, fset, found):
+        """adds keys of fset and the sets it links to that are not kept yet 
+        to found.
+        """
+        key = (fset.obj_id(), fset.set_id())
+        if key in self.kept or key in found:
+            return
+        found[key] = fset
+        for v in fset.data_dict.values():
+            if isinstance(v, FixtureSet):
+                self.closure(v, found)
+    
+    def stratum(self, fset):
+        if self.stratify is None:
+            return None
+        value = fset.data_dict[self.stratify]
+        if isinstance(value, FixtureSet):
+            value = value.set_id()
+        return value
+    
+    def check_stratify(self, fset):
+        if self.stratify is not None and self.stratify not in fset.data_dict:
+            columns = fset.data_dict.keys()
+            columns.sort()
+            raise UnknownColumn(
+                "cannot stratify by %s, %s has no such column (columns: %s)" % (
+                        self.stratify, fset.obj_id(), ", ".join(columns)))
+    
+    def choose(self, sets, forget=None):
+        """yields the sets that may be kept, before their links are resolved.
+        
+        forget(fset) is called for each set that is left out.  The limit is 
+        applied here unless there are caps, since a set may then be left out 
+        by keep().
+        """
+        checked = False
+        for fset in sets:
+            if not checked:
+                self.check_stratify(fset)
+                checked = True
+            if self.fraction is not None and self.random.random() >= self.fraction:
+                if forget:
+                    forget(fset)
+                continue
+            if self.limit is not None and not self.caps:
+                stratum = self.stratum(fset)
+                if self.chosen.get(stratum, 0) >= self.limit:
+                    if forget:
+                        forget(fset)
+                    if self.stratify is None:
+                        # no more sets will be kept
+                        break
+                    continue
+                self.chosen[stratum] = self.chosen.get(stratum, 0) + 1
+            yield fset
+    
+    def keep(self, sets):
+        """yields the chosen sets to keep, once their links are resolved."""
+        for fset in sets:
+            stratum = self.stratum(fset)
+            if self.limit is not None and self.caps:
+                if self.strata.get(stratum, 0) >= self.limit:
+                    if self.stratify is None:
+                        # no more sets will be kept
+                        break
+                    continue
+            found = {}
+            self.closure(fset, found)
+            added = {}
+            for obj_id, set_id in found:
+                added[obj_id] = added.get(obj_id, 0) + 1
+            over_cap = False
+            for obj_id, count in added.items():
+                if (obj_id in self.caps and 
+                        self.counts.get(obj_id, 0) + count > self.caps[obj_id]):
+                    over_cap = True
+            if over_cap:
+                continue
+            for obj_id, count in added.items():
+                self.counts[obj_id] = self.counts.get(obj_id, 0) + count
+            self.kept.update(found.keys())
+            self.strata[stratum] = self.strata.get(stratum, 0) + 1
+            yield fset
+    
+    def __call__(self, sets):
+        """yields the sets to keep, for sets that are already resolved."""
+        return self.keep(self.choose(sets))
 
 class DataSetGenerator(object):
     """produces a callable object that can generate DataSet code.
     """
         
     template = None
+    chunk_size = 500
+    # max number of linked rows a handler's resolver keeps while streaming
+    cache_size = 5000
         
     def __init__(self, options, template=None):
         self.handler = None
         self.options = options
         self.cache = FixtureCache()
+        # handlers that render each DataSet class, when not self.handler
+        self.class_handlers = {}
+        # rows that differ from the previous stream(), by DataSet class
+        self.changes = {}
         if template:
             self.template = template
     
+    def mk_sampler(self):
+        options = self.options
+        return Sampler(
+                    limit=getattr(options, 'limit', None),
+                    fraction=getattr(options, 'sample', None),
+                    seed=getattr(options, 'seed', None),
+                    stratify=getattr(options, 'stratify', None),
+                    caps=getattr(options, 'caps', None))
+    
     def get_handler(self, object_path, obj=None, importable=True, **kw):
         """find and return a handler for object_path.
         
@@ -128,20 +316,25 @@ class DataSetGenerator(object):
     def code(self):
         """builds and returns code string.
         """
+        if self.template.needs_output:
+            raise ValueError(
+                "the %s template can only be used by stream()" % self.template)
         tpl = {'fxt_type': self.handler.fxt_type()}
         
         code = [self.template.header(self.handler)]
         o = [k for k in self.cache.order_of_appearence]
         o.reverse()
-        for kls in o:
+        for kls in dependency_order(o, self.cache.depends):
+            handler = self.class_handlers.get(kls, self.handler)
             datadef = self.template.DataDef()
             tpl['data'] = []
-            tpl['fxt_class'] = self.handler.mk_class_name(kls)
+            tpl['fxt_class'] = handler.mk_class_name(kls)
             
             val_dict = self.cache.registry[kls]
             for k,fset in val_dict.items():
                 key = fset.mk_key()
-                data = self.handler.resolve_data_dict(datadef, fset)
+                datadef.add_set(fset)
+                data = handler.resolve_data_dict(datadef, fset)
                 tpl['data'].append((key, self.template.dict(data)))
                 
             tpl['meta'] = "\n        ".join(datadef.meta(kls))
@@ -157,18 +350,17 @@ class DataSetGenerator(object):
     
         returns code string.
         """
-        importable, obj = self.resolve_object_path(object_path)
-        # perform setup callbacks here after the object has been imported (above)
-        # this is mainly designed for elixir
-        if setup_callbacks:
-            for setup in setup_callbacks:
-                setup()
-        self.handler = self.get_handler(object_path, obj=obj, importable=importable)
+        self.prepare(object_path, setup_callbacks=setup_callbacks)
         self.handler.begin()
+        self.extract(self.handler, self.cache)
+        return self.code()
+    
+    def extract(self, handler, cache):
+        """adds the sets of handler, and the sets they link to, to cache."""
         try:
-            self.handler.findall(self.options.where)
+            handler.findall(self.options.where)
             def cache_set(s):        
-                self.cache.add(s)
+                cache.add(s)
                 for (k,v) in s.data_dict.items():
                     if isinstance(v, FixtureSet):
                         f_set = v
@@ -179,15 +371,367 @@ class DataSetGenerator(object):
             # foreign keys and their foreign keys.
             # got it???
             
-            for s in self.handler.sets():
+            for s in self.sets(handler):
                 cache_set(s)
+            if not cache.order_of_appearence:
+                self.no_data(handler)
         except:
-            self.handler.rollback()
+            handler.rollback()
             raise
         else:
-            self.handler.commit()
+            handler.commit()
+    
+    def generate_all(self, object_paths, setup_callbacks=None, jobs=None):
+        """like __call__ but generates code for the data of all object_paths.
         
+        Each object path gets its own handler, and so its own connection.  
+        All object paths must be handled by the same type of fixture.  
+        Handlers are run by a pool of jobs threads (default: one per object 
+        path), each filling its own FixtureCache.  The caches are then 
+        merged in the order of object_paths, keeping one copy of the sets 
+        found by more than one handler.
+        """
+        if setup_callbacks:
+            for setup in setup_callbacks:
+                setup()
+        handlers = []
+        fxt_types = {}
+        for object_path in object_paths:
+            importable, obj = self.resolve_object_path(object_path)
+            handler = self.get_handler(
+                            object_path, obj=obj, importable=importable)
+            fxt_types.setdefault(handler.fxt_type(), []).append(object_path)
+            handlers.append(handler)
+        if len(fxt_types) > 1:
+            raise MisconfiguredHandler(
+                "cannot generate one module for objects of different fixture "
+                "types: %s" % "; ".join([
+                    "%s (%s)" % (", ".join(paths), fxt_type) 
+                                    for fxt_type, paths in fxt_types.items()]))
+        # all handlers render with self.template, which is begun once
+        handlers[0].begin()
+        
+        pending = Queue.Queue()
+        for handler in handlers:
+            pending.put(handler)
+        caches = {}
+        errors = []
+        def work():
+            while not errors:
+                try:
+                    handler = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                cache = FixtureCache()
+                try:
+                    self.extract(handler, cache)
+                except:
+                    errors.append(sys.exc_info())
+                    return
+                caches[handler] = cache
+        
+        workers = [threading.Thread(target=work) 
+                        for i in range(min(jobs or len(handlers), len(handlers)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            etype, val, tb = errors[0]
+            raise etype, val, tb
+        
+        self.handler = handlers[0]
+        for handler in handlers:
+            cache = caches[handler]
+            for fxtid in cache.order_of_appearence:
+                self.class_handlers.setdefault(fxtid, handler)
+            self.cache.merge(cache)
         return self.code()
+    
+    def no_data(self, handler):
+        raise NoData("no data for query \"%s\" on %s, handler=%s" % (
+                self.options.where, handler.obj, handler.__class__))
+    
+    def prepare(self, object_path, setup_callbacks=None):
+        """imports object_path and sets up its handler."""
+        importable, obj = self.resolve_object_path(object_path)
+        # perform setup callbacks here after the object has been imported (above)
+        # this is mainly designed for elixir
+        if setup_callbacks:
+            for setup in setup_callbacks:
+                setup()
+        self.handler = self.get_handler(object_path, obj=obj, importable=importable)
+    
+    def sets(self, handler):
+        """yields the handler's sets that were chosen by a new sampler."""
+        sampler = self.mk_sampler()
+        if not sampler.is_active():
+            return handler.sets()
+        if handler.chunk_size is None:
+            # a sample may stop reading long before the last row
+            handler.chunk_size = self.chunk_size
+        if handler.resolver is None:
+            return sampler(handler.sets())
+        limit = sampler.sql_limit()
+        if limit is not None:
+            handler.limit(limit)
+        # only the links of chosen sets are fetched
+        return sampler.keep(handler.resolver.iter_resolved(
+                    sampler.choose(handler.build_sets(), 
+                                    forget=handler.resolver.forget)))
+    
+    def stream(self, object_path, out, setup_callbacks=None, previous=None, 
+                    previous_output=None):
+        """like __call__ but writes code to the file object out.
+        
+        Rows are rendered as soon as the handler yields them and their code 
+        is spooled to a temporary file per DataSet class.  The handler reads 
+        its record set in chunks of chunk_size rows and its resolver keeps at 
+        most cache_size linked rows, so what stays in memory for each row is 
+        its key and its entry in the index (see below), not its data nor its 
+        code.  Templates that cannot render one row at a time write the code 
+        built by __call__ instead.
+        
+        Returns an index of the code written (see update_object_data()).  If 
+        the index of a previous run is passed as previous, rows that were 
+        written before keep their place in their class, so that only new, 
+        changed and deleted rows differ.  What differs is kept in 
+        self.changes as a dict of object id to (added, changed, removed) row 
+        keys.
+        
+        If previous_output, the path that run wrote to, is passed too, the 
+        rows of object_path whose columns did not change are not resolved nor 
+        rendered again: their code and the code of the rows they link to is 
+        copied from previous_output.  Rows of object_path are still read to 
+        compare them, but other objects are only queried for changed rows.  
+        StaleOutput is raised if copied code does not match its checksum.
+        """
+        if not self.template.streamable:
+            out.write(self(object_path, setup_callbacks=setup_callbacks))
+            out.write("\n")
+            return None
+        
+        self.prepare(object_path, setup_callbacks=setup_callbacks)
+        handler = self.handler
+        handler.chunk_size = self.chunk_size
+        if handler.resolver is not None:
+            handler.resolver.cache_size = self.cache_size
+        if previous is None:
+            previous = {'classes': {}, 'order': [], 'sources': {}}
+        copy = previous_output is not None and handler.resolver is not None
+        spool = {}
+        rows = {}
+        datadefs = {}
+        depends = {}
+        id_attrs = {}
+        rendered = set()
+        order = []
+        sources = {}
+        roots = []
+        unchanged = []
+        
+        def add_class(fxtid):
+            if fxtid not in spool:
+                order.append(fxtid)
+                spool[fxtid] = tempfile.TemporaryFile()
+                rows[fxtid] = []
+                datadefs[fxtid] = self.template.DataDef()
+                depends[fxtid] = []
+        
+        def add_row(fxtid, row_key, code, links):
+            f = spool[fxtid]
+            rows[fxtid].append(
+                [row_key, md5(code).hexdigest(), f.tell(), len(code), links])
+            f.write(code)
+            for dep, dep_key in links:
+                if dep not in depends[fxtid]:
+                    depends[fxtid].append(dep)
+        
+        def render_set(s):
+            fxtid = s.obj_id()
+            key = (fxtid, s.mk_key())
+            if key in rendered:
+                return
+            rendered.add(key)
+            add_class(fxtid)
+            links = []
+            for v in s.data_dict.values():
+                if isinstance(v, FixtureSet):
+                    render_set(v)
+                    links.append([v.obj_id(), v.mk_key()])
+            id_attrs.setdefault(fxtid, s.get_id_attr())
+            datadefs[fxtid].add_set(s)
+            data = handler.resolve_data_dict(datadefs[fxtid], s)
+            add_row(fxtid, key[1], self.template.render_row(key[1], data), 
+                    links)
+        
+        def changed_sets(sets):
+            # sets are not resolved yet, so their links are still column values
+            for s in sets:
+                row_key = s.mk_key()
+                roots.append((s.obj_id(), row_key))
+                sources[row_key] = source_checksum(s)
+                if copy and previous['sources'].get(row_key) == sources[row_key]:
+                    handler.resolver.forget(s)
+                    unchanged.append(roots[-1])
+                    continue
+                yield s
+        
+        handler.begin()
+        if copy:
+            for line in previous.get('imports', []):
+                self.template.add_import(line)
+        try:
+            handler.findall(self.options.where)
+            if handler.resolver is not None and not self.mk_sampler().is_active():
+                sets = handler.resolver.iter_resolved(
+                                    changed_sets(handler.build_sets()))
+            else:
+                sets = self.sets(handler)
+            for s in sets:
+                render_set(s)
+            if not roots and not order:
+                self.no_data(handler)
+        except:
+            handler.rollback()
+            for f in spool.values():
+                f.close()
+            raise
+        else:
+            handler.commit()
+        
+        # copy the rows that unchanged rows need and that were not rendered
+        previous_rows = {}
+        for kls, info in previous['classes'].items():
+            for row in info['rows']:
+                previous_rows[(kls, row[0])] = row
+        copied = {}
+        wanted = list(unchanged)
+        while wanted:
+            key = wanted.pop()
+            if key in rendered or key in copied:
+                continue
+            copied[key] = previous_rows[key]
+            wanted.extend([tuple(link) for link in previous_rows[key][4]])
+        for kls in previous['order']:
+            kls_rows = [row for (fxtid, row_key), row in copied.items() 
+                            if fxtid == kls]
+            if not kls_rows:
+                continue
+            kls_rows.sort(key=lambda row: row[2])
+            add_class(kls)
+            id_attr = id_attrs.setdefault(kls, previous['classes'][kls]['id_attr'])
+            datadef = datadefs[kls]
+            f = open(self.template.rows_file(
+                            handler.mk_class_name(kls), previous_output))
+            try:
+                for row_key, digest, offset, length, links in kls_rows:
+                    f.seek(offset)
+                    code = f.read(length)
+                    if md5(code).hexdigest() != digest:
+                        for spooled in spool.values():
+                            spooled.close()
+                        raise StaleOutput(
+                            "the code of %s %r in %s was changed since it "
+                            "was generated" % (kls, row_key, previous_output))
+                    add_row(kls, row_key, code, links)
+                    datadef.add_set(IndexedSet(kls, row_key, id_attr))
+                    for dep, dep_key in links:
+                        datadef.add_reference(handler.mk_class_name(dep))
+            finally:
+                f.close()
+        
+        out.write("\n".join(
+                    self.template.import_header + 
+                    [self.template.header(handler)]))
+        tpl = {'fxt_type': handler.fxt_type(), 'data': ''}
+        index = {
+            'order': [], 'classes': {}, 'sources': sources, 
+            'imports': list(self.template.import_header)}
+        self.changes = {}
+        classes = [kls for kls in previous['order'] if kls in spool] + [
+                        kls for kls in order if kls not in previous['order']]
+        for kls in dependency_order(classes, depends):
+            datadef = datadefs[kls]
+            tpl['fxt_class'] = handler.mk_class_name(kls)
+            tpl['meta'] = "\n        ".join(datadef.meta(kls))
+            tpl['data_header'] = "\n        ".join(datadef.data_header) + "\n"
+            out.write(self.template.render(tpl))
+            rows_out = self.template.rows_out(tpl['fxt_class'], out)
+            f = spool[kls]
+            previous_kls_rows = previous['classes'].get(kls, {}).get('rows', [])
+            kls_rows = []
+            for row_key, digest, offset, length, links in order_rows(
+                                            rows[kls], previous_kls_rows):
+                f.seek(offset)
+                kls_rows.append(
+                        [row_key, digest, rows_out.tell(), length, links])
+                rows_out.write(f.read(length))
+            f.close()
+            if rows_out is not out:
+                rows_out.close()
+            index['order'].append(kls)
+            index['classes'][kls] = {'id_attr': id_attrs[kls], 'rows': kls_rows}
+            changes = diff_index(kls_rows, previous_kls_rows)
+            if changes != ([], [], []):
+                self.changes[kls] = changes
+        for kls in previous['classes']:
+            if kls not in index['classes']:
+                self.changes[kls] = diff_index(
+                                        [], previous['classes'][kls]['rows'])
+        return index
+
+def source_checksum(fset):
+    """returns a checksum of the column values of fset."""
+    items = []
+    for k, v in sorted(fset.data_dict.items()):
+        if isinstance(v, FixtureSet):
+            v = v.mk_key()
+        items.append((k, v))
+    return md5(repr(items)).hexdigest()
+
+def order_rows(rows, previous_rows):
+    """returns rows with the rows whose key is in previous_rows first, in 
+    their previous order.
+    """
+    position = {}
+    for i, row in enumerate(previous_rows):
+        position[row[0]] = i
+    kept = [row for row in rows if row[0] in position]
+    kept.sort(key=lambda row: position[row[0]])
+    return kept + [row for row in rows if row[0] not in position]
+
+def diff_index(rows, previous_rows):
+    """returns (added, changed, removed) keys between two lists of 
+    [row key, checksum, ...].
+    """
+    previous = dict([(row[0], row[1]) for row in previous_rows])
+    current = dict([(row[0], row[1]) for row in rows])
+    added = [row[0] for row in rows if row[0] not in previous]
+    changed = [row[0] for row in rows 
+                if row[0] in previous and previous[row[0]] != row[1]]
+    removed = [row[0] for row in previous_rows if row[0] not in current]
+    return added, changed, removed
+
+def dependency_order(names, depends):
+    """returns names ordered so that each name comes after the names it 
+    depends on.
+    
+    depends maps a name to a list of names; cycles are broken at the name 
+    that was reached first.
+    """
+    ordered = []
+    visited = set()
+    def visit(name):
+        if name in visited:
+            return
+        visited.add(name)
+        for dep in depends.get(name, []):
+            visit(dep)
+        ordered.append(name)
+    for name in names:
+        visit(name)
+    return ordered
 
 class FixtureSet(object):
     """a key, data_dict pair for a set in a fixture.
@@ -247,6 +791,108 @@ class FixtureSet(object):
         """
         raise NotImplementedError
 
+class IndexedSet(FixtureSet):
+    """a set written by an earlier run, known only by its index entry."""
+    
+    def __init__(self, obj_id, key, id_attr):
+        FixtureSet.__init__(self, None)
+        self._obj_id = obj_id
+        self.key = key
+        self.id_attr = id_attr
+    
+    def get_id_attr(self):
+        return self.id_attr
+    
+    def mk_key(self):
+        return self.key
+    
+    def obj_id(self):
+        return self._obj_id
+
+class ForeignKeyResolver(object):
+    """resolves foreign key links of FixtureSets in batches.
+
+    Instead of querying a parent row each time a FixtureSet finds a
+    foreign key value, the FixtureSet calls defer() and the resolver
+    collects all keys wanted from each target.  resolve() then fetches them
+    with one fetch() per target (per batch_size keys), level by level, until
+    every link is replaced by its FixtureSet.  Rows that were fetched once
+    are cached and never queried again.
+
+    A target is whatever the concrete resolver needs to know to query a
+    parent, i.e. a table/column pair or a model class.  If cache_size is 
+    set, the cache is emptied when it holds more rows than that, so rows 
+    linked to again after that are fetched again.
+    """
+    batch_size = 500
+    cache_size = None
+
+    def __init__(self):
+        self.cache = {}
+        self.pending = []
+
+    def defer(self, fset, colname, target, value):
+        """link fset.data_dict[colname] to the row of target keyed by value,
+        once resolved.
+        """
+        self.pending.append((fset, colname, target, value))
+
+    def fetch(self, target, values):
+        """yields (value, FixtureSet) for each row of target keyed by one of
+        values.
+        """
+        raise NotImplementedError
+
+    def forget(self, fset):
+        """drop the links deferred by fset, the last set built, which will
+        not be resolved.
+        """
+        while self.pending and self.pending[-1][0] is fset:
+            self.pending.pop()
+
+    def iter_resolved(self, sets):
+        """yields each FixtureSet in sets with all of its links resolved.
+
+        sets are resolved batch_size at a time so that the keys of
+        many rows can be fetched together.
+        """
+        batch = []
+        for fset in sets:
+            batch.append(fset)
+            if len(batch) >= self.batch_size:
+                self.resolve()
+                for resolved in batch:
+                    yield resolved
+                batch = []
+        self.resolve()
+        for resolved in batch:
+            yield resolved
+
+    def resolve(self):
+        """fetch all deferred links, including the links of fetched rows."""
+        while self.pending:
+            if self.cache_size is not None and len(self.cache) > self.cache_size:
+                self.cache.clear()
+            pending, self.pending = self.pending, []
+            wanted = {}
+            for fset, colname, target, value in pending:
+                if (target, value) not in self.cache:
+                    wanted.setdefault(target, set()).add(value)
+            for target, values in wanted.items():
+                values = list(values)
+                values.sort()
+                for i in range(0, len(values), self.batch_size):
+                    for value, subset in self.fetch(
+                                    target, values[i:i+self.batch_size]):
+                        self.cache[(target, value)] = subset
+            for fset, colname, target, value in pending:
+                try:
+                    fset.data_dict[colname] = self.cache[(target, value)]
+                except KeyError:
+                    raise LookupError(
+                        "%s.%s links to %r but no such row exists in %s" % (
+                                        fset.obj_id(), colname, value, target))
+
 class HandlerType(type):
     def __str__(self):
         # split camel class name into something readable?
@@ -257,6 +903,10 @@ class DataHandler(object):
     """
     __metaclass__ = HandlerType
     loadable_fxt_class = None
+    # when set, sets() should read its record set chunk_size rows at a time
+    chunk_size = None
+    # a ForeignKeyResolver for the links of the sets from build_sets()
+    resolver = None
         
     def __init__(self, object_path, options, obj=None, template=None):
         self.obj_path = object_path
@@ -281,6 +931,13 @@ class DataHandler(object):
         """finds all records based on parameters."""
         raise NotImplementedError
     
+    def limit(self, count):
+        """limits the records found by findall() to the first count.
+        
+        This is only an optimization, the default does nothing.
+        """
+        pass
+    
     def fxt_type(self):
         """returns name of the type of Fixture class for this data object."""
     
@@ -329,12 +986,20 @@ class DataHandler(object):
         """called after any action raises an exception."""
         pass
         
+    def build_sets(self):
+        """yield a FixtureSet for each set in obj, with its links deferred to 
+        self.resolver.
+        """
+        raise NotImplementedError
+        
     def sets(self):
         """yield a FixtureSet for each set in obj."""
-        raise NotImplementedError
+        if self.resolver is None:
+            raise NotImplementedError
+        return self.resolver.iter_resolved(self.build_sets())
 
 def dataset_generator(argv):
-    """%prog [options] OBJECT_PATH
+    """%prog [options] OBJECT_PATH [OBJECT_PATH ...]
     
     Using the object specified in the path, generate DataSet classes (code) to 
     reproduce its data.  An OBJECT_PATH can be a python path or a file path
@@ -345,6 +1010,9 @@ def dataset_generator(argv):
     
         directory_app.models.Employee
     
+    When more than one OBJECT_PATH is given, their data is queried in parallel 
+    and generated into one module.
+    
     """
     parser = optparse.OptionParser(
         usage=(inspect.getdoc(dataset_generator)))
@@ -352,6 +1020,38 @@ def dataset_generator(argv):
                 help="Sets db connection for a handler that uses a db")
     parser.add_option('-w','--where',
                 help="SQL where clause, i.e. \"id = 1705\" ")
+    parser.add_option('-l','--limit', type='int',
+        help=(
+            "Max number of rows to generate from OBJECT_PATH.  Rows they link "
+            "to are always included."))
+    parser.add_option('--sample', type='float', metavar="FRACTION",
+        help="Include a random FRACTION of the rows, i.e. 0.1")
+    parser.add_option('--seed', type='int',
+        help="Random seed for --sample, to reproduce a sample")
+    parser.add_option('--stratify', metavar="COLUMN",
+        help="Apply --limit to each distinct value of COLUMN")
+    parser.add_option('--cap', metavar="NAME=MAX",
+        action='append', default=[],
+        help=(
+            "Max number of rows from the object NAME (i.e. a table name); "
+            "rows that would link to more are left out.  "
+            "This option can be declared multiple times."))
+    parser.add_option('-j','--jobs', type='int',
+        help=(
+            "Number of OBJECT_PATHs to query at the same time, each with its own "
+            "connection (default: all of them)"))
+    parser.add_option('-o','--output', metavar="FILE",
+        help=(
+            "Write code to FILE as rows are fetched instead of building it in "
+            "memory and printing it.  Use this for large extractions."))
+    parser.add_option('-i','--incremental', action='store_true',
+        help=(
+            "Update an --output FILE generated before: rows keep their place, "
+            "and FILE is left alone if no row changed.  Uses an index of row "
+            "checksums kept in FILE%s.  Only rows of OBJECT_PATH are compared; "
+            "the rows they link to are copied from FILE unless a row linking "
+            "to them changed, so run without --incremental to refresh "
+            "them" % INDEX_SUFFIX))
         
     d = "Data"
     parser.add_option('--suffix',
@@ -407,10 +1107,52 @@ def dataset_generator(argv):
     #             help="orderBy=ORDER_BY")
     
     (options, args) = parser.parse_args(argv)
-    try:
-        object_path = args[0]
-    except IndexError:
+    if not args:
         parser.error('incorrect arguments')
+    if len(args) == 1:
+        object_path = args[0]
+    else:
+        object_path = args
+    
+    if options.sample is not None and not (0 < options.sample <= 1):
+        parser.error("--sample must be a fraction between 0 and 1")
+    if options.stratify and options.limit is None:
+        parser.error("--stratify requires --limit")
+    if is_template(options.template):
+        template = options.template
+    else:
+        try:
+            template = templates.find(options.template)
+        except KeyError:
+            parser.error("unknown --template=%s" % options.template)
+    if template.needs_output:
+        if not options.output:
+            parser.error("--template=%s requires --output" % options.template)
+        if len(args) > 1:
+            parser.error(
+                "--template=%s accepts one OBJECT_PATH" % options.template)
+        if not json:
+            parser.error("--template=%s requires the simplejson or json "
+                         "module" % options.template)
+    if options.incremental:
+        if not options.output:
+            parser.error("--incremental requires --output")
+        if len(args) > 1:
+            parser.error("--incremental accepts one OBJECT_PATH")
+        if (options.limit is not None or options.sample is not None 
+                or options.cap):
+            parser.error(
+                "--incremental cannot be used with --limit, --sample or --cap")
+        if not json:
+            parser.error(
+                "--incremental requires the simplejson or json module")
+    options.caps = {}
+    for cap in options.cap:
+        try:
+            name, max_rows = cap.split('=')
+            options.caps[name] = int(max_rows)
+        except ValueError:
+            parser.error("--cap=%s is not in the form NAME=MAX" % cap)
     
     curr_opt, curr_path, setup_callbacks = None, None, None
     try:
@@ -430,7 +1172,7 @@ def dataset_generator(argv):
         
     try:
         return get_object_data(object_path, options, setup_callbacks=setup_callbacks)   
-    except (MisconfiguredHandler, NoData, UnrecognizedObject):
+    except (MisconfiguredHandler, NoData, UnrecognizedObject, UnknownColumn):
         etype, val, tb = sys.exc_info()
         parser.error("%s: %s" % (etype.__name__, val))
 
@@ -453,6 +1195,8 @@ def resolve_function_path(path):
 def get_object_data(object_path, options, setup_callbacks=None):
     """query object at object_path and return generated code 
     representing its data
+    
+    object_path can also be a list of object paths.
     """
     for egg in options.required_eggs:
         pkg_resources.require(egg)
@@ -462,8 +1206,108 @@ def get_object_data(object_path, options, setup_callbacks=None):
         generate.template = options.template
     else:
         generate.template = templates.find(options.template)
+    if isinstance(object_path, basestring):
+        object_paths = None
+    else:
+        object_paths = object_path
+    if getattr(options, 'incremental', False):
+        update_object_data(generate, object_path, options.output, 
+                            setup_callbacks=setup_callbacks)
+        return None
+    if getattr(options, 'output', None):
+        out = open(options.output, 'w')
+        try:
+            if object_paths is None:
+                generate.stream(
+                        object_path, out, setup_callbacks=setup_callbacks)
+            else:
+                out.write(generate.generate_all(
+                        object_paths, setup_callbacks=setup_callbacks, 
+                        jobs=getattr(options, 'jobs', None)))
+                out.write("\n")
+        finally:
+            out.close()
+        return None
+    if object_paths is not None:
+        return generate.generate_all(object_paths, 
+                        setup_callbacks=setup_callbacks, 
+                        jobs=getattr(options, 'jobs', None))
     return generate(object_path, setup_callbacks=setup_callbacks)
 
+INDEX_SUFFIX = '.idx'
+
+def update_object_data(generate, object_path, output, setup_callbacks=None):
+    """regenerate code for object_path into output, touching as little as 
+    possible.
+    
+    The index written by the last run (output + INDEX_SUFFIX) keeps rows in 
+    place, and the code of rows that did not change is copied from output 
+    instead of being queried and rendered again; output and its index are 
+    only replaced if the new code differs.  Returns generate.changes.
+    
+    The index is a dict of:
+    
+    - classes: object id to a dict of id_attr and rows, a list of [row key, 
+      checksum of the row's code, offset and length of the code in the file 
+      rows are written to, [object id, row key] of each row linked to]
+    - order: object ids in the order their classes were written
+    - sources: row key to a checksum of the column values of each row of 
+      object_path
+    - imports: the import lines of output
+    
+    Rows of object_path are compared by their column values only, so a row 
+    that is linked to by unchanged rows is not read again; regenerate output 
+    without --incremental to refresh every row.  If code copied from output 
+    does not match its checksum, i.e. output was edited, all rows are 
+    queried and rendered again.
+    """
+    index_path = output + INDEX_SUFFIX
+    previous = None
+    if os.path.exists(output) and os.path.exists(index_path):
+        f = open(index_path)
+        try:
+            previous = str_index(json.load(f))
+        finally:
+            f.close()
+    
+    tmp_output = output + '.tmp'
+    out = open(tmp_output, 'w')
+    try:
+        try:
+            index = generate.stream(object_path, out, 
+                        setup_callbacks=setup_callbacks, previous=previous, 
+                        previous_output=previous and output)
+        except StaleOutput:
+            # nothing was written yet; keep the order of the index only
+            index = generate.stream(object_path, out, previous=previous)
+    except:
+        out.close()
+        os.unlink(tmp_output)
+        raise
+    out.close()
+    
+    if os.path.exists(output) and filecmp.cmp(tmp_output, output, shallow=False):
+        os.unlink(tmp_output)
+        return generate.changes
+    os.rename(tmp_output, output)
+    if index is not None:
+        f = open(index_path, 'w')
+        try:
+            json.dump(index, f)
+        finally:
+            f.close()
+    return generate.changes
+
+def str_index(obj):
+    """returns an index loaded from JSON with its strings as str again."""
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    elif isinstance(obj, list):
+        return [str_index(v) for v in obj]
+    elif isinstance(obj, dict):
+        return dict([(str_index(k), str_index(v)) for k, v in obj.items()])
+    return obj
+
 def main(argv=sys.argv[1:]):
     if '__testmod__' in argv:
         # sorry this is all I can think of at the moment :(
@@ -475,7 +1319,9 @@ def main(argv=sys.argv[1:]):
         finally:
             teardown_examples()
         return
-    print( dataset_generator(argv))
+    code = dataset_generator(argv)
+    if code is not None:
+        print( code)
     return 0
 
 if __name__ == '__main__':
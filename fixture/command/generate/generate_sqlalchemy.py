@@ -1,7 +1,8 @@
 
 import sys, inspect
 from fixture.command.generate import (
-        DataHandler, register_handler, FixtureSet, NoData, UnsupportedHandler)
+        DataHandler, register_handler, FixtureSet, ForeignKeyResolver, NoData, 
+        UnsupportedHandler)
 from fixture import SQLAlchemyFixture
 try:
     import sqlalchemy
@@ -126,6 +127,7 @@ class SQLAlchemyHandler(DataHandler):
         self.session = Session()
         
         self.env = TableEnv(*[self.obj.__module__] + self.options.env)
+        self.resolver = SQLAlchemyForeignKeyResolver(self.connection, self.env)
     
     def add_fixture_set(self, fset):
         t = self.env[fset.obj.table]
@@ -151,9 +153,7 @@ class SQLAlchemyHandler(DataHandler):
         if query:
             self.rs = session.query(self.obj).filter(query)
         else:
-            self.rs = session.query(self.obj).all()
-        if not self.rs.count():
-            raise NoData("no data for query \"%s\" on %s, handler=%s" % (query, self.obj, self.__class__))
+            self.rs = session.query(self.obj)
         return self.rs
     
     @staticmethod
@@ -168,12 +168,21 @@ class SQLAlchemyHandler(DataHandler):
             return False
         return True
     
-    def sets(self):
+    def limit(self, count):
+        if hasattr(self.rs, 'limit'):
+            self.rs = self.rs.limit(count)
+    
+    def build_sets(self):
         """yields FixtureSet for each row in SQLObject."""
         
-        for row in self.rs:
-            yield SQLAlchemyFixtureSet(row, self.obj, self.connection, self.env,
-                                            adapter=self.RecordSetAdapter)
+        rs = self.rs
+        if self.chunk_size and hasattr(rs, 'yield_per'):
+            # fetch rows from the cursor in chunks instead of all at once
+            rs = rs.yield_per(self.chunk_size)
+        for row in rs:
+            yield SQLAlchemyFixtureSet(row, self.obj, self.connection, 
+                                self.env, adapter=self.RecordSetAdapter, 
+                                resolver=self.resolver)
 
 class SQLAlchemyMappedClassBase(SQLAlchemyHandler):
     class RecordSetAdapter(SQLAlchemyHandler.RecordSetAdapter):
@@ -237,8 +246,6 @@ class SQLAlchemyMappedClassBase(SQLAlchemyHandler):
             self.rs = session.query(self.obj).filter(query)
         else:
             self.rs = session.query(self.obj)
-        if not self.rs.count():
-            raise NoData("no data for query \"%s\" on %s, handler=%s" % (query, self.obj, self.__class__))
         return self.rs
 
 ## NOTE: the order that handlers are registered in is important for discovering 
@@ -324,10 +331,39 @@ class SQLAlchemyMappedClassHandler(SQLAlchemyMappedClassBase):
 register_handler(SQLAlchemyMappedClassHandler)
 
 
+class SQLAlchemyForeignKeyResolver(ForeignKeyResolver):
+    """fetches foreign key rows with IN (...) queries.
+    
+    targets are (table, column key) pairs.
+    """
+    
+    def __init__(self, connection, env):
+        ForeignKeyResolver.__init__(self)
+        self.connection = connection
+        self.env = env
+    
+    def fetch(self, target, values):
+        table, colkey = target
+        column = getattr(table.c, colkey)
+        rs = self.connection.execute(table.select(column.in_(values)))
+        for row in rs.fetchall():
+            # adapter is always table adapter here, since that's
+            # how we obtain foreign keys...
+            subset = SQLAlchemyFixtureSet(
+                        row, table, self.connection, self.env,
+                        adapter=SQLAlchemyTableHandler.RecordSetAdapter, 
+                        resolver=self)
+            yield getattr(row, colkey), subset
+
 class SQLAlchemyFixtureSet(FixtureSet):
-    """a fixture set for a sqlalchemy record set."""
+    """a fixture set for a sqlalchemy record set.
     
-    def __init__(self, data, obj, connection, env, adapter=None):
+    foreign key values are deferred to resolver so that linked rows can be 
+    fetched in batches.  Without a resolver, links are resolved before 
+    the constructor returns.
+    """
+    
+    def __init__(self, data, obj, connection, env, adapter=None, resolver=None):
         # print data, model
         FixtureSet.__init__(self, data)
         self.env = env
@@ -336,6 +372,10 @@ class SQLAlchemyFixtureSet(FixtureSet):
             self.obj = adapter(obj)
         else:
             self.obj = obj
+        if resolver is None:
+            self.resolver = SQLAlchemyForeignKeyResolver(connection, env)
+        else:
+            self.resolver = resolver
         ## do we add table objects?  elixir Entity classes get the Entity.table attribute
         # if self.obj.table not in self.env:
         #     self.env.add_table(self.obj.table)
@@ -349,13 +389,15 @@ class SQLAlchemyFixtureSet(FixtureSet):
                 
             val = self.get_col_value(col.name, **sendkw)
             self.data_dict[col.name] = val
+        if resolver is None:
+            self.resolver.resolve()
     
     def attr_to_db_col(self, col):
         return col.name
     
     def get_col_value(self, colname, foreign_key=None):
-        """transform column name into a value or a
-        new set if it's a foreign key (recursion).
+        """transform column name into a value or, if it's a foreign key, 
+        defer it to the resolver which will link it to a new set.
         """
         value = getattr(self.data, colname)
         if value is None:
@@ -364,19 +406,8 @@ class SQLAlchemyFixtureSet(FixtureSet):
             return None
             
         if foreign_key:
-            from sqlalchemy.ext.assignmapper import assign_mapper
-            from sqlalchemy.ext.sqlsoup import class_for_table
-                
-            table = foreign_key.column.table
-            stmt = table.select(getattr(table.c, foreign_key.column.key)==value)
-            rs = self.connection.execute(stmt)
-            
-            # adapter is always table adapter here, since that's
-            # how we obtain foreign keys...
-            subset = SQLAlchemyFixtureSet(
-                        rs.fetchone(), table, self.connection, self.env,
-                        adapter=SQLAlchemyTableHandler.RecordSetAdapter)
-            return subset
+            column = foreign_key.column
+            self.resolver.defer(self, colname, (column.table, column.key), value)
             
         return value
     
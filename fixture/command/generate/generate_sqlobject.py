@@ -4,7 +4,7 @@
 from fixture.style import camel_to_under
 from fixture import SQLObjectFixture
 from fixture.command.generate import (
-    DataHandler, FixtureSet, register_handler, code_str, 
+    DataHandler, FixtureSet, ForeignKeyResolver, register_handler, code_str, 
     UnsupportedHandler, MisconfiguredHandler, NoData )
             
 try:
@@ -28,6 +28,7 @@ class SQLObjectHandler(DataHandler):
             raise NotImplementedError(
                 "sqlobject is not using --env; perhaps we just need to import "
                 "the envs so that findClass knows about its objects?")
+        self.resolver = SQLObjectForeignKeyResolver(self.connection)
     
     def add_fixture_set(self, fset):
         from sqlobject.classregistry import findClass
@@ -43,9 +44,6 @@ class SQLObjectHandler(DataHandler):
     def findall(self, query):
         """gets record set for query."""        
         self.rs = self.obj.select(query, connection=self.connection)
-        if not self.rs.count():
-            raise NoData("no data for query \"%s\" on object %s" % (
-                                                        query, self.obj))
     
     def fxt_type(self):
         return 'SOFixture'
@@ -63,22 +61,54 @@ class SQLObjectHandler(DataHandler):
                         'SQLObject', 'sqlmeta', 'ManyToMany', 'OneToMany'):
             return True      
     
-    def sets(self):
+    def limit(self, count):
+        if hasattr(self.rs, 'limit'):
+            self.rs = self.rs.limit(count)
+    
+    def build_sets(self):
         """yields FixtureSet for each row in SQLObject."""
         for row in self.rs:
-            yield SQLObjectFixtureSet(row, self.obj, connection=self.connection)
+            yield SQLObjectFixtureSet(row, self.obj, 
+                        connection=self.connection, resolver=self.resolver)
             
 register_handler(SQLObjectHandler)
 
+class SQLObjectForeignKeyResolver(ForeignKeyResolver):
+    """fetches foreign key rows with IN (...) queries.
+    
+    targets are SQLObject classes.
+    """
+    
+    def __init__(self, connection=None):
+        ForeignKeyResolver.__init__(self)
+        self.connection = connection
+    
+    def fetch(self, model, values):
+        from sqlobject.sqlbuilder import IN
+        rs = model.select(IN(model.q.id, values), connection=self.connection)
+        for row in rs:
+            yield row.id, SQLObjectFixtureSet(
+                    row, model, connection=self.connection, resolver=self)
+
 class SQLObjectFixtureSet(FixtureSet):
-    """a fixture set for a SQLObject row."""
+    """a fixture set for a SQLObject row.
+    
+    foreign key values are deferred to resolver so that linked rows can be 
+    fetched in batches.  Without a resolver, links are resolved before 
+    the constructor returns.
+    """
     
-    def __init__(self, data, model, connection=None):
+    def __init__(self, data, model, connection=None, resolver=None):
         FixtureSet.__init__(self, data)
         self.connection = connection
+        if resolver is None:
+            self.resolver = SQLObjectForeignKeyResolver(connection)
+        else:
+            self.resolver = resolver
         self.model = model
         self.meta = model.sqlmeta
         self.foreign_key_class = {}
+        self.links = []
         self.primary_key = None
         
         self.understand_columns()
@@ -96,6 +126,10 @@ class SQLObjectFixtureSet(FixtureSet):
         vals.extend([self.get_col_value(c.name) for c in self.meta.columnList])
     
         self.data_dict = dict(zip(cols, vals))
+        for colname, model, value in self.links:
+            self.resolver.defer(self, colname, model, value)
+        if resolver is None:
+            self.resolver.resolve()
     
     def attr_to_db_col(self, col):
         if col.dbName is not None:
@@ -104,8 +138,8 @@ class SQLObjectFixtureSet(FixtureSet):
             return self.meta.style.pythonAttrToDBColumn(col.name)
     
     def get_col_value(self, colname):
-        """transform column name into a value or a
-        new set if it's a foreign key (recursion).
+        """transform column name into a value, remembering it as a link 
+        if it's a foreign key.
         """
         from sqlobject.classregistry import findClass
         value = getattr(self.data, colname)
@@ -116,10 +150,9 @@ class SQLObjectFixtureSet(FixtureSet):
             
         if self.foreign_key_class.has_key(colname):
             model = findClass(self.foreign_key_class[colname])
-            rs = model.get(value, connection=self.connection)
-            return SQLObjectFixtureSet(rs, model, connection=self.connection)
-        else:
-            return value
+            self.links.append((
+                self.attr_to_db_col(self.meta.columns[colname]), model, value))
+        return value
     
     def get_id_attr(self):
         meta = self.meta
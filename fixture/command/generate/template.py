@@ -2,6 +2,8 @@
 """templates that generate fixture modules."""
 
 from fixture.command.generate import code_str
+from fixture.dataset.converter import json, encode_row, encode_row_value
+import os
 import pprint
 
 def _addto(val, list_):
@@ -66,6 +68,10 @@ class Template(object):
         def add_header(self, hdr):
             if hdr not in self.data_header:
                 self.data_header.append(hdr)
+        
+        def add_set(self, fset):
+            """called with each fixture set before its data is rendered."""
+            pass
 
         def meta(self, fxt_class):
             """returns list of lines to add to the fixture class's meta.
@@ -80,6 +86,12 @@ class metabase:
     pass"""
     
     fixture = None
+    # True if render() can be given an empty data element and rows 
+    # rendered by data() one at a time appended to it
+    streamable = False
+    # True if rows are not part of the rendered code, but written to 
+    # rows_out() files by a streaming generator
+    needs_output = False
     
     def __init__(self):
         self.import_header = [] # lines of import statements
@@ -101,6 +113,22 @@ class metabase:
         if self.fixture is None:
             raise NotImplementedError
         return self.fixture % tpl
+    
+    def render_row(self, key, data):
+        """returns code for one row, for streaming."""
+        return repr(self.data([(key, self.dict(data))])) + "\n"
+    
+    def rows_out(self, fxt_class, out):
+        """returns the file object that streamed rows of fxt_class are 
+        written to, after the code of their class is written to out.
+        """
+        return out
+    
+    def rows_file(self, fxt_class, path):
+        """returns the path of the file that rows_out() writes rows of 
+        fxt_class to when code is written to path.
+        """
+        return path
 
 def is_template(obj):
     return isinstance(obj, Template)
@@ -135,6 +163,7 @@ class %(fxt_class)s(DataSet):
 %(data)s"""
     
     metabase = ""
+    streamable = True
     
     def begin(self):
         self.add_import('import datetime')
@@ -185,4 +214,84 @@ class %(fxt_class)s(%(fxt_type)s):
         self.add_import('import datetime')
         self.add_import('from testtools.fixtures import SOFixture')
         
-templates.register(testtools())
\ No newline at end of file
+templates.register(testtools())
+
+class datafile(fixture):
+    """renders DataSet classes that read their rows from JSON Lines files.
+    
+    Only usable with an output file (the command's --output option); the 
+    rows of each DataSet are written next to it to a file named after the 
+    DataSet class.  The module itself only declares each DataSet with its 
+    references and primary key so that it imports quickly, no matter how 
+    many rows there are.
+    """
+    
+    class DataDef(fixture.DataDef):
+        def __init__(self, *a,**kw):
+            fixture.DataDef.__init__(self, *a,**kw)
+            self.primary_key = None
+        
+        def add_set(self, fset):
+            if self.primary_key is None:
+                id_attr = fset.get_id_attr()
+                if isinstance(id_attr, basestring):
+                    id_attr = [id_attr]
+                self.primary_key = list(id_attr)
+        
+        def fset_to_attr(self, fset, fxt_class):
+            return {'__ref__': [fxt_class, fset.mk_key(), fset.get_id_attr()]}
+        
+        def meta(self, fxt_class):
+            meta = []
+            if self.primary_key is not None:
+                meta.append("primary_key = %r" % self.primary_key)
+            if self.requires:
+                meta.append("references = [%s]" % ", ".join(self.requires))
+            return meta or ['pass']
+    
+    fixture = """
+class %(fxt_class)s(DataSet):
+    class Meta:
+        %(meta)s
+    def data(self):
+        return rows_from_json(self, os.path.join(data_dir, %(data_file)r))
+"""
+    
+    metabase = """
+data_dir = os.path.dirname(os.path.abspath(__file__))
+"""
+    needs_output = True
+    
+    def begin(self):
+        self.add_import('import os')
+        self.add_import("from fixture import DataSet")
+        self.add_import(
+                "from fixture.dataset.converter import rows_from_json")
+    
+    def data_file(self, fxt_class):
+        return "%s.jsonl" % fxt_class
+    
+    def header(self, handler):
+        return self.metabase
+    
+    def render(self, tpl):
+        tpl = dict(tpl)
+        tpl['data_file'] = self.data_file(tpl['fxt_class'])
+        return self.fixture % tpl
+    
+    def render_row(self, key, data):
+        return json.dumps(
+                    [key, encode_row(data)], default=encode_row_value) + "\n"
+    
+    def rows_out(self, fxt_class, out):
+        name = getattr(out, 'name', None)
+        if not name or name.startswith('<'):
+            raise ValueError(
+                "the %s template can only write to an output file" % self)
+        return open(self.rows_file(fxt_class, name), 'w')
+    
+    def rows_file(self, fxt_class, path):
+        return os.path.join(os.path.dirname(os.path.abspath(path)), 
+                            self.data_file(fxt_class))
+
+templates.register(datafile())
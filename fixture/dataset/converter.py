@@ -1,6 +1,7 @@
 
 """Utilities for converting datasets."""
 
+import base64
 import datetime
 import decimal
 import types
@@ -93,8 +94,9 @@ def dataset_to_json(dataset, fp=None, default=default_json_converter, wrap=None)
         except TypeError:
             continue
         row_dict = {}
-        for col, val in _obj_items(row):
-            if col=='_reserved_attr' or callable(val):
+        for col in row.columns():
+            val = getattr(row, col)
+            if callable(val):
                 continue
             row_dict[col] = val
         objects.append(row_dict)
@@ -105,6 +107,131 @@ def dataset_to_json(dataset, fp=None, default=default_json_converter, wrap=None)
     else:
         return json.dumps(objects, default=default)
 
+def encode_row_value(obj):
+    """converts obj to a value safe for JSON serialization that 
+    :func:`decode_row_value` can turn back into obj.
+    
+    Dates, times and decimals become a dict of their type and their string 
+    value.  Use :func:`encode_row` for str values, which JSON can only 
+    encode when they are UTF-8.
+    """
+    for name, type_ in _row_value_types:
+        if type(obj) is type_:
+            return {'__type__': name, 'value': obj.isoformat()}
+    if isinstance(obj, decimal.Decimal):
+        return {'__type__': 'decimal', 'value': str(obj)}
+    raise TypeError("%r is not JSON serializable" % (obj,))
+
+def encode_row(row):
+    """returns a copy of the dict row in which str values that are not 
+    UTF-8 are replaced by a dict of their bytes in base64, that 
+    :func:`decode_row_value` turns back into the same str.
+    """
+    encoded = {}
+    for col, val in row.items():
+        if isinstance(val, str):
+            try:
+                val.decode('utf-8')
+            except UnicodeDecodeError:
+                val = {'__type__': 'bytes', 'value': base64.b64encode(val)}
+        encoded[col] = val
+    return encoded
+
+class FixedOffset(datetime.tzinfo):
+    """the tzinfo of decoded dates and times that had an offset from UTC."""
+    
+    def __init__(self, minutes):
+        self.offset = datetime.timedelta(minutes=minutes)
+    
+    def __repr__(self):
+        return "<FixedOffset %s>" % self.offset
+    
+    def utcoffset(self, dt):
+        return self.offset
+    
+    def dst(self, dt):
+        return datetime.timedelta(0)
+    
+    def tzname(self, dt):
+        return None
+
+_row_value_types = (
+    ('datetime', datetime.datetime),
+    ('date', datetime.date),
+    ('time', datetime.time))
+
+def _split_offset(value):
+    # isoformat() of an aware value ends with +HH:MM or -HH:MM
+    if len(value) > 6 and value[-6] in '+-' and value[-3] == ':':
+        minutes = int(value[-5:-3]) * 60 + int(value[-2:])
+        if value[-6] == '-':
+            minutes = -minutes
+        return value[:-6], FixedOffset(minutes)
+    return value, None
+
+def _parse_iso(name, value):
+    if name == 'date':
+        return datetime.date(*[int(v) for v in value.split('-')])
+    value, tz = _split_offset(value)
+    if '.' in value:
+        value, micro = value.split('.')
+        micro = int(micro.ljust(6, '0'))
+    else:
+        micro = 0
+    if name == 'datetime':
+        dt = datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+        return dt.replace(microsecond=micro, tzinfo=tz)
+    h, m, sec = [int(v) for v in value.split(':')]
+    return datetime.time(h, m, sec, micro, tz)
+
+def decode_row_value(dataset, value):
+    """converts a value encoded by :func:`encode_row_value` back into an 
+    object.
+    
+    A dict with a ``__ref__`` key of [DataSet class name, row key, column] 
+    is a reference to a column of a row of a DataSet that ``dataset`` 
+    references.  The column is read from the DataSet instance in 
+    ``dataset.ref``.
+    """
+    if not isinstance(value, dict):
+        return value
+    if '__ref__' in value:
+        ds_name, key, col = value['__ref__']
+        ref_dataset = dataset.ref.meta.datasets[ds_name]
+        return getattr(getattr(ref_dataset, key), col)
+    if value.get('__type__') == 'decimal':
+        return decimal.Decimal(value['value'])
+    if value.get('__type__') == 'bytes':
+        return base64.b64decode(str(value['value']))
+    if '__type__' in value:
+        return _parse_iso(value['__type__'], value['value'])
+    return value
+
+def rows_from_json(dataset, path):
+    """Returns key/dict pairs for :meth:`DataSet.data() <fixture.dataset.DataSet.data>` 
+    read from a JSON Lines file.
+    
+    Each line of the file is a JSON array of a row key and a dict of 
+    column values, encoded with :func:`encode_row_value`.  This is how the 
+    ``datafile`` template of the :ref:`fixture command <using-fixture-command>` 
+    stores rows so that large fixture modules import quickly and only read 
+    their rows when a DataSet is instantiated.
+    """
+    assert json, (
+        "You must have the simplejson or json module installed.  "
+        "Neither could be imported")
+    rows = []
+    f = open(path)
+    try:
+        for line in f:
+            key, row = json.loads(line)
+            rows.append((str(key), dict([
+                        (str(col), decode_row_value(dataset, val)) 
+                                            for col, val in row.items()])))
+    finally:
+        f.close()
+    return rows
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
\ No newline at end of file
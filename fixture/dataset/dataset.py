@@ -7,7 +7,7 @@ few variations on it: :class:`SuperSet` and :class:`MergedSuperSet`
 """
 
 import sys, types
-from fixture.util import ObjRegistry
+from fixture.util import ObjRegistry, ScopedRegistry
 
 class DataContainer(object):
     """
@@ -97,15 +97,16 @@ class RefValue(object):
             # self was assigned to a class object
             return self
         else:
-            # self was assigned to an instance
-            if self.ref.dataset_obj is None:
+            # self was assigned to an instance; prefer the DataSet that was 
+            # loaded along with the instance's own DataSet :
+            dataset_obj = self.ref.loaded_for(getattr(obj, '_dataset', None))
+            if dataset_obj is None:
                 raise AttributeError(
                     "Cannot access %s, referenced %s %s has not "
                     "been loaded yet" % (
                         self, DataSet.__name__, self.ref.dataset_class))
-            obj = self.ref.dataset_obj.meta._stored_objects.get_object(
-                                                            self.ref.key)
-            return getattr(obj, self.attr_name)
+            return dataset_obj.meta._stored_objects.get_value(
+                                                self.ref.key, self.attr_name)
             # raise ValueError("called __get__(%s, %s)" % (obj, type))
 
 class Ref(object):
@@ -138,6 +139,20 @@ class Ref(object):
         """Return a :class:`RefValue` instance for ref_name"""
         return self.Value(self, ref_name)
     
+    def loaded_for(self, dataset):
+        """Return the DataSet instance that was loaded for this reference 
+        along with dataset (a DataSet instance), or else ``dataset_obj``.
+        
+        Loaders that load at the same time each bind references through 
+        their own DataSet instances, so they do not overwrite each other's 
+        ``dataset_obj``.
+        """
+        loaded = getattr(getattr(dataset, 'meta', None), 
+                         '_loaded_references', None)
+        if loaded and self.dataset_class in loaded:
+            return loaded[self.dataset_class]
+        return self.dataset_obj
+    
     def __repr__(self):
         return "<%s to %s.%s at %s>" % (
             self.__class__.__name__, self.dataset_class.__name__, 
@@ -171,6 +186,54 @@ class DataType(type):
                 cls.decorate_row(attr, name, bases, cls_attr)
                 
         del cls_attr['_primary_key']
+        
+        try:
+            cls._row_table = cls.compile_rows()
+        except TypeError:
+            # let DataSet.data() raise this when the class is instantiated
+            cls._row_table = None
+    
+    def compile_rows(cls):
+        """Returns a :class:`RowTable` of the rows declared in this class.
+        
+        This is called once, when the :class:`DataSet` class is created, so 
+        that instances do not have to inspect each row again.  Rows are 
+        therefore read as they were at class creation.
+        """
+        table = RowTable()
+        for name in sorted(dir(cls)):
+            if name.startswith('_'):
+                continue
+            row_class = getattr(cls, name)
+            if not is_row_class(row_class):
+                continue
+            
+            columns = []
+            for col_name in sorted(dir(row_class)):
+                if col_name.startswith('_'):
+                    continue
+                col_val = getattr(row_class, col_name)
+                
+                if isinstance(col_val, Ref):
+                    # the .ref attribute
+                    continue
+                elif type(col_val) in (types.ListType, types.TupleType):
+                    for c in col_val:
+                        if is_rowlike(c):
+                            table.add_reference(c._dataset)
+                        else:
+                            raise TypeError(
+                                "multi-value columns can only contain "
+                                "rowlike objects, not %s of type %s" % (
+                                                col_val, type(col_val)))
+                elif is_rowlike(col_val):
+                    table.add_reference(col_val._dataset)
+                elif isinstance(col_val, Ref.Value):
+                    table.add_reference(col_val.ref.dataset_class)
+                    
+                columns.append((col_name, col_val))
+            table.add_row(name, row_class, columns)
+        return table
     
     def decorate_row(cls, row, name, bases, cls_attr):
         """Each row (an inner class) assigned to a :class:`DataSet` will be customized after it is created.
@@ -218,13 +281,14 @@ class DataType(type):
         
         # fix inherited primary keys
         names_to_uninherit = []
-        for name in dir(row):
-            if name in cls_attr['_primary_key']:
-                if name not in row.__dict__:
-                    # then this was an inherited value, so we need to nullify it 
-                    # without 1) disturbing the other inherited values and 2) 
-                    # disturbing the inherited class.  is this nuts?
-                    names_to_uninherit.append(name)
+        for name in cls_attr['_primary_key']:
+            if name not in row.__dict__ and hasattr(row, name):
+                # then this was an inherited value, so we need to nullify it 
+                # without 1) disturbing the other inherited values and 2) 
+                # disturbing the inherited class.  is this nuts?
+                names_to_uninherit.append(name)
+        if not names_to_uninherit:
+            return
         bases_to_replace = []
         if names_to_uninherit:
             base_pos = 0
@@ -244,8 +308,37 @@ class DataType(type):
                                     if not k.startswith('_') and \
                                     k not in names_to_uninherit]))
             new_bases[base_pos] = new_base
-        if new_bases:
+        if bases_to_replace:
             row.__bases__ = tuple(new_bases)
+
+class RowTable(object):
+    """The rows of a :class:`DataSet` class, as compiled by :meth:`DataType.compile_rows`.
+    
+    ``rows``
+        a list of (key, row_class, columns) in alphabetical order of key.  
+        ``columns`` is a list of (name, value) in alphabetical order of name 
+        with inherited values resolved.
+    
+    ``references``
+        a list of :class:`DataSet` classes referenced by any column, in the 
+        order they were found.
+    """
+    def __init__(self):
+        self.rows = []
+        self.references = []
+        self._seen_references = set()
+    
+    def __repr__(self):
+        return "<%s at %s with %s rows>" % (
+                self.__class__.__name__, hex(id(self)), len(self.rows))
+    
+    def add_reference(self, dataset_class):
+        if dataset_class not in self._seen_references:
+            self._seen_references.add(dataset_class)
+            self.references.append(dataset_class)
+    
+    def add_row(self, key, row_class, columns):
+        self.rows.append((key, row_class, columns))
             
 
 def is_rowlike(candidate):
@@ -291,17 +384,28 @@ class DataRow(object):
         """Classmethod that yields all attribute names (except reserved attributes) 
         in alphabetical order
         """
-        for k in dir(self):
-            if k.startswith('_') or k in self._reserved_attr:
-                continue
-            yield k
+        if '_columns' in self.__dict__:
+            # precomputed when the DataSet created this row class
+            return iter(self._columns)
+        return iter([k for k in dir(self) 
+                        if not (k.startswith('_') or k in self._reserved_attr)])
 
 class DataSetStore(list):
-    """keeps track of actual objects stored in a dataset."""
+    """keeps track of actual objects stored in a dataset.
+    
+    Values read through :class:`Ref.Value <RefValue>` objects are cached 
+    until :meth:`forget_values` is called, which happens when the dataset is 
+    unloaded.  ``value_hits`` and ``value_misses`` count how often the cache 
+    was used.
+    """
+    value_hits = 0
+    value_misses = 0
+    
     def __init__(self, dataset):
         list.__init__(self)
         self.dataset = dataset
         self._ds_key_map = {}
+        self._values = {}
     
     def get_object(self, key):
         """returns the object at this key.
@@ -327,8 +431,36 @@ class DataSetStore(list):
         self.append(obj)
         pos = len(self)-1
         self._ds_key_map[key] = pos
+    
+    def get_value(self, key, name):
+        """returns the attribute name of the object at this key.
+        
+        The value is cached unless it is None, i.e. an id that is not 
+        set until a session is flushed.  Storing another object at the key 
+        makes its values be read again.
+        """
+        try:
+            value = self._values[(self._ds_key_map[key], name)]
+        except KeyError:
+            self.value_misses += 1
+            value = getattr(self.get_object(key), name)
+            if value is not None:
+                self._values[(self._ds_key_map[key], name)] = value
+            return value
+        self.value_hits += 1
+        return value
+    
+    def forget_values(self):
+        """forget values cached by :meth:`get_value`"""
+        self._values = {}
+    
+    def clear(self):
+        """forget all stored objects"""
+        del self[:]
+        self._ds_key_map = {}
+        self._values = {}
 
-dataset_registry = ObjRegistry()
+dataset_registry = ScopedRegistry()
 
 class DataSetMeta(DataContainer.Meta):
     """
@@ -448,6 +580,8 @@ class DataSet(DataContainer):
                     setattr(self.meta, name, getattr(defaults, name))
         
         self.meta._stored_objects = DataSetStore(self)
+        # referenced DataSet class -> the instance loaded with this one :
+        self.meta._loaded_references = {}
         # dereference from class ...        
         try:
             cl_attr = getattr(self.Meta, 'references')
@@ -476,13 +610,21 @@ class DataSet(DataContainer):
         if len(self.meta.references) > 0:
             self.ref = mkref()
             
+        row_columns = None
         for key, data in self.data():
-            if key in self:
+            if key in self.meta.data:
                 raise ValueError(
                     "data() cannot redeclare key '%s' "
                     "(this is already an attribute)" % key)
                     
             if isinstance(data, dict):
+                if row_columns is None:
+                    row_columns = list(self.meta.row.columns())
+                columns = [k for k in data if not k.startswith('_')]
+                columns.extend([k for k in row_columns if k not in data])
+                columns.sort()
+                data = dict(data)
+                data['_columns'] = tuple(columns)
                 # make a new class object for the row data
                 # so that a loaded dataset can instantiate this...
                 data = type(key, (self.meta.row,), data)
@@ -526,56 +668,20 @@ class DataSet(DataContainer):
         if self.meta._built:
             for k,v in self:
                 yield (k,v)
-                
-        def public_dir(obj):
-            for name in dir(obj):
-                if name.startswith("_"):
-                    continue
-                yield name
         
-        def add_ref_from_rowlike(rowlike):
-            if rowlike._dataset not in self.meta.references:
-                self.meta.references.append(rowlike._dataset)
-                    
-        empty = True
-        for name in public_dir(self.__class__):
-            val = getattr(self.__class__, name)
-            if not is_row_class(val):
-                continue
-            
-            empty = False
-            key = name
-            row_class = val
-            row = {}
-            
-            for col_name in public_dir(row_class):
-                col_val = getattr(row_class, col_name)
-                
-                if isinstance(col_val, Ref):
-                    # the .ref attribute
-                    continue
-                elif type(col_val) in (types.ListType, types.TupleType):
-                    for c in col_val:
-                        if is_rowlike(c):
-                            add_ref_from_rowlike(c)
-                        else:
-                            raise TypeError(
-                                "multi-value columns can only contain "
-                                "rowlike objects, not %s of type %s" % (
-                                                col_val, type(col_val)))
-                elif is_rowlike(col_val):
-                    add_ref_from_rowlike(col_val)
-                elif isinstance(col_val, Ref.Value):
-                    ref = col_val.ref
-                    if ref.dataset_class not in self.meta.references:
-                        # store the reference:
-                        self.meta.references.append(ref.dataset_class)
-                    
-                row[col_name] = col_val
-            yield (key, row)
-            
-        if empty:
+        table = self.__class__._row_table
+        if table is None:
+            table = self.__class__.compile_rows()
+        if not table.rows:
             raise ValueError("cannot create an empty DataSet")
+        
+        for ds in table.references:
+            if ds not in self.meta.references:
+                self.meta.references.append(ds)
+        
+        for key, row_class, columns in table.rows:
+            yield (key, dict(columns))
+            
         self.meta._built = True
     
     @classmethod
@@ -683,6 +789,51 @@ class SuperSet(DataContainer, DataSetContainer):
                 self._setdata(k, ref_d)
                 self._setdataset(ref_d, key=k, isref=True)
 
+class MergedRows(dict):
+    """The rows of a :class:`MergedSuperSet`.
+    
+    A row is looked up in its DataSet when it is first accessed.  If the 
+    DataSet was not loaded yet, the row is instantiated then.
+    """
+    def __init__(self, keys_to_datasets):
+        dict.__init__(self)
+        self.keys_to_datasets = keys_to_datasets
+    
+    def __getitem__(self, key):
+        try:
+            return dict.__getitem__(self, key)
+        except KeyError:
+            dataset = self.keys_to_datasets[key]
+            row = dataset.meta.data[key]
+            if not isinstance(row, DataRow):
+                row = row(dataset)
+            self[key] = row
+            return row
+    
+    def __contains__(self, key):
+        return key in self.keys_to_datasets
+    has_key = __contains__
+    
+    def __iter__(self):
+        return iter(self.keys_to_datasets)
+    
+    def __len__(self):
+        return len(self.keys_to_datasets)
+    
+    def get(self, key, default=None):
+        if key in self.keys_to_datasets:
+            return self[key]
+        return default
+    
+    def keys(self):
+        return self.keys_to_datasets.keys()
+    
+    def items(self):
+        return [(k, self[k]) for k in self.keys_to_datasets]
+    
+    def values(self):
+        return [self[k] for k in self.keys_to_datasets]
+
 class MergedSuperSet(SuperSet):
     """
     A collection of :class:`DataSet` instances.
@@ -690,6 +841,9 @@ class MergedSuperSet(SuperSet):
     all attributes of all :class:`DataSet` classes are merged together so that they are 
     accessible in this class.  Duplicate attribute names are not allowed.
     
+    Duplicates are found from the keys of each ``DataSet``; rows are only 
+    instantiated when they are accessed (see :class:`MergedRows`).
+    
     For example::
         
         >>> from fixture import DataSet
@@ -718,21 +872,21 @@ class MergedSuperSet(SuperSet):
         lazy_meta(self)
         self.meta.keys_to_datasets = {}
         SuperSet.__init__(self, *datasets)
+        self.meta.data = MergedRows(self.meta.keys_to_datasets)
     
     def _setdataset(self, dataset, key=None, isref=False):
         if SuperSet._setdataset(self, dataset, key=key, isref=isref):
-            for k,row in dataset:
-                if k in self.meta.keys_to_datasets:
-                    raise ValueError(
-                        "cannot add key '%s' for %s because it was "
-                        "already added by %s" % (
-                            k, dataset, self.meta.keys_to_datasets[k]))
-                
-                # need an instance here, if it's a class...
-                if not isinstance(row, DataRow):
-                    row = row(dataset)
-                self._setdata(k, row)
-                self.meta.keys_to_datasets[k] = dataset 
+            keys = dataset.meta.keys
+            keys_to_datasets = self.meta.keys_to_datasets
+            if len(keys_to_datasets):
+                for k in keys:
+                    if k in keys_to_datasets:
+                        raise ValueError(
+                            "cannot add key '%s' for %s because it was "
+                            "already added by %s" % (
+                                k, dataset, keys_to_datasets[k]))
+            keys_to_datasets.update(dict.fromkeys(keys, dataset))
+            self.meta.keys.extend(keys)
     
     def _store_datasets(self, datasets):
         for dataset in datasets:
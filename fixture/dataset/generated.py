@@ -0,0 +1,232 @@
+
+"""DataSets with generated rows, for loading a lot of data.
+
+A :class:`GeneratedDataSet` declares how many rows it has and how to
+generate each column instead of declaring rows::
+
+    >>> from fixture.dataset import GeneratedDataSet, Sequence, Pick
+    >>> class UserData(GeneratedDataSet):
+    ...     class Meta:
+    ...         rows = 1000
+    ...         columns = dict(
+    ...             id = Sequence(),
+    ...             name = lambda n, random: "user %s" % n)
+    ...
+    >>> class OrderData(GeneratedDataSet):
+    ...     class Meta:
+    ...         rows = 5000
+    ...         seed = 7
+    ...         columns = dict(
+    ...             id = Sequence(),
+    ...             user_id = Pick(UserData, 'id'),
+    ...             total = lambda n, random: random.randint(1, 100))
+    ...
+    >>> rows = list(OrderData().generate(stop=2))
+    >>> rows == list(OrderData().generate(stop=2))
+    True
+    >>> rows[0]['id'], rows[1]['id']
+    (1, 2)
+
+Rows are generated as they are loaded, ``chunk_size`` at a time, and are
+not kept, so a loader can load millions of them.  Each value is computed
+from the row number with a random number generator seeded with ``seed``,
+the row number and the column, so the same seed always gives the same
+rows, however they are read.
+
+"""
+
+import random
+
+from fixture.dataset.dataset import DataSet, DataSetMeta
+
+__all__ = ['GeneratedDataSet', 'Sequence', 'Pick']
+
+class Sequence(object):
+    """Generates ``start``, ``start + step``, ... for rows 0, 1, ..."""
+    uses_random = False
+    
+    def __init__(self, start=1, step=1):
+        self.start = start
+        self.step = step
+    
+    def __repr__(self):
+        return "<%s from %s by %s>" % (
+                    self.__class__.__name__, self.start, self.step)
+    
+    def __call__(self, n, random):
+        return self.start + n * self.step
+
+class Pick(object):
+    """Generates the value of ``column`` in a row picked at random from the
+    :class:`GeneratedDataSet` ``dataset_class``.
+    
+    The picked DataSet is loaded first, like a referenced DataSet.  Since
+    the value is generated again, it must be declared by the picked
+    DataSet (i.e. an id from a :class:`Sequence`).
+    """
+    def __init__(self, dataset_class, column='id'):
+        if not (isinstance(dataset_class, type) and
+                    issubclass(dataset_class, GeneratedDataSet)):
+            raise TypeError(
+                "can only pick from a GeneratedDataSet, not %r" % (
+                                                            dataset_class,))
+        self.dataset_class = dataset_class
+        self.column = column
+    
+    def __repr__(self):
+        return "<%s of %s.%s>" % (self.__class__.__name__,
+                    self.dataset_class.__name__, self.column)
+    
+    def __call__(self, n, random):
+        generator = self.dataset_class.row_generator()
+        return generator.value(random.randrange(generator.rows), self.column)
+
+class GeneratedDataSetMeta(DataSetMeta):
+    """
+    Configures a :class:`GeneratedDataSet` class.
+    
+    In addition to the attributes of :class:`DataSetMeta
+    <fixture.dataset.DataSetMeta>`:
+    
+    ``rows``
+        the number of rows
+    
+    ``columns``
+        a dict of column names to generators.  A generator is called as
+        ``generator(n, random)`` with the row number (starting at 0) and a
+        ``random.Random`` instance to return the value of the column.  Any
+        other value is used for all rows.  See also :class:`Sequence` and
+        :class:`Pick`.
+    
+    ``seed``
+        the seed of all random values (default: 0)
+    
+    ``chunk_size``
+        the number of rows to give the storage medium at a time
+        (default: 1000)
+    """
+    rows = 0
+    columns = None
+    seed = 0
+    chunk_size = 1000
+
+class RowGenerator(object):
+    """Generates the rows of a :class:`GeneratedDataSet` class."""
+    def __init__(self, dataset_class):
+        meta = dataset_class.Meta
+        def get(name):
+            return getattr(meta, name, getattr(GeneratedDataSetMeta, name))
+        columns = get('columns') or {}
+        self.dataset_class = dataset_class
+        self.rows = get('rows')
+        self.seed = get('seed')
+        self.chunk_size = get('chunk_size')
+        self.names = sorted(columns.keys())
+        self.generators = [columns[name] for name in self.names]
+        self.index = dict([(name, i) for i, name in enumerate(self.names)])
+        self.references = []
+        for gen in self.generators:
+            if isinstance(gen, Pick) and gen.dataset_class not in \
+                    self.references and gen.dataset_class is not dataset_class:
+                self.references.append(gen.dataset_class)
+    
+    def _generate(self, n, i):
+        gen = self.generators[i]
+        if not callable(gen):
+            return gen
+        if getattr(gen, 'uses_random', True):
+            # seed each value on its own so that it can be generated again
+            # without generating the values before it :
+            rand = random.Random(((self.seed * 4294967296L) + n) * 1024 + i)
+        else:
+            rand = None
+        return gen(n, rand)
+    
+    def value(self, n, name):
+        """returns the value of column name in row n"""
+        return self._generate(n, self.index[name])
+    
+    def row(self, n, columns=None):
+        """returns a dict of the values of row n, for only columns if not
+        None"""
+        if columns is None:
+            indexes = range(len(self.names))
+        else:
+            indexes = [self.index[name] for name in columns]
+        return dict([(self.names[i], self._generate(n, i)) for i in indexes])
+    
+    def generate(self, start=0, stop=None, columns=None):
+        """yields dicts of the values of rows start to stop"""
+        if stop is None or stop > self.rows:
+            stop = self.rows
+        for n in xrange(start, stop):
+            yield self.row(n, columns=columns)
+    
+    def chunks(self, columns=None):
+        """yields lists of at most chunk_size row dicts"""
+        for start in xrange(0, self.rows, self.chunk_size):
+            yield list(self.generate(start, start + self.chunk_size,
+                                     columns=columns))
+
+class GeneratedDataSet(DataSet):
+    """
+    A :class:`DataSet <fixture.dataset.DataSet>` of generated rows.
+    
+    Instead of declaring rows, declare ``rows``, ``columns`` and optionally
+    ``seed`` and ``chunk_size`` in its ``Meta`` class (see
+    :class:`GeneratedDataSetMeta`).  Loaders save the rows ``chunk_size`` at
+    a time and do not keep stored objects, so the rows cannot be accessed
+    as attributes.  Columns of the primary key must be generated so that
+    the rows can be deleted when the data is torn down.
+    
+    See :mod:`fixture.dataset.generated` for an example.
+    """
+    _reserved_attr = DataSet._reserved_attr + (
+                        'row_generator', 'generate', 'chunks')
+    Meta = GeneratedDataSetMeta
+    
+    def __init__(self, default_refclass=None, default_meta=None):
+        if not default_meta:
+            default_meta = GeneratedDataSetMeta
+        DataSet.__init__(self, default_refclass=default_refclass,
+                         default_meta=default_meta)
+        generator = self.row_generator()
+        for name in self.meta.primary_key:
+            if name not in generator.index:
+                raise ValueError(
+                    "%s must generate its primary key column '%s'" % (
+                                            self.__class__.__name__, name))
+    
+    def row_generator(cls):
+        """returns the :class:`RowGenerator` of this class"""
+        if '_row_generator' not in cls.__dict__:
+            cls._row_generator = RowGenerator(cls)
+        return cls._row_generator
+    row_generator = classmethod(row_generator)
+    
+    def data(self):
+        """returns no rows; the DataSets that columns pick from are
+        added to the references"""
+        for ds in self.row_generator().references:
+            if ds not in self.meta.references:
+                self.meta.references.append(ds)
+        return []
+    
+    def generate(self, start=0, stop=None, columns=None):
+        """yields dicts of the values of rows start to stop (all rows by
+        default) of all columns or only of columns"""
+        return self.row_generator().generate(
+                                    start=start, stop=stop, columns=columns)
+    
+    def chunks(self, columns=None):
+        """yields lists of row dicts, ``chunk_size`` rows at a time"""
+        return self.row_generator().chunks(columns=columns)
+
+class GeneratedRow(object):
+    """A generated row, as passed to a storage medium; the values are
+    attributes"""
+    def __init__(self, values):
+        self.__dict__.update(values)
+    
+    def __repr__(self):
+        return "<%s %s>" % (self.__class__.__name__, self.__dict__)
@@ -4,6 +4,9 @@ from django.db.models import connection
 from django.test import testcases
 from fixture import DjangoFixture
 
+# the FixtureTestCase class whose class_data is loaded, if any :
+_class_with_data = None
+
 
 class FixtureTestCase(testcases.TransactionTestCase):
     """Overrides django's fixture setup and teardown code to use DataSets.
@@ -11,9 +14,28 @@ class FixtureTestCase(testcases.TransactionTestCase):
     Starts a transaction at the begining of a test and rolls it back at the
     end.
     
+    If :attr:`class_data` is True the datasets are loaded once for all tests
+    of the class, in a transaction that is rolled back after the last test,
+    and each test is rolled back to a savepoint instead.  This needs a
+    database with savepoints; otherwise the datasets are loaded for each test
+    as usual.  The class transaction is rolled back by :meth:`tearDownClass`, 
+    which nose and unittest since Python 2.7 call.  With a runner that does 
+    not, it is rolled back when the next FixtureTestCase class starts, and 
+    the transaction of the last class is left for the test database to be 
+    destroyed with.
+    
     See :ref:`Using Fixture With Django <using-fixture-with-django>` for a complete example.
     """
-
+    class_data = False
+    
+    def _class_data_works(self):
+        cls = self.__class__
+        if '_savepoints_work' not in cls.__dict__:
+            cls._savepoints_work = bool(
+                        connection.creation._rollback_works() and
+                        connection.features.uses_savepoints)
+        return cls._savepoints_work
+    
     def _fixture_setup(self):
         """Finds a list called :attr:`datasets` and loads them
 
@@ -22,6 +44,15 @@ class FixtureTestCase(testcases.TransactionTestCase):
         wnat to assume that :meth:`connection.create_test_db` might not have been
         called
         """
+        if (_class_with_data is not None and 
+                _class_with_data is not self.__class__):
+            # the runner did not call tearDownClass() :
+            _class_with_data.tearDownClass()
+        
+        if self.class_data and self._class_data_works():
+            self._class_fixture_setup()
+            return
+        
         if connection.creation._rollback_works():
             transaction.enter_transaction_management()
             transaction.managed(True)
@@ -36,11 +67,40 @@ class FixtureTestCase(testcases.TransactionTestCase):
             self.data = self.fixture.data(*self.datasets)
             self.data.setup()
     
+    def _class_fixture_setup(self):
+        """Loads :attr:`datasets` once per class and starts a savepoint"""
+        global _class_with_data
+        cls = self.__class__
+        if cls.__dict__.get('_class_fixture_data') is None:
+            transaction.enter_transaction_management()
+            transaction.managed(True)
+            testcases.disable_transaction_methods()
+            
+            from django.contrib.sites.models import Site
+            Site.objects.clear_cache()
+            
+            if not hasattr(cls, 'fixture'):
+                cls.fixture = DjangoFixture()
+            data = cls.fixture.data(*getattr(cls, 'datasets', []))
+            if hasattr(cls, 'datasets'):
+                data.setup()
+            cls._class_fixture_data = data
+            _class_with_data = cls
+        
+        if hasattr(cls, 'datasets'):
+            self.data = cls._class_fixture_data
+        self._savepoint = transaction.savepoint()
+    
     def _fixture_teardown(self):
         """Finds an attribute called :attr:`data` and runs teardown on it
-
+        
         (data is created by :meth:`_fixture_setup`)
         """
+        if self.__class__.__dict__.get('_class_fixture_data') is not None:
+            # the data is torn down by tearDownClass() :
+            testcases.real_savepoint_rollback(self._savepoint)
+            return
+        
         if hasattr(self, 'data'):
             self.data.teardown()
 
@@ -49,3 +109,21 @@ class FixtureTestCase(testcases.TransactionTestCase):
             transaction.rollback()
             transaction.leave_transaction_management()
             connection.close()
+    
+    def tearDownClass(cls):
+        """Rolls back the datasets loaded for the class, if any"""
+        global _class_with_data
+        data = cls.__dict__.get('_class_fixture_data')
+        if data is None:
+            return
+        cls._class_fixture_data = None
+        _class_with_data = None
+        try:
+            if hasattr(cls, 'datasets'):
+                data.teardown()
+        finally:
+            testcases.restore_transaction_methods()
+            transaction.rollback()
+            transaction.leave_transaction_management()
+            connection.close()
+    tearDownClass = classmethod(tearDownClass)
@@ -34,3 +34,7 @@ class TestBlogWithData(FixtureTestCase):
 
 
 
+
+class TestBlogWithClassData(TestBlogWithData):
+    # loaded once for all tests if the database supports savepoints
+    class_data = True
@@ -55,4 +55,13 @@ class StorageMediaNotFound(LookupError):
     
     used by :mod:`fixture.loadable` classes
     """
-    pass
\ No newline at end of file
+    pass
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    A DataSet made more statements than the query budget of its loader 
+    allows.
+    
+    used by :mod:`fixture.loadable` classes
+    """
+    pass
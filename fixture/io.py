@@ -3,16 +3,31 @@
 See :ref:`Using TempIO <using-temp-io>` for examples.
    
 """
-__all__ = ['TempIO']
+__all__ = ['TempIO', 'TempTree', 'TempIOPool']
 
 import os, sys
+import shutil
+import subprocess
+import threading, Queue
 from os import path
 from os.path import join, exists, split, basename
-from tempfile import mkdtemp
+from tempfile import mkdtemp, gettempdir
 import atexit
 _tmpdirs = set()
 
-def TempIO(deferred=False, **kw):
+# directories backed by memory (tmpfs), tried in order by memory_root()
+_memory_roots = ['/dev/shm']
+
+def memory_root():
+    """returns a writable directory backed by memory, i.e. /dev/shm, or 
+    None if there isn't one.
+    """
+    for d in _memory_roots:
+        if path.isdir(d) and os.access(d, os.W_OK | os.X_OK):
+            return d
+    return None
+
+def TempIO(deferred=False, tree=None, in_memory=False, **kw):
     """self-destructing, temporary directory.
     
     Takes the same keyword args as tempfile.mkdtemp with these additional 
@@ -22,6 +37,14 @@ def TempIO(deferred=False, **kw):
         If True, destruction will be put off until atexit.  Otherwise, 
         it will be destructed when it falls out of scope
     
+    ``tree``
+        A :class:`TempTree` to copy into the new directory
+    
+    ``in_memory``
+        If True and no ``dir`` keyword was given, create the directory in 
+        a memory backed file system (see :func:`memory_root`) if there is 
+        one, so that no disk I/O is done
+    
     Returns an instance of :class:`DeletableDirPath`
     
     """
@@ -30,24 +53,370 @@ def TempIO(deferred=False, **kw):
     if not 'prefix' in kw:
         # a breadcrumb ...
         kw['prefix'] = 'tmp_fixture_'
+    if in_memory and kw.get('dir') is None:
+        kw['dir'] = memory_root()
     
     tmp_path = path.realpath(mkdtemp(**kw))
     root = DeletableDirPath(tmp_path)
     root._deferred = deferred
     _tmpdirs.add(tmp_path)
+    if tree is not None:
+        tree.copy_to(root)
     return root
 
+class TempTree(object):
+    """A directory tree that is declared once and copied into many 
+    :func:`TempIO` directories.
+    
+    The tree can be a dict of relative names to file contents (strings), 
+    to dicts (subdirectories) or to None (empty directories), or the path 
+    to an existing directory::
+    
+        >>> tree = TempTree({
+        ...     'etc': {'app.conf': "debug = true"},
+        ...     'var/log': None})
+        >>> tmp = TempIO(tree=tree)
+        >>> open(tmp.join('etc', 'app.conf')).read()
+        'debug = true'
+        >>> tmp.join('var', 'log').exists()
+        True
+    
+    A dict is written once to a private directory the first time the tree is 
+    copied.  Files are then copied with ``mode``:
+    
+    ``'copy'``
+        each file is copied (the default)
+    ``'link'``
+        each file is hard linked, which is fastest but means the files 
+        are shared: they may be replaced or deleted but must not be 
+        modified in place.  Falls back to copying if linking fails (i.e. 
+        across devices)
+    ``'clone'``
+        the whole tree is copied by one ``cp --reflink=auto`` process, 
+        which shares file blocks copy-on-write on file systems that 
+        support it (btrfs, xfs) and copies them elsewhere.  This needs GNU 
+        cp, so each file is copied instead on platforms other than Linux 
+        or once cp fails
+    
+    """
+    modes = ('copy', 'link', 'clone')
+    
+    def __init__(self, tree, mode='copy'):
+        if mode not in self.modes:
+            raise ValueError(
+                "mode must be one of %s, not %r" % (self.modes, mode))
+        self.tree = tree
+        self.mode = mode
+        self.can_clone = sys.platform.startswith('linux')
+        self.source = None
+        self.dirs = None
+        self.files = None
+    
+    def __repr__(self):
+        return "<%s %s at %s>" % (
+            self.__class__.__name__, self.mode, self.source or '(not built)')
+    
+    def build(self):
+        """writes the tree, if declared as a dict, and lists its 
+        directories and files.
+        
+        This is called by :meth:`copy_to` the first time it is called.
+        """
+        if isinstance(self.tree, basestring):
+            self.source = path.realpath(self.tree)
+        else:
+            self._root = TempIO(deferred=True, prefix='tmp_fixture_tree_')
+            self.source = str(self._root)
+            self._write(self.tree, self.source)
+        dirs, files = [], []
+        for dirpath, dirnames, filenames in os.walk(self.source):
+            rel = dirpath[len(self.source):].lstrip(os.path.sep)
+            dirnames.sort()
+            for name in dirnames:
+                dirs.append(join(rel, name))
+            for name in filenames:
+                files.append(join(rel, name))
+        self.dirs, self.files = dirs, files
+    
+    def _write(self, tree, dest):
+        for name, contents in tree.items():
+            target = join(dest, name)
+            if contents is None or isinstance(contents, dict):
+                if not exists(target):
+                    os.makedirs(target)
+                if contents:
+                    self._write(contents, target)
+            else:
+                putfile(target, contents)
+    
+    def copy_to(self, dest):
+        """copies the tree into the existing directory dest."""
+        if self.source is None:
+            self.build()
+        if self.mode == 'clone' and self.can_clone and self._clone(dest):
+            return
+        # dirs are listed parents first, so no need to walk each path :
+        for d in self.dirs:
+            os.mkdir(join(dest, d))
+        for f in self.files:
+            src, dst = join(self.source, f), join(dest, f)
+            if self.mode == 'link':
+                try:
+                    os.link(src, dst)
+                    continue
+                except (OSError, AttributeError):
+                    pass
+            shutil.copy2(src, dst)
+    
+    def _clone(self, dest):
+        # copies the tree with one GNU cp process; returns False, after 
+        # removing what it copied, if cp failed
+        devnull = open(os.devnull, 'w')
+        try:
+            try:
+                code = subprocess.call(['cp', '-R', '-p', '--reflink=auto', 
+                                        join(self.source, '.'), dest], 
+                                       stderr=devnull)
+            except OSError:
+                code = None
+        finally:
+            devnull.close()
+        if code == 0:
+            return True
+        # i.e. not GNU cp; its files are copied from now on
+        self.can_clone = False
+        for name in os.listdir(self.source):
+            target = join(dest, name)
+            if path.isdir(target) and not path.islink(target):
+                shutil.rmtree(target)
+            elif path.lexists(target):
+                os.remove(target)
+        return False
+
+class TempIOPool(object):
+    """Hands out temporary directories that were created in advance and 
+    recycles them.
+    
+    Getting a directory from a pool is cheaper than calling 
+    :func:`TempIO`: the directories are made, ``size`` at a time, with 
+    ``os.mkdir`` in one parent directory whose real path is only looked up 
+    once.  When a directory falls out of scope (or its ``rmtree()`` is 
+    called) its contents are removed and the same path goes back into the 
+    pool, so a copy of that path may point to a new directory later::
+    
+        >>> pool = TempIOPool(size=2)
+        >>> tmp = pool.get()
+        >>> foo = tmp.putfile("foo.txt", "foo")
+        >>> tmp.rmtree()
+        >>> os.path.exists(foo)
+        False
+    
+    Takes the same keyword args as tempfile.mkdtemp for the parent directory, 
+    plus ``in_memory`` (see :func:`TempIO`).  The parent directory is 
+    removed atexit.
+    """
+    def __init__(self, size=10, in_memory=False, **kw):
+        if not 'prefix' in kw:
+            kw['prefix'] = 'tmp_fixture_pool_'
+        if in_memory and kw.get('dir') is None:
+            kw['dir'] = memory_root()
+        self.size = size
+        self.parent = path.realpath(mkdtemp(**kw))
+        _tmpdirs.add(self.parent)
+        self.free = []
+        self._made = 0
+        self._lock = threading.Lock()
+        self.fill()
+    
+    def __repr__(self):
+        return "<%s at %s (%s free)>" % (
+                    self.__class__.__name__, self.parent, len(self.free))
+    
+    def fill(self):
+        """makes directories until ``size`` of them are free."""
+        self._lock.acquire()
+        try:
+            while len(self.free) < self.size:
+                self._made += 1
+                tmp_path = join(self.parent, 'tmp_%d' % self._made)
+                os.mkdir(tmp_path)
+                self.free.append(tmp_path)
+        finally:
+            self._lock.release()
+    
+    def get(self, deferred=False, tree=None):
+        """returns a :class:`DeletableDirPath` from the pool.
+        
+        ``deferred`` and ``tree`` work like they do in :func:`TempIO`.
+        """
+        try:
+            tmp_path = self.free.pop()
+        except IndexError:
+            self.fill()
+            tmp_path = self.free.pop()
+        root = DeletableDirPath(tmp_path)
+        root._deferred = deferred
+        root._pool = self
+        if tree is not None:
+            tree.copy_to(root)
+        return root
+    
+    def release(self, tmpdir):
+        """empties tmpdir and puts it back in the pool once it is empty.
+        
+        With :class:`BackgroundCleanup` it is emptied on the background 
+        thread, meanwhile the pool hands out other directories.
+        """
+        _cleanup.empty(str(tmpdir), self.recycle)
+    
+    def recycle(self, tmpdir):
+        """puts tmpdir, which is empty, back in the pool."""
+        self._lock.acquire()
+        try:
+            self.free.append(tmpdir)
+        finally:
+            self._lock.release()
+
+class Cleanup(object):
+    """Removes temporary directories as soon as they are released.
+    
+    This is the default.  See :func:`set_cleanup`.
+    """
+    def remove(self, tmpdir):
+        """removes tmpdir and everything under it."""
+        if exists(tmpdir):
+            shutil.rmtree(tmpdir)
+    
+    def empty(self, tmpdir, done):
+        """removes everything under tmpdir, then calls done(tmpdir)."""
+        _empty(tmpdir)
+        done(tmpdir)
+    
+    def flush(self):
+        """returns once all directories passed to remove() are removed 
+        and all directories passed to empty() are empty.
+        """
+        pass
+
+class BackgroundCleanup(Cleanup):
+    """Moves temporary directories into a graveyard and removes them on a 
+    background thread.
+    
+    A released directory is renamed into a graveyard directory made next to 
+    it, so that it is gone from its path right away, without waiting for 
+    its files to be deleted.  If renaming fails, the directory is removed 
+    right away.  Directories of a :class:`TempIOPool` are emptied on the 
+    thread and only then go back to their pool.  :func:`flush` (called 
+    atexit) waits for the thread to finish and removes the graveyards.
+    """
+    def __init__(self):
+        self.graveyards = {}
+        self.queue = Queue.Queue()
+        self.thread = None
+        self._buried = 0
+        self._lock = threading.Lock()
+    
+    def graveyard(self, parent):
+        """returns the graveyard directory for directories in parent."""
+        self._lock.acquire()
+        try:
+            if parent not in self.graveyards:
+                self.graveyards[parent] = mkdtemp(
+                            prefix='tmp_fixture_graveyard_', dir=parent)
+            self._buried += 1
+            return self.graveyards[parent], self._buried
+        finally:
+            self._lock.release()
+    
+    def remove(self, tmpdir):
+        if not exists(tmpdir):
+            return
+        try:
+            graveyard, n = self.graveyard(path.dirname(tmpdir))
+            target = join(graveyard, "%s.%d" % (basename(tmpdir), n))
+            os.rename(tmpdir, target)
+        except OSError:
+            Cleanup.remove(self, tmpdir)
+            return
+        self.start()
+        self.queue.put((target, None))
+    
+    def empty(self, tmpdir, done):
+        self.start()
+        self.queue.put((tmpdir, done))
+    
+    def start(self):
+        """starts the background thread, if not started."""
+        if self.thread is not None:
+            return
+        self._lock.acquire()
+        try:
+            if self.thread is None:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self.thread = thread
+        finally:
+            self._lock.release()
+    
+    def _work(self):
+        while True:
+            target, done = self.queue.get()
+            try:
+                if done is None:
+                    shutil.rmtree(target, ignore_errors=True)
+                else:
+                    _empty(target)
+                    done(target)
+            finally:
+                self.queue.task_done()
+    
+    def flush(self):
+        self.queue.join()
+        for graveyard in self.graveyards.values():
+            shutil.rmtree(graveyard, ignore_errors=True)
+        self.graveyards = {}
+
+def _empty(tmpdir):
+    """removes everything under tmpdir."""
+    try:
+        names = os.listdir(tmpdir)
+    except OSError:
+        return
+    for name in names:
+        name = join(tmpdir, name)
+        if path.isdir(name) and not path.islink(name):
+            shutil.rmtree(name, ignore_errors=True)
+        else:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+_cleanup = Cleanup()
+
+def set_cleanup(cleanup):
+    """sets the :class:`Cleanup` object that removes all temporary 
+    directories from now on, i.e. ``set_cleanup(BackgroundCleanup())``.
+    
+    Returns the previous one, after flushing it.
+    """
+    global _cleanup
+    previous = _cleanup
+    _cleanup = cleanup
+    previous.flush()
+    return previous
+
 def _expunge(tmpdir):
     """called internally to remove a tmp dir."""
-    if exists(tmpdir):
-        import shutil
-        shutil.rmtree(tmpdir)
+    _cleanup.remove(tmpdir)
 
 def _expunge_all():
     """exit function to remove all registered tmp dirs."""
     if _tmpdirs:
         for d in _tmpdirs:
             _expunge(d)
+    _cleanup.flush()
     
 # this seems to be a safer way to clean up since __del__ can
 # be called in an unpredictable environment :
@@ -204,6 +573,9 @@ class DeletableDirPath(DirPath):
     .. note:: Use the :func:`TempIO` function to create an instance
     
     """
+    _pool = None
+    _released = False
+    
     def __del__(self):
         """
         removes the root directory and everything under it.
@@ -212,20 +584,29 @@ class DeletableDirPath(DirPath):
             # atexit will handle it ...
             return
         try:
-            _expunge(self)
+            self._release()
         except:
             # means atexit didn't get it and there was some other exception
             # due to the unpredictable state of python's destructors; there is
             # nothing really to do
             pass
     
+    def _release(self):
+        if self._pool is None:
+            _expunge(self)
+        elif not self._released:
+            # only once, since the path may be handed out again
+            self._released = True
+            self._pool.release(self)
+    
     def rmtree(self):
         """forcefully removes the root directory and everything under it.
         
         This can be trusted more than :meth:`del self <fixture.io.DeletableDirPath.__del__>` because it is guaranteed to 
-        remove the directory tree.
+        remove the directory tree.  A directory from a :class:`TempIOPool` 
+        is emptied and given back to its pool instead.
         """
-        _expunge(self)
+        self._release()
 
 if __name__ == '__main__':
     import doctest
@@ -5,12 +5,54 @@ See :ref:`Using Fixture With Django <using-fixture-with-django>` for a complete
 """
 
 from fixture.loadable import DBLoadableFixture
+from fixture.loadable.loadable import statement_counter
 from fixture.util import any
 
 __all__ = ('DjangoMedium', 'DjangoFixture', 'DjangoEnv')
 
 DJANGO_ENV_SPLIT = '__'
 
+class CountingCursor(object):
+    """Wraps a cursor to count the statements it executes with counter"""
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+    
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+    
+    def __iter__(self):
+        return iter(self.cursor)
+    
+    def execute(self, sql, params=()):
+        self.counter.executed()
+        return self.cursor.execute(sql, params)
+    
+    def executemany(self, sql, param_list):
+        param_list = list(param_list)
+        self.counter.executed(len(param_list))
+        return self.cursor.executemany(sql, param_list)
+
+_statement_hook_installed = False
+
+def install_statement_hook():
+    """makes django connections return a :class:`CountingCursor` while a 
+    :class:`StatementCounter <fixture.loadable.loadable.StatementCounter>` 
+    counts for the calling thread"""
+    global _statement_hook_installed
+    if _statement_hook_installed:
+        return
+    from django.db.backends import BaseDatabaseWrapper
+    get_cursor = BaseDatabaseWrapper.cursor
+    def cursor(self):
+        cursor = get_cursor(self)
+        counter = statement_counter()
+        if counter is not None:
+            cursor = CountingCursor(cursor, counter)
+        return cursor
+    BaseDatabaseWrapper.cursor = cursor
+    _statement_hook_installed = True
+
 pretty_model_name = lambda model: '.'.join([model._meta.app_label,
                                           model._meta.object_name])
 
@@ -31,9 +73,61 @@ def field_is_required(field):
               getattr(field, 'auto_now_add', False)]
     return not any(fields)
 
+def has_receivers(signal, sender):
+    """Is a receiver connected to signal for sender (or for any sender)"""
+    if hasattr(signal, 'has_listeners'):
+        return signal.has_listeners(sender)
+    from django.dispatch.dispatcher import _make_id
+    sender_keys = (_make_id(None), _make_id(sender))
+    return any([key[1] in sender_keys for key, receiver in signal.receivers])
+
+def saves_itself(model):
+    """Does saving model run code of its own, i.e. a save() method or a 
+    pre_save / post_save receiver, that inserting its rows directly would 
+    skip"""
+    from django.db.models import Model, signals
+    if getattr(model.save, 'im_func', None) is not Model.save.im_func:
+        return True
+    return (has_receivers(signals.pre_save, model) or 
+            has_receivers(signals.post_save, model))
+
+def deletes_more(model):
+    """Does deleting rows of model do more than deleting them, i.e. delete 
+    related rows or links, or send ``pre_delete`` / ``post_delete``"""
+    from django.db.models import signals
+    opts = model._meta
+    if (opts.parents or opts.many_to_many or 
+            opts.get_all_related_objects() or 
+            opts.get_all_related_many_to_many_objects()):
+        return True
+    return (has_receivers(signals.pre_delete, model) or 
+            has_receivers(signals.post_delete, model))
+
 class DjangoMedium(DBLoadableFixture.StorageMediumAdapter):
     """Adapter for storing data using django models
+    
+    Each row is saved with ``save()`` by default.  If ``batch_size`` is set, 
+    rows that declare their primary key are inserted ``batch_size`` at a 
+    time, without calling ``save()`` or sending ``pre_save`` / ``post_save``, 
+    and many-to-many links are inserted in batches once all rows of the 
+    DataSet were saved.  Rows of models that define their own ``save()`` or 
+    have ``pre_save`` / ``post_save`` receivers are still saved one at a 
+    time, as are rows whose keys are needed right away.  If 
+    ``get_or_create`` is True each row is saved with 
+    ``manager.get_or_create()`` instead, so rows that already exist are 
+    reused.
+    
+    The sequence of a table whose rows were inserted with explicit primary 
+    keys is reset afterwards, like ``manage.py loaddata`` does.
     """
+    get_or_create = False
+    batch_size = None
+    
+    def __init__(self, *a, **kw):
+        DBLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
+        self._pending = []
+        self._links = {}
+        self._explicit_keys = False
     
     def clear(self, obj):
         """Delete this object from the DB
@@ -42,6 +136,33 @@ class DjangoMedium(DBLoadableFixture.StorageMediumAdapter):
         :type obj: A django model
         """
         obj.delete()
+    
+    def clear_many(self, primary_keys):
+        """Delete the rows with these primary keys with one statement, 
+        unless deleting them does more than that (see :func:`deletes_more`); 
+        then they are deleted with ``QuerySet.delete()``
+        """
+        if not primary_keys:
+            return
+        model = self.medium
+        names = self.dataset.meta.primary_key
+        manager = model._default_manager
+        if len(names) != 1:
+            for primary_key in primary_keys:
+                manager.filter(**dict(zip(names, primary_key))).delete()
+            return
+        values = [pk[0] for pk in primary_keys]
+        if deletes_more(model):
+            manager.filter(**{'%s__in' % names[0]: values}).delete()
+            return
+        from django.db import connection
+        qn = connection.ops.quote_name
+        field = model._meta.get_field(names[0])
+        sql = "DELETE FROM %s WHERE %s IN (%s)" % (
+                    qn(model._meta.db_table), qn(field.column), 
+                    ", ".join(["%s"] * len(values)))
+        connection.cursor().execute(
+                    sql, field.get_db_prep_lookup('in', values))
 
     def _annotate_invalid_schema_exception(self, model, key):
         """Try and add more context to any error message"""
@@ -137,26 +258,122 @@ class DjangoMedium(DBLoadableFixture.StorageMediumAdapter):
         for key, val in column_vals:
             if key in field_names:
                 dbvals[key] = val
-        new_obj = manager.get_or_create(**dbvals)[0]
         columns = dict(column_vals)
+        if self.get_or_create:
+            new_obj = manager.get_or_create(**dbvals)[0]
+            for m2m in m2m_field_names:
+                if m2m in columns:
+                    getattr(new_obj, m2m).add(*columns[m2m])
+            return new_obj
+        
+        new_obj = model(**dbvals)
+        if new_obj.pk is not None:
+            self._explicit_keys = True
+        if (self.batch_size and new_obj.pk is not None and 
+                not model._meta.parents and not saves_itself(model)):
+            self._pending.append(new_obj)
+            if len(self._pending) >= self.batch_size:
+                self.flush_rows()
+        else:
+            # keep rows in order :
+            self.flush_rows()
+            new_obj.save(force_insert=True)
         for m2m in m2m_field_names:
             if m2m in columns:
-                getattr(new_obj, m2m).add(*columns[m2m])
+                self._links.setdefault(m2m, []).append((new_obj, columns[m2m]))
         return new_obj
-        
+    
+    def flush_rows(self):
+        """Insert the rows waiting to be inserted with one statement"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        from django.db import connection
+        qn = connection.ops.quote_name
+        opts = self.medium._meta
+        fields = opts.local_fields
+        sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+                    qn(opts.db_table), 
+                    ", ".join([qn(f.column) for f in fields]),
+                    ", ".join(["%s"] * len(fields)))
+        params = [[f.get_db_prep_save(f.pre_save(obj, True)) for f in fields]
+                    for obj in pending]
+        connection.cursor().executemany(sql, params)
+    
+    def reset_sequence(self):
+        """Reset the sequence of the model's table past the primary keys 
+        that rows were inserted with"""
+        from django.core.management.color import no_style
+        from django.db import connection
+        statements = connection.ops.sequence_reset_sql(
+                                            no_style(), [self.medium])
+        if statements:
+            cursor = connection.cursor()
+            for sql in statements:
+                cursor.execute(sql)
+    
+    def flush(self):
+        """Insert the remaining rows and all many-to-many links"""
+        self.flush_rows()
+        if self._explicit_keys:
+            self._explicit_keys = False
+            self.reset_sequence()
+        links, self._links = self._links, {}
+        if not links:
+            return
+        from django.db import connection
+        qn = connection.ops.quote_name
+        for name, objs in links.items():
+            field = self.medium._meta.get_field(name)
+            if not self.batch_size or getattr(field.rel, 'through', None):
+                # unbatched, or the through model may need more columns
+                for obj, related in objs:
+                    getattr(obj, name).add(*related)
+                continue
+            sql = "INSERT INTO %s (%s, %s) VALUES (%%s, %%s)" % (
+                        qn(field.m2m_db_table()), 
+                        qn(field.m2m_column_name()), 
+                        qn(field.m2m_reverse_name()))
+            params = []
+            seen = set()
+            for obj, related in objs:
+                for rel_obj in related:
+                    link = (obj.pk, rel_obj.pk)
+                    if link not in seen:
+                        seen.add(link)
+                        params.append(link)
+            for i in range(0, len(params), self.batch_size):
+                connection.cursor().executemany(
+                                sql, params[i:i+self.batch_size])
     
     def visit_loader(self, loader):
         """Visit the loader and store a reference to the transaction connection"""
         self.transaction = loader.transaction
+        self.get_or_create = getattr(
+                            loader, 'get_or_create', self.get_or_create)
+        self.batch_size = getattr(loader, 'batch_size', self.batch_size)
 
 class DjangoFixture(DBLoadableFixture):
     """A fixture that knows how to load DataSet objects via `Django Model <http://docs.djangoproject.com/en/dev/topics/db/models/#topics-db-models>`_ classes.
+    
+    Rows are saved with ``save()`` one at a time.  Pass a ``batch_size`` to 
+    insert rows that declare their primary key in batches, which skips 
+    ``save()`` and the ``pre_save`` / ``post_save`` signals for models that 
+    do not use them, or ``get_or_create=True`` to reuse rows that already 
+    exist; see :class:`DjangoMedium`.
+    
+    Pass ``count_statements=True`` or a ``query_budget`` to count the 
+    statements of each DataSet (see :class:`LoadableFixture 
+    <fixture.loadable.loadable.LoadableFixture>`); they are counted by 
+    wrapping the cursors of django's connection.
     """
             
-    def __init__(self, **kw):
+    def __init__(self, get_or_create=False, batch_size=None, **kw):
         if not kw.get('env', None):
             kw['env'] = DjangoEnv
         DBLoadableFixture.__init__(self, **kw)
+        self.get_or_create = get_or_create
+        self.batch_size = batch_size
     
     DjangoMedium = DjangoMedium
     Medium = DjangoMedium
@@ -171,6 +388,11 @@ class DjangoFixture(DBLoadableFixture):
         transaction.enter_transaction_management()
         return transaction
     
+    def install_statement_hook(self):
+        """Counts the statements of django's cursors.  See 
+        :func:`install_statement_hook`."""
+        install_statement_hook()
+    
     def then_finally(self, unloading=False):
         """Not sure if this is needed, leaving it in for a reminder"""
         from django.db import transaction
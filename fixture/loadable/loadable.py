@@ -5,18 +5,107 @@ See :ref:`Using LoadableFixture<using-loadable-fixture>` for examples.
 
 """
 # from __future__ import with_statement
-__all__ = ['LoadableFixture', 'EnvLoadableFixture', 'DBLoadableFixture', 'DeferredStoredObject']
+__all__ = ['LoadableFixture', 'EnvLoadableFixture', 'DBLoadableFixture', 
+           'DeferredStoredObject', 'DataKeeper', 'StatementCounter', 
+           'count_statement']
 import sys, types
+from thread import get_ident
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
 from fixture.base import Fixture
 from fixture.util import ObjRegistry, _mklog
 from fixture.style import OriginalStyle
 from fixture.dataset import Ref, dataset_registry, DataRow, is_rowlike
-from fixture.exc import UninitializedError, LoadError, UnloadError, StorageMediaNotFound
+from fixture.dataset.generated import GeneratedDataSet, GeneratedRow
+from fixture.exc import (
+    UninitializedError, LoadError, UnloadError, StorageMediaNotFound, 
+    QueryBudgetExceeded)
 import logging
 
 log     = _mklog("fixture.loadable")
 treelog = _mklog("fixture.loadable.tree")
 
+# thread ident -> StatementCounter counting for that thread :
+_statement_counters = {}
+
+def count_statement(statements=1):
+    """reports a round trip to the database that ran this many statements.
+    
+    Loaders install hooks that call this for each statement they execute; 
+    it is counted by the :class:`StatementCounter` of the calling thread, 
+    if any.
+    """
+    counter = _statement_counters.get(get_ident())
+    if counter is not None:
+        counter.executed(statements)
+
+def statement_counter():
+    """returns the :class:`StatementCounter` counting for the calling 
+    thread or None"""
+    return _statement_counters.get(get_ident())
+
+class StatementCount(object):
+    """The number of statements and of round trips to the database"""
+    def __init__(self):
+        self.statements = 0
+        self.round_trips = 0
+    
+    def __repr__(self):
+        return "<%s %s statements in %s round trips>" % (
+                self.__class__.__name__, self.statements, self.round_trips)
+
+class StatementCounter(object):
+    """Counts the statements a loader makes for each DataSet.
+    
+    ``load`` and ``unload`` are dicts of DataSet class names to the 
+    :class:`StatementCount` made loading or unloading each of them.  
+    Statements made outside of a DataSet, i.e. to begin or commit the 
+    transaction, are counted in ``other``.
+    """
+    def __init__(self):
+        self.load = {}
+        self.unload = {}
+        self.other = StatementCount()
+        self._current = self.other
+    
+    def __repr__(self):
+        return "<%s load=%s unload=%s other=%s>" % (
+                self.__class__.__name__, self.total('load'), 
+                self.total('unload'), self.other.statements)
+    
+    def start(self):
+        """count statements made by the calling thread"""
+        _statement_counters[get_ident()] = self
+    
+    def stop(self):
+        """stop counting statements made by the calling thread"""
+        if _statement_counters.get(get_ident()) is self:
+            del _statement_counters[get_ident()]
+        self._current = self.other
+    
+    def count_for(self, phase, dataset=None):
+        """count the next statements for dataset in phase ('load' or 
+        'unload'), or in ``other`` if dataset is None"""
+        if dataset is None:
+            self._current = self.other
+            return
+        counts = getattr(self, phase)
+        name = dataset.__class__.__name__
+        if name not in counts:
+            counts[name] = StatementCount()
+        self._current = counts[name]
+    
+    def executed(self, statements=1):
+        """counts a round trip that ran this many statements"""
+        self._current.statements += statements
+        self._current.round_trips += 1
+    
+    def total(self, phase):
+        """returns the number of statements made in phase for all DataSets"""
+        return sum([c.statements for c in getattr(self, phase).values()])
+
 class StorageMediumAdapter(object):
     """common interface for working with storable objects.
     """
@@ -55,6 +144,68 @@ class StorageMediumAdapter(object):
         column_vals is an iterable of (column_name, column_value)
         """
         raise NotImplementedError
+    
+    def flush(self):
+        """Called after all rows of the DataSet were saved.
+        
+        A medium that saves rows in batches must save the rest here.
+        """
+        pass
+    
+    def save_many(self, rows):
+        """Save a chunk of rows of a :class:`GeneratedDataSet 
+        <fixture.dataset.GeneratedDataSet>`, each a dict of column values.
+        
+        Nothing is returned since the stored objects are not kept.  By 
+        default each row is saved with :meth:`save`.
+        """
+        for values in rows:
+            self.save(GeneratedRow(values), values.items())
+    
+    def clear_many(self, primary_keys):
+        """Clear the stored objects of a :class:`GeneratedDataSet 
+        <fixture.dataset.GeneratedDataSet>` with these primary keys (lists of 
+        values).
+        
+        By default each object is found with :meth:`fetch` and cleared with 
+        :meth:`clear`.
+        """
+        for primary_key in primary_keys:
+            obj = self.fetch(primary_key)
+            if obj is not None:
+                self.clear(obj)
+    
+    def fetch(self, primary_key):
+        """Must return the stored object with this primary key (a list of 
+        values) or None if there is none.
+        
+        Only needed to keep data loaded; see :class:`DBLoadableFixture`.
+        """
+        raise NotImplementedError
+    
+    def fetch_many(self, primary_keys):
+        """Return the stored objects with these primary keys (lists of 
+        values), in the same order, with None where there is none.
+        
+        By default each object is found with :meth:`fetch`.  Only needed to 
+        keep data loaded; see :class:`DBLoadableFixture`.
+        """
+        return [self.fetch(primary_key) for primary_key in primary_keys]
+    
+    def update(self, obj, row, column_vals):
+        """Must update the stored object obj with column_vals and return it.
+        
+        Only needed to keep data loaded; see :class:`DBLoadableFixture`.
+        """
+        raise NotImplementedError
+    
+    def primary_key(self, obj):
+        """Must return the primary key of the stored object obj as a list of 
+        values.
+        
+        Only needed to keep data loaded; see :class:`DBLoadableFixture`.
+        """
+        raise NotImplementedError
         
     def visit_loader(self, loader):
         """A chance to visit the LoadableFixture object.
@@ -80,61 +231,77 @@ class LoadQueue(ObjRegistry):
 
     def __init__(self):
         ObjRegistry.__init__(self)
-        self.tree = {}
         self.limit = {}
+        self.pushed = []
     
     def __repr__(self):
         return "<%s at %s>" % (
                 self.__class__.__name__, hex(id(self)))
     
-    def _pushid(self, id, level):
-        if id in self.limit:
+    def _pushkey(self, key, level):
+        if key in self.limit:
             # only store the object at its highest level:
-            if level > self.limit[id]:
-                self.tree[self.limit[id]].remove(id)
-                del self.limit[id]
-            else:
+            if level <= self.limit[key]:
                 return
-        self.tree.setdefault(level, [])
-        self.tree[level].append(id)
-        self.limit[id] = level
+        # the entry at the old level is not removed here, it just goes 
+        # stale and is skipped when the levels are built :
+        self.pushed.append((key, level))
+        self.limit[key] = level
     
     def clear(self):
         """clear internal registry"""
         ObjRegistry.clear(self)
         # this is an attempt to free up refs to database connections:
-        self.tree = {}
         self.limit = {}
+        self.pushed = []
+    
+    def levels(self):
+        """returns a list of (level, [obj, ...]) in unload order.
+        
+        Levels are sorted lowest first and objects in each level are 
+        ordered by when they were last pushed to that level.
+        """
+        tree = {}
+        for key, level in self.pushed:
+            if self.limit.get(key) != level:
+                # it was referenced again at a higher level
+                continue
+            tree.setdefault(level, []).append(self.registry[key])
+        level_nums = tree.keys()
+        level_nums.sort()
+        return [(level, tree[level]) for level in level_nums]
     
     def register(self, obj, level):
         """register this object as "loaded" at level
         """
-        id = ObjRegistry.register(self, obj)
-        self._pushid(id, level)
-        return id
+        key = ObjRegistry.register(self, obj)
+        self._pushkey(key, level)
+        return key
     
     def referenced(self, obj, level):
         """tell the queue that this object was referenced again at level.
         """
-        id = self.id(obj)
-        self._pushid(id, level)
+        self._pushkey(self.key(obj), level)
     
     def to_unload(self):
         """yields a list of objects in an order suitable for unloading.
         """
-        level_nums = self.tree.keys()
-        level_nums.sort()
         treelog.info("*** unload order ***")
-        for level in level_nums:
-            unload_queue = self.tree[level]
+        for level, unload_queue in self.levels():
             verbose_obj = []
             
-            for id in unload_queue:
-                obj = self.registry[id]
+            for obj in unload_queue:
                 verbose_obj.append(obj.__class__.__name__)
                 yield obj
             
             treelog.info("%s. %s", level, verbose_obj)
+    
+    def unload_order(self):
+        """returns a flat list of objects in the order of :meth:`to_unload`"""
+        order = []
+        for level, objects in self.levels():
+            order.extend(objects)
+        return order
             
 class LoadableFixture(Fixture):
     """
@@ -154,18 +321,52 @@ class LoadableFixture(Fixture):
     medium
         optional LoadableFixture.StorageMediumAdapter to store DataSet 
         objects with
+    dataset_registry
+        optional :class:`ObjRegistry <fixture.util.ObjRegistry>` to keep 
+        shared DataSet instances in while this fixture loads and unloads.  
+        By default they are kept in the registry of the calling thread.  Give 
+        each fixture its own registry if several fixtures load data 
+        in the same thread at the same time.
+    strict_release
+        if True, :meth:`release` is called after unloading so that nothing 
+        keeps the unloaded data alive
+    count_statements
+        if True, the statements made to load and unload each DataSet are 
+        counted in a :class:`StatementCounter` kept as ``self.statements``
+    query_budget
+        the number of statements each DataSet may make to load or unload, 
+        or a dict of DataSet class names to that number, all of which must 
+        be loaded.  Going over it raises :class:`QueryBudgetExceeded 
+        <fixture.exc.QueryBudgetExceeded>` (and rolls back the load).  
+        Statements are counted as with ``count_statements``
     
     """
     style = OriginalStyle()
     dataclass = Fixture.dataclass
+    dataset_registry = None
+    strict_release = False
+    count_statements = False
+    query_budget = None
+    statements = None
     
-    def __init__(self, style=None, medium=None, **kw):
+    def __init__(self, style=None, medium=None, dataset_registry=None, 
+                        strict_release=False, count_statements=False, 
+                        query_budget=None, **kw):
         Fixture.__init__(self, loader=self, **kw)
         if style:
             self.style = style
         if medium:
             self.Medium = medium
+        if dataset_registry is not None:
+            self.dataset_registry = dataset_registry
+        if strict_release:
+            self.strict_release = strict_release
+        if count_statements:
+            self.count_statements = count_statements
+        if query_budget is not None:
+            self.query_budget = query_budget
         self.loaded = None
+        self._bound_refs = set()
     
     StorageMediumAdapter = StorageMediumAdapter
     Medium = StorageMediumAdapter
@@ -180,6 +381,47 @@ class LoadableFixture(Fixture):
         """begin loading"""
         if not unloading:
             self.loaded = self.LoadQueue()
+            self._bound_refs = set()
+            if self.count_statements or self.query_budget is not None:
+                self.install_statement_hook()
+                self.statements = StatementCounter()
+        if self.statements is not None:
+            self.statements.start()
+    
+    def install_statement_hook(self):
+        """must make the database report each round trip with 
+        :func:`count_statement`.  Called before each load when statements 
+        are counted, so it must only install its hook once."""
+        raise NotImplementedError(
+                "%s cannot count statements" % self.__class__.__name__)
+    
+    def check_query_budget(self, phase):
+        """raises :class:`QueryBudgetExceeded 
+        <fixture.exc.QueryBudgetExceeded>` if a DataSet made more 
+        statements in phase ('load' or 'unload') than ``query_budget`` 
+        allows.
+        
+        A ValueError is raised when loading if ``query_budget`` names a 
+        DataSet that was not loaded, i.e. a misspelled one."""
+        budget = self.query_budget
+        counts = getattr(self.statements, phase)
+        if isinstance(budget, dict) and phase == 'load':
+            unknown = [name for name in sorted(budget) if name not in counts]
+            if unknown:
+                raise ValueError(
+                    "query_budget names DataSets that were not loaded: %s" % (
+                                                    ", ".join(unknown)))
+        over = []
+        for name, count in sorted(counts.items()):
+            if isinstance(budget, dict):
+                limit = budget.get(name)
+            else:
+                limit = budget
+            if limit is not None and count.statements > limit:
+                over.append("%s made %s statements to %s (budget: %s)" % (
+                                    name, count.statements, phase, limit))
+        if over:
+            raise QueryBudgetExceeded("; ".join(over))
     
     def commit(self):
         """commit load transaction"""
@@ -190,7 +432,14 @@ class LoadableFixture(Fixture):
         def loader():
             for ds in data:
                 self.load_dataset(ds)
+            self.finish_load()
+            if self.query_budget is not None:
+                self.check_query_budget('load')
         self.wrap_in_transaction(loader, unloading=False)
+    
+    def finish_load(self):
+        """called in the load transaction after all datasets were loaded"""
+        pass
         
     def load_dataset(self, ds, level=1):
         """load this dataset and all its dependent datasets.
@@ -221,6 +470,19 @@ class LoadableFixture(Fixture):
             self.loaded.referenced(ds, level)
             return
         
+        if self.statements is not None:
+            self.statements.count_for('load', ds)
+        try:
+            if isinstance(ds, GeneratedDataSet):
+                self.store_generated_dataset(ds, level)
+            else:
+                self.store_dataset(ds, level)
+        finally:
+            if self.statements is not None:
+                self.statements.count_for(None)
+    
+    def store_dataset(self, ds, level):
+        """store all rows of this dataset with its storage medium."""
         log.info("LOADING rows in %s", ds)
         ds.meta.storage_medium.visit_loader(self)
         registered = False
@@ -232,7 +494,7 @@ class LoadableFixture(Fixture):
                 def column_vals():
                     for c in row.columns():
                         yield (c, self.resolve_stored_object(getattr(row, c)))
-                obj = ds.meta.storage_medium.save(row, column_vals())
+                obj = self.save_row(ds, key, row, column_vals())
                 ds.meta._stored_objects.store(key, obj)
                 # save the instance in place of the class...
                 ds._setdata(key, row)
@@ -243,6 +505,31 @@ class LoadableFixture(Fixture):
             except Exception, e:
                 etype, val, tb = sys.exc_info()
                 raise LoadError(etype, val, ds, key=key, row=row), None, tb
+        try:
+            ds.meta.storage_medium.flush()
+        except Exception, e:
+            etype, val, tb = sys.exc_info()
+            raise LoadError(etype, val, ds), None, tb
+    
+    def store_generated_dataset(self, ds, level):
+        """store the rows of a :class:`GeneratedDataSet 
+        <fixture.dataset.GeneratedDataSet>` with its storage medium, 
+        ``chunk_size`` rows at a time.  No stored objects are kept."""
+        log.info("GENERATING rows in %s", ds)
+        medium = ds.meta.storage_medium
+        medium.visit_loader(self)
+        self.loaded.register(ds, level)
+        try:
+            for rows in ds.chunks():
+                medium.save_many(rows)
+                medium.flush()
+        except Exception, e:
+            etype, val, tb = sys.exc_info()
+            raise LoadError(etype, val, ds), None, tb
+    
+    def save_row(self, ds, key, row, column_vals):
+        """save a row of ds and return the stored object."""
+        return ds.meta.storage_medium.save(row, column_vals)
     
     def resolve_row_references(self, current_dataset, row):        
         """resolve this DataRow object's referenced values.
@@ -275,7 +562,15 @@ class LoadableFixture(Fixture):
                 ref = val.ref
                 # now the ref will return the attribute from a stored object 
                 # when __get__ is invoked
-                ref.dataset_obj = self.loaded[ref.dataset_class]
+                loaded_ds = self.loaded[ref.dataset_class]
+                current_dataset.meta._loaded_references[
+                                            ref.dataset_class] = loaded_ds
+                if self.dataset_registry is None:
+                    # a loader with its own registry may be loading at the 
+                    # same time as others, so it leaves the class level 
+                    # reference alone
+                    ref.dataset_obj = loaded_ds
+                    self._bound_refs.add(ref)
     
     def rollback(self):
         """rollback load transaction"""
@@ -291,30 +586,87 @@ class LoadableFixture(Fixture):
             raise UninitializedError(
                 "Cannot unload data because it has not yet been loaded in this "
                 "process.  Call data.setup() before data.teardown()")
+        unloaded = self.loaded.unload_order()
         def unloader():
             for dataset in self.loaded.to_unload():
-                self.unload_dataset(dataset)
+                if self.statements is not None:
+                    self.statements.count_for('unload', dataset)
+                try:
+                    self.unload_dataset(dataset)
+                finally:
+                    if self.statements is not None:
+                        self.statements.count_for(None)
+                dataset.meta._stored_objects.forget_values()
             self.loaded.clear()
             dataset_registry.clear()
-        self.wrap_in_transaction(unloader, unloading=True)
+        try:
+            self.wrap_in_transaction(unloader, unloading=True)
+            if self.query_budget is not None and self.statements is not None:
+                self.check_query_budget('unload')
+        finally:
+            if self.strict_release:
+                self.release(unloaded)
+    
+    def release(self, datasets):
+        """drops references to the data of unloaded datasets.
+        
+        Class level :class:`Ref <fixture.dataset.Ref>` objects that were 
+        pointed at a loaded DataSet are reset, stored objects are forgotten 
+        and storage media are detached.
+        """
+        bound_refs, self._bound_refs = self._bound_refs, set()
+        unloaded = set([id(ds) for ds in datasets])
+        for ref in bound_refs:
+            # unless another loader has bound it since :
+            if id(ref.dataset_obj) in unloaded:
+                ref.dataset_obj = None
+        for ds in datasets:
+            ds.meta._stored_objects.clear()
+            ds.meta._loaded_references.clear()
+            ds.meta.storage_medium = None
     
     def unload_dataset(self, dataset):
         """unload data stored for this dataset"""
+        if isinstance(dataset, GeneratedDataSet):
+            self.unload_generated_dataset(dataset)
+            return
         dataset.meta.storage_medium.clearall()
     
+    def unload_generated_dataset(self, dataset):
+        """clear the rows of a :class:`GeneratedDataSet 
+        <fixture.dataset.GeneratedDataSet>` by generating their primary keys 
+        again"""
+        log.info("CLEARING generated rows for %s", dataset)
+        medium = dataset.meta.storage_medium
+        primary_key = dataset.meta.primary_key
+        try:
+            for rows in dataset.chunks(columns=primary_key):
+                medium.clear_many([[r[k] for k in primary_key] for r in rows])
+        except Exception, e:
+            etype, val, tb = sys.exc_info()
+            raise UnloadError(etype, val, dataset), None, tb
+    
     def wrap_in_transaction(self, routine, unloading=False):
         """call routine in a load transaction"""
-        self.begin(unloading=unloading)
+        if self.dataset_registry is not None:
+            dataset_registry.push(self.dataset_registry)
         try:
+            self.begin(unloading=unloading)
             try:
-                routine()
-            except:
-                self.rollback()
-                raise
-            else:
-                self.commit()
+                try:
+                    routine()
+                except:
+                    self.rollback()
+                    raise
+                else:
+                    self.commit()
+            finally:
+                self.then_finally(unloading=unloading)
         finally:
-            self.then_finally(unloading=unloading)
+            if self.statements is not None:
+                self.statements.stop()
+            if self.dataset_registry is not None:
+                dataset_registry.pop()
 
 class EnvLoadableFixture(LoadableFixture):
     """An abstract fixture that can resolve DataSet objects from an env.
@@ -322,10 +674,45 @@ class EnvLoadableFixture(LoadableFixture):
     Keyword "env" should be a dict or a module if not None.
     According to the style rules, the env will be used to find objects by name.
     
+    Storage media found for each DataSet class are remembered until ``env``, 
+    ``style``, ``Medium`` or ``medium_factory`` is replaced; call 
+    :meth:`forget_storage_media` after changing the contents of ``env``.
+    
     """
+    _media = None
+    
     def __init__(self, env=None, **kw):
         LoadableFixture.__init__(self, **kw)
         self.env = env
+        self.forget_storage_media()
+    
+    def forget_storage_media(self):
+        """forget storage media found for DataSet classes so far."""
+        self._media = {}
+        self._media_found_with = self._media_key()
+    
+    def _media_key(self):
+        # what the remembered media depend on
+        factory = self.medium_factory
+        return (self.env, self.style, self.Medium, 
+                getattr(factory, 'im_func', factory))
+    
+    def _media_are_stale(self):
+        if self._media is None:
+            return True
+        for current, found_with in zip(self._media_key(), 
+                                        self._media_found_with):
+            if current is not found_with:
+                return True
+        return False
+    
+    def medium_factory(self, storable):
+        """returns a callable to make the storage medium for storable with.
+        
+        It is called as factory(storable, dataset).  The default is 
+        ``self.Medium``.
+        """
+        return self.Medium
     
     def attach_storage_medium(self, ds):
         """Lookup a storage medium in the ``env`` and attach it to a DataSet.
@@ -348,6 +735,18 @@ class EnvLoadableFixture(LoadableFixture):
             # already attached...
             return
         
+        if self._media_are_stale():
+            self.forget_storage_media()
+        try:
+            storable_name, storable, factory = self._media[ds.__class__]
+        except KeyError:
+            pass
+        else:
+            if not ds.meta.storable_name:
+                ds.meta.storable_name = storable_name
+            ds.meta.storage_medium = factory(storable, ds)
+            return
+        
         storable = ds.meta.storable
         
         if not storable:
@@ -379,7 +778,9 @@ class EnvLoadableFixture(LoadableFixture):
                 "cannot use %s %s as a storable object of itself! "
                 "(perhaps your style object was not configured right?)" % (
                                         ds.__class__.__name__, ds.__class__))
-        ds.meta.storage_medium = self.Medium(storable, ds)
+        factory = self.medium_factory(storable)
+        self._media[ds.__class__] = (ds.meta.storable_name, storable, factory)
+        ds.meta.storage_medium = factory(storable, ds)
         
     def resolve_stored_object(self, column_val):
         if type(column_val)==DeferredStoredObject:
@@ -387,22 +788,273 @@ class EnvLoadableFixture(LoadableFixture):
         else:
             return column_val
 
+class DataKeeper(object):
+    """Remembers the DataSets that a fixture keeps loaded between runs.
+    
+    For each DataSet class (by module and class name) it stores a 
+    fingerprint of its rows and, for each stored row, a dict of its 
+    ``primary_key`` and the ``fingerprint`` of the row.  It must store these 
+    in the same database, so they are committed or rolled back with the 
+    data.
+    """
+    def get(self, name):
+        """Must return (fingerprint, {row key: {'primary_key': ..., 
+        'fingerprint': ...}}) as stored for name, or None."""
+        raise NotImplementedError
+    
+    def put(self, name, fingerprint, row_keys):
+        """Must store fingerprint and row_keys for name."""
+        raise NotImplementedError
+
+def describe_value(value):
+    """returns a string for value that does not change between runs.
+    
+    Used to fingerprint DataSets; see :class:`DBLoadableFixture`.
+    """
+    if type(value) in (types.ListType, types.TupleType):
+        return "[%s]" % ", ".join([describe_value(v) for v in value])
+    elif is_rowlike(value):
+        return "<row %s.%s>" % (value._dataset.__name__, value.__name__)
+    elif isinstance(value, Ref.Value):
+        return "<ref %s.%s.%s>" % (value.ref.dataset_class.__name__, 
+                                   value.ref.key, value.attr_name)
+    elif isinstance(value, Ref):
+        return "<ref %s.%s>" % (value.dataset_class.__name__, value.key)
+    elif isinstance(value, dict):
+        return "{%s}" % ", ".join(["%s: %s" % (describe_value(k), 
+                                               describe_value(v)) 
+                                   for k, v in sorted(value.items())])
+    elif type(value) in (types.FunctionType, types.ClassType, types.TypeType):
+        return "<%s %s.%s>" % (type(value).__name__, 
+                               value.__module__, value.__name__)
+    elif has_default_repr(value):
+        # the default repr has the address of value, so it changes between 
+        # runs :
+        cls = value.__class__
+        return "<%s.%s %s>" % (cls.__module__, cls.__name__, 
+                               describe_value(getattr(value, '__dict__', {})))
+    return repr(value)
+
+def has_default_repr(value):
+    """is the repr of value the default one, i.e. with its address"""
+    if type(value) is types.InstanceType:
+        return not hasattr(value, '__repr__')
+    return type(value).__repr__ is object.__repr__
+
+def referenced_datasets(value):
+    """returns the DataSet classes that value refers to."""
+    if type(value) in (types.ListType, types.TupleType):
+        found = []
+        for v in value:
+            found.extend(referenced_datasets(v))
+        return found
+    elif is_rowlike(value):
+        return [value._dataset]
+    elif isinstance(value, Ref.Value):
+        return [value.ref.dataset_class]
+    elif isinstance(value, Ref):
+        return [value.dataset_class]
+    return []
+
+def kept_row(value):
+    """returns (primary key, row fingerprint) of a row stored by a 
+    :class:`DataKeeper`.
+    
+    Rows kept before rows had fingerprints are stored as a bare primary key 
+    and get a fingerprint of None, so they are updated once."""
+    if isinstance(value, dict):
+        return value['primary_key'], value.get('fingerprint')
+    return value, None
+
 class DBLoadableFixture(EnvLoadableFixture):
     """
     An abstract fixture that can load a DataSet into a database like thing.
     
     More specifically, one that forces its implementation to run atomically 
     (within a begin / commit / rollback block).
+    
+    With ``keep_data=True`` the data is left in the database at teardown and 
+    a fingerprint of each DataSet (its name, storable and rows, plus the 
+    fingerprints of the DataSets it references) is recorded by the 
+    :class:`DataKeeper` that :meth:`create_data_keeper` returns, along with 
+    a fingerprint of each row.  On the next setup, the kept rows of a 
+    DataSet are fetched ``kept_chunk_size`` at a time instead of saved.  
+    Rows whose fingerprint changed are updated in place, new rows are saved 
+    and rows that are gone are deleted, ``kept_chunk_size`` at a time, once 
+    everything else has loaded.  The storage media must implement 
+    ``fetch()``, ``update()`` and ``primary_key()``; they fetch and delete 
+    rows in batches if they implement ``fetch_many()`` and ``clear_many()``.
     """
-    def __init__(self, dsn=None, **kw):
+    kept_chunk_size = 500
+    
+    def __init__(self, dsn=None, keep_data=False, **kw):
         EnvLoadableFixture.__init__(self, **kw)
         self.dsn = dsn
+        self.keep_data = keep_data
         self.transaction = None
+        self.data_keeper = None
+        self._kept = None
     
     def begin(self, unloading=False):
         """begin loading data"""
         EnvLoadableFixture.begin(self, unloading=unloading)
         self.transaction = self.create_transaction()
+        if self.keep_data and not unloading:
+            self.data_keeper = self.create_data_keeper()
+            self._fingerprints = {}
+            self._dropped = []
+    
+    def create_data_keeper(self):
+        """must return a :class:`DataKeeper` that works in the transaction 
+        just created, to keep data loaded with."""
+        raise NotImplementedError
+    
+    def fingerprint(self, ds):
+        """returns a fingerprint of the DataSet ds.
+        
+        DataSets that ds references must have been stored already.
+        """
+        return self.fingerprint_rows(ds)[0]
+    
+    def fingerprint_rows(self, ds):
+        """returns a fingerprint of the DataSet ds and a dict of the 
+        fingerprint of each of its rows by key.
+        
+        A row's fingerprint covers its values and the fingerprints of the 
+        DataSets it references, so it changes when a value it resolves to 
+        may have changed.  DataSets that ds references must have been stored 
+        already.
+        """
+        lines = ["%s.%s" % (ds.__class__.__module__, ds.__class__.__name__), 
+                 repr(ds.meta.storable_name), repr(ds.meta.primary_key)]
+        for ref_ds in ds.meta.references:
+            lines.append(self._fingerprints.get(ref_ds, ''))
+        row_lines = {}
+        refers_to_self = []
+        for key, row in ds:
+            if isinstance(row, DataRow):
+                row = row.__class__
+            row_lines[key] = []
+            for name in row.columns():
+                value = getattr(row, name)
+                line = "%s.%s=%s" % (key, name, describe_value(value))
+                lines.append(line)
+                row_lines[key].append(line)
+                for ref_ds in referenced_datasets(value):
+                    if ref_ds is ds.__class__:
+                        refers_to_self.append(key)
+                    else:
+                        row_lines[key].append(
+                                    self._fingerprints.get(ref_ds, ''))
+        fingerprint = md5("\n".join(lines)).hexdigest()
+        # rows that refer to other rows of ds change with any of them :
+        for key in refers_to_self:
+            row_lines[key].append(fingerprint)
+        row_fingerprints = {}
+        for key, key_lines in row_lines.items():
+            row_fingerprints[key] = md5("\n".join(key_lines)).hexdigest()
+        return fingerprint, row_fingerprints
+    
+    def store_dataset(self, ds, level):
+        """store all rows of this dataset, keeping rows that were kept.
+        
+        See :class:`DBLoadableFixture` for how data is kept.
+        """
+        if not self.keep_data:
+            return EnvLoadableFixture.store_dataset(self, ds, level)
+        
+        name = "%s.%s" % (ds.__class__.__module__, ds.__class__.__name__)
+        fingerprint, row_fingerprints = self.fingerprint_rows(ds)
+        self._fingerprints[ds.__class__] = fingerprint
+        kept = self.data_keeper.get(name)
+        if kept is None:
+            kept_fingerprint, kept_rows = None, {}
+        else:
+            kept_fingerprint, kept_rows = kept
+        unchanged = kept_fingerprint == fingerprint
+        if unchanged:
+            log.info("KEEPING rows in %s", ds)
+        
+        medium = ds.meta.storage_medium
+        medium.visit_loader(self)
+        keys, primary_keys, dropped = [], [], []
+        for key, value in kept_rows.items():
+            primary_key, row_fingerprint = kept_row(value)
+            if key in row_fingerprints:
+                keys.append(key)
+                primary_keys.append(primary_key)
+            else:
+                dropped.append(primary_key)
+        self._kept = {}
+        for start in xrange(0, len(keys), self.kept_chunk_size):
+            end = start + self.kept_chunk_size
+            found = medium.fetch_many(primary_keys[start:end])
+            for key, primary_key, obj in zip(
+                                keys[start:end], primary_keys[start:end], found):
+                if obj is None:
+                    continue
+                row_fingerprint = kept_row(kept_rows[key])[1]
+                self._kept[key] = (
+                    obj, primary_key, 
+                    unchanged or row_fingerprint == row_fingerprints[key])
+        try:
+            EnvLoadableFixture.store_dataset(self, ds, level)
+            kept = self._kept
+        finally:
+            self._kept = None
+        if unchanged:
+            return
+        
+        row_keys = {}
+        for key in ds.meta.keys:
+            if key in kept:
+                primary_key = kept[key][1]
+            else:
+                obj = ds.meta._stored_objects.get_object(key)
+                primary_key = medium.primary_key(obj)
+            row_keys[key] = {'primary_key': list(primary_key), 
+                             'fingerprint': row_fingerprints[key]}
+        if dropped:
+            self._dropped.append((medium, dropped))
+        self.data_keeper.put(name, fingerprint, row_keys)
+    
+    def save_row(self, ds, key, row, column_vals):
+        """save a row of ds, or return or update it if it was kept."""
+        if self._kept is None:
+            return EnvLoadableFixture.save_row(self, ds, key, row, column_vals)
+        medium = ds.meta.storage_medium
+        if key in self._kept:
+            obj, primary_key, unchanged = self._kept[key]
+            if unchanged:
+                return obj
+            return medium.update(obj, row, column_vals)
+        return medium.save(row, column_vals)
+    
+    def finish_load(self):
+        """delete kept rows that are no longer in their DataSets"""
+        if not self.keep_data:
+            return
+        dropped, self._dropped = self._dropped, []
+        dropped.reverse()
+        for medium, primary_keys in dropped:
+            for start in xrange(0, len(primary_keys), self.kept_chunk_size):
+                medium.clear_many(
+                    primary_keys[start:start + self.kept_chunk_size])
+    
+    def unload_dataset(self, dataset):
+        """unload data stored for this dataset unless data is kept.
+        
+        Generated DataSets are always unloaded."""
+        if self.keep_data and not isinstance(dataset, GeneratedDataSet):
+            log.info("LEAVING stored objects for %s", dataset)
+            return
+        EnvLoadableFixture.unload_dataset(self, dataset)
+    
+    def release(self, datasets):
+        """drops references to unloaded data and the last transaction"""
+        EnvLoadableFixture.release(self, datasets)
+        self.transaction = None
+        self.data_keeper = None
     
     def commit(self):
         """call transaction.commit() on transaction returned by :meth:`DBLoadableFixture.create_transaction`"""
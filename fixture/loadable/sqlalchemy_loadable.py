@@ -9,8 +9,18 @@ See :ref:`Using LoadableFixture<using-loadable-fixture>` for examples.
 
 import sys
 from fixture.loadable import DBLoadableFixture
+from fixture.loadable.loadable import DataKeeper, count_statement
 from fixture.exc import UninitializedError
 import logging
+json = None
+try:
+    # 2.6
+    import json
+except ImportError:
+    try:
+        import simplejson as json
+    except ImportError:
+        pass
 
 log = logging.getLogger('fixture.loadable.sqlalchemy_loadable')
 
@@ -22,22 +32,68 @@ except ImportError:
 else:
     import sqlalchemy
     sa_major = float(sqlalchemy.__version__[:3]) # i.e. 0.4 or 0.5
+
+def private_session():
+    """returns a new scoped Session with a private scope"""
     if sa_major < 0.5:
-        Session = scoped_session(sessionmaker(autoflush=False, transactional=True), scopefunc=lambda:__name__)
+        return scoped_session(sessionmaker(autoflush=False, transactional=True), scopefunc=lambda:__name__)
     else:
-        Session = scoped_session(sessionmaker(autoflush=False, autocommit=False), scopefunc=lambda:__name__)
+        return scoped_session(sessionmaker(autoflush=False, autocommit=False), scopefunc=lambda:__name__)
 
-def negotiated_medium(obj, dataset):
+if sa_major is not None:
+    Session = private_session()
+
+_statement_hook_installed = False
+
+def install_statement_hook():
+    """makes every SQLAlchemy connection report the statements it executes 
+    to :func:`count_statement <fixture.loadable.loadable.count_statement>`.
+    
+    The fixture uses engines and connections it is given, which may have 
+    been created without a ``ConnectionProxy``, so the private 
+    ``_cursor_execute()`` and ``_cursor_executemany()`` methods of 
+    ``Connection`` are wrapped instead, once per process.  Statements are 
+    only counted for threads that are loading with a statement counter.  
+    NotImplementedError is raised if this version of SQLAlchemy does not 
+    have these methods.
+    """
+    global _statement_hook_installed
+    if _statement_hook_installed:
+        return
+    from sqlalchemy.engine.base import Connection
+    for name in ('_cursor_execute', '_cursor_executemany'):
+        if not callable(getattr(Connection, name, None)):
+            raise NotImplementedError(
+                "cannot count statements with SQLAlchemy %s: it has no "
+                "Connection.%s() to wrap" % (sqlalchemy.__version__, name))
+    cursor_execute = Connection._cursor_execute
+    cursor_executemany = Connection._cursor_executemany
+    def _cursor_execute(self, cursor, statement, parameters, *a, **kw):
+        count_statement()
+        return cursor_execute(self, cursor, statement, parameters, *a, **kw)
+    def _cursor_executemany(self, cursor, statement, parameters, *a, **kw):
+        count_statement(len(parameters))
+        return cursor_executemany(
+                            self, cursor, statement, parameters, *a, **kw)
+    Connection._cursor_execute = _cursor_execute
+    Connection._cursor_executemany = _cursor_executemany
+    _statement_hook_installed = True
+
+def negotiated_medium_class(obj):
+    """returns the StorageMediumAdapter class that can store obj."""
     if is_table(obj):
-        return TableMedium(obj, dataset)
+        return TableMedium
     elif is_assigned_mapper(obj):
-        return MappedClassMedium(obj, dataset)
+        return MappedClassMedium
     elif is_mapped_class(obj):
-        return MappedClassMedium(obj, dataset)
+        return MappedClassMedium
     else:
         raise NotImplementedError("object %s is not supported by %s" % (
                                                     obj, SQLAlchemyFixture))
 
+def negotiated_medium(obj, dataset):
+    return negotiated_medium_class(obj)(obj, dataset)
+
 class SQLAlchemyFixture(DBLoadableFixture):
     """
     A fixture that knows how to load DataSet objects into `SQLAlchemy`_ objects.
@@ -82,11 +138,34 @@ class SQLAlchemyFixture(DBLoadableFixture):
         A class-like ``Session`` object created by ``scoped_session(sessionmaker())``.  
         Only declare a custom Session if you have to.  The preferred way 
         is to let fixture use its own Session which defines a private scope to 
-        avoid conflicts with that of the Application Under Test.
+        avoid conflicts with that of the Application Under Test.  A fixture 
+        with its own ``dataset_registry`` gets a Session of its own so that 
+        it can load at the same time as other fixtures.
     
     ``connection``
         A specific connection / engine to use when one is not bound.
     
+    ``keep_data``
+        Leave data in the database at teardown and only load what changed 
+        at the next setup.  See :class:`DBLoadableFixture <fixture.loadable.loadable.DBLoadableFixture>`.  
+        Fingerprints are kept in a table named ``fixture_kept_data``.
+    
+    ``strict_release``
+        After teardown, drop every reference to the unloaded data and close 
+        the session and connection that the fixture opened itself.  See 
+        :meth:`release`.
+    
+    ``count_statements``
+        Count the statements made to load and unload each DataSet in 
+        ``self.statements``.  The session is flushed after each DataSet 
+        so that the statements of mapped classes are counted for their 
+        DataSet.
+    
+    ``query_budget``
+        The number of statements each DataSet may make, or a dict of 
+        DataSet class names to that number.  See 
+        :class:`LoadableFixture <fixture.loadable.loadable.LoadableFixture>`.
+    
     ``dataclass``
         :class:`SuperSet <fixture.dataset.SuperSet>` class to represent loaded data with
     
@@ -99,6 +178,9 @@ class SQLAlchemyFixture(DBLoadableFixture):
     
     """
     Medium = staticmethod(negotiated_medium)
+    _own_session = False
+    _own_connection = False
+    _own_scope = False
     
     def __init__(self, engine=None, connection=None, session=None, scoped_session=None, **kw):
         # ensure import error by simulating what would happen in the global module :
@@ -109,9 +191,36 @@ class SQLAlchemyFixture(DBLoadableFixture):
         self.connection = connection
         self.session = session
         if scoped_session is None:
-            scoped_session = Session
+            if self.dataset_registry is not None:
+                # it may load at the same time as other fixtures, so its 
+                # session is not shared with them
+                scoped_session = private_session()
+                self._own_scope = True
+            else:
+                scoped_session = Session
         self.Session = scoped_session
     
+    def medium_factory(self, storable):
+        """negotiates the medium class once per storable unless a custom 
+        ``medium`` was given."""
+        if self.Medium is negotiated_medium:
+            return negotiated_medium_class(storable)
+        return self.Medium
+    
+    def install_statement_hook(self):
+        """Counts the statements of all SQLAlchemy connections.  See 
+        :func:`install_statement_hook`."""
+        install_statement_hook()
+    
+    def create_data_keeper(self):
+        """Returns a :class:`SQLAlchemyDataKeeper` using the connection 
+        of the load transaction."""
+        if self.connection is not None:
+            bind = self.connection
+        else:
+            bind = self.session.connection()
+        return SQLAlchemyDataKeeper(bind)
+    
     def begin(self, unloading=False):
         """Begin loading data
         
@@ -124,19 +233,24 @@ class SQLAlchemyFixture(DBLoadableFixture):
         if not unloading:
             # ...then we are loading, so let's *lazily* 
             # clean up after a previous setup/teardown
-            Session.remove()
+            if self._own_scope:
+                self.Session.remove()
+            else:
+                Session.remove()
         if self.connection is None and self.engine is None:
             if self.session:
                 self.engine = self.session.bind # might be None
         
         if self.engine is not None and self.connection is None:
             self.connection = self.engine.connect()
+            self._own_connection = True
         
         if self.session is None:
             if self.connection:
                 self.session = self.Session(bind=self.connection)
             else:
                 self.session = self.Session(bind=None)
+            self._own_session = True
             
         DBLoadableFixture.begin(self, unloading=unloading)
     
@@ -177,8 +291,11 @@ class SQLAlchemyFixture(DBLoadableFixture):
             fixture = SQLAlchemyFixture(...)
         
         """
-        from fixture.dataset import dataset_registry
-        dataset_registry.clear()
+        if self.dataset_registry is not None:
+            self.dataset_registry.clear()
+        else:
+            from fixture.dataset import dataset_registry
+            dataset_registry.clear()
         if self.connection:
             self.connection.close()
         if self.session:
@@ -188,9 +305,63 @@ class SQLAlchemyFixture(DBLoadableFixture):
         if self.engine:
             self.engine.dispose()
     
+    def release(self, datasets):
+        """Drops references to unloaded data and closes the session and 
+        connection that this fixture opened itself.
+        
+        A session or connection that was passed in is left alone.
+        """
+        DBLoadableFixture.release(self, datasets)
+        if self._own_session:
+            self.session.close()
+            self.session = None
+            self._own_session = False
+        if self._own_connection:
+            self.connection.close()
+            self.connection = None
+            self._own_connection = False
+    
     def rollback(self):
         """Rollback load transaction"""
         DBLoadableFixture.rollback(self)
+    
+    def unload_dataset(self, dataset):
+        """Unload data stored for this dataset, flushing the session when 
+        counting statements so that they are counted for dataset"""
+        DBLoadableFixture.unload_dataset(self, dataset)
+        if self.statements is not None:
+            self.session.flush()
+
+class SQLAlchemyDataKeeper(DataKeeper):
+    """Keeps fingerprints of DataSets in a table, creating it if needed."""
+    table_name = 'fixture_kept_data'
+    
+    def __init__(self, bind, table_name=None):
+        from sqlalchemy import MetaData, Table, Column, String, Text
+        assert json, (
+            "You must have the simplejson or json module installed "
+            "to keep data loaded")
+        self.bind = bind
+        self.table = Table(table_name or self.table_name, MetaData(), 
+                            Column('name', String(255), primary_key=True),
+                            Column('fingerprint', String(32)),
+                            Column('row_keys', Text))
+        self.table.create(bind=bind, checkfirst=True)
+    
+    def get(self, name):
+        stmt = self.table.select(self.table.c.name==name)
+        row = self.bind.execute(stmt).fetchone()
+        if row is None:
+            return None
+        return row['fingerprint'], json.loads(row['row_keys'])
+    
+    def put(self, name, fingerprint, row_keys):
+        values = dict(fingerprint=fingerprint, row_keys=json.dumps(row_keys))
+        result = self.bind.execute(
+                    self.table.update(self.table.c.name==name), values)
+        if not result.rowcount:
+            values['name'] = name
+            self.bind.execute(self.table.insert(), values)
 
 ## this was used in an if branch of clear() ... but I think this is no longer necessary with scoped sessions
 ## does it need to exist for 0.4 ?  not sure
@@ -217,6 +388,8 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
     .. _Elixir: http://elixir.ematia.de/
     
     """
+    flush_session = False
+    
     def __init__(self, *a,**kw):
         DBLoadableFixture.StorageMediumAdapter.__init__(self, *a,**kw)
         
@@ -227,6 +400,50 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
     def visit_loader(self, loader):
         """Visits the :class:`SQLAlchemyFixture` loader and stores a reference to its session"""
         self.session = loader.session
+        self.flush_session = getattr(loader, 'statements', None) is not None
+    
+    def flush(self):
+        """Flush the session when the loader counts statements so that they 
+        are counted for this DataSet"""
+        if self.flush_session:
+            self.session.flush()
+    
+    def fetch(self, primary_key):
+        """Get the object with this primary key from the session"""
+        if len(primary_key) == 1:
+            ident = primary_key[0]
+        else:
+            ident = tuple(primary_key)
+        return self.session.query(self.medium).get(ident)
+    
+    def fetch_many(self, primary_keys):
+        """Get the objects with these primary keys with one query if the 
+        primary key has one column"""
+        from sqlalchemy.orm import class_mapper
+        mapper = class_mapper(self.medium)
+        if len(mapper.primary_key) != 1:
+            return [self.fetch(primary_key) for primary_key in primary_keys]
+        if not primary_keys:
+            return []
+        column = mapper.primary_key[0]
+        found = {}
+        query = self.session.query(self.medium).filter(
+                    column.in_([pk[0] for pk in primary_keys]))
+        for obj in query:
+            found[mapper.primary_key_from_instance(obj)[0]] = obj
+        return [found.get(pk[0]) for pk in primary_keys]
+    
+    def update(self, obj, row, column_vals):
+        """Set new values on an object from the session"""
+        for c, val in column_vals:
+            setattr(obj, c, val)
+        return obj
+    
+    def primary_key(self, obj):
+        """Flush the session and return the object's primary key"""
+        from sqlalchemy.orm import object_mapper
+        self.session.flush()
+        return object_mapper(obj).primary_key_from_instance(obj)
         
     def save(self, row, column_vals):
         """Save a new object to the session if it doesn't already exist in the session."""
@@ -240,6 +457,57 @@ class MappedClassMedium(DBLoadableFixture.StorageMediumAdapter):
             else:
                 self.session.save(obj)
         return obj
+    
+    def save_many(self, rows):
+        """Save a chunk of generated rows, flush the session and expunge 
+        them from it so that it does not grow"""
+        objects = []
+        for values in rows:
+            obj = self.medium()
+            for c, val in values.iteritems():
+                setattr(obj, c, val)
+            if hasattr(self.session, 'add'):
+                self.session.add(obj)
+            else:
+                self.session.save(obj)
+            objects.append(obj)
+        self.session.flush()
+        for obj in objects:
+            self.session.expunge(obj)
+    
+    def clear_many(self, primary_keys):
+        """Flush the session and delete the rows with these primary keys 
+        from the mapped table; with one statement if the primary key has 
+        one column.  Objects of inheriting mappers are deleted through the 
+        session.
+        
+        The rows are deleted without loading their objects, so the session 
+        must not hold on to any of them.
+        """
+        from sqlalchemy import and_
+        from sqlalchemy.orm import class_mapper
+        if not primary_keys:
+            return
+        self.session.flush()
+        mapper = class_mapper(self.medium)
+        if mapper.inherits is not None:
+            # the row is spread over the tables of the inherited mappers :
+            for obj in self.fetch_many(primary_keys):
+                if obj is not None:
+                    self.session.delete(obj)
+            self.session.flush()
+            return
+        table = mapper.local_table
+        table_keys = mapper.primary_key
+        if len(table_keys) == 1:
+            stmt = table.delete(
+                        table_keys[0].in_([pk[0] for pk in primary_keys]))
+            self.session.execute(stmt, mapper=self.medium)
+            return
+        for primary_key in primary_keys:
+            stmt = table.delete(and_(*[k==v for k, v in 
+                                       zip(table_keys, primary_key)]))
+            self.session.execute(stmt, mapper=self.medium)
 
 
 class LoadedTableRow(object):
@@ -308,6 +576,86 @@ class TableMedium(DBLoadableFixture.StorageMediumAdapter):
             self.conn = loader.connection
         else:
             self.conn = None
+    
+    def _execute(self, stmt, *params):
+        if self.conn:
+            return self.conn.execute(stmt, *params)
+        else:
+            return stmt.execute(*params)
+    
+    def _where_primary_key(self, primary_key):
+        from sqlalchemy import and_
+        table_keys = [k for k in self.medium.primary_key]
+        return and_(*[getattr(self.medium.c, k.key)==v 
+                        for k, v in zip(table_keys, primary_key)])
+    
+    def fetch(self, primary_key):
+        """Selects the row with this primary key"""
+        stmt = self.medium.select(self._where_primary_key(primary_key))
+        found = self._execute(stmt).fetchone()
+        if found is None:
+            return None
+        obj = LoadedTableRow(self.medium, primary_key, self.conn)
+        obj.row = found
+        return obj
+    
+    def fetch_many(self, primary_keys):
+        """Selects the rows with these primary keys; with one statement if 
+        the primary key has one column"""
+        table_keys = [k for k in self.medium.primary_key]
+        if len(table_keys) != 1:
+            return [self.fetch(primary_key) for primary_key in primary_keys]
+        if not primary_keys:
+            return []
+        column = getattr(self.medium.c, table_keys[0].key)
+        stmt = self.medium.select(column.in_([pk[0] for pk in primary_keys]))
+        found = {}
+        for row in self._execute(stmt).fetchall():
+            found[row[column]] = row
+        objects = []
+        for primary_key in primary_keys:
+            row = found.get(primary_key[0])
+            if row is None:
+                objects.append(None)
+                continue
+            obj = LoadedTableRow(self.medium, primary_key, self.conn)
+            obj.row = row
+            objects.append(obj)
+        return objects
+    
+    def update(self, obj, row, column_vals):
+        """Constructs an update statement for the row of obj and executes 
+        it either explicitly or implicitly
+        """
+        stmt = self.medium.update(self._where_primary_key(obj.inserted_key))
+        self._execute(stmt, dict(list(column_vals)))
+        obj.row = None
+        return obj
+    
+    def primary_key(self, obj):
+        """Returns the primary key the row of obj was inserted with"""
+        return obj.inserted_key
+    
+    def save_many(self, rows):
+        """Inserts a chunk of generated rows with one executemany() call"""
+        if rows:
+            self._execute(self.medium.insert(), rows)
+    
+    def clear_many(self, primary_keys):
+        """Deletes the rows with these primary keys; with one statement 
+        if the primary key has one column"""
+        if not primary_keys:
+            return
+        table_keys = [k for k in self.medium.primary_key]
+        if len(table_keys) == 1:
+            column = getattr(self.medium.c, table_keys[0].key)
+            stmt = self.medium.delete(
+                        column.in_([pk[0] for pk in primary_keys]))
+            self._execute(stmt)
+            return
+        for primary_key in primary_keys:
+            self._execute(
+                self.medium.delete(self._where_primary_key(primary_key)))
         
     def save(self, row, column_vals):
         """Constructs an insert statement with the given values and 
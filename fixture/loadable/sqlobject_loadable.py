@@ -8,14 +8,144 @@ See :ref:`Using LoadableFixture<using-loadable-fixture>` for examples.
 """
 
 from fixture.loadable import DBLoadableFixture
+from fixture.loadable.loadable import count_statement
+from fixture.dataset.generated import GeneratedRow
+
+def install_statement_hook(connection_class):
+    """makes connections of this SQLObject connection class report the 
+    statements they execute to :func:`count_statement 
+    <fixture.loadable.loadable.count_statement>`.
+    
+    Only statements run by ``_executeRetry()`` are counted, which leaves 
+    out those some databases use to fetch the id of a new row.
+    """
+    if '_fixture_counts_statements' in connection_class.__dict__:
+        return
+    execute_retry = connection_class._executeRetry
+    def _executeRetry(self, conn, cursor, query):
+        count_statement()
+        return execute_retry(self, conn, cursor, query)
+    connection_class._executeRetry = _executeRetry
+    connection_class._fixture_counts_statements = True
+
+class LazySQLObject(object):
+    """Stands in for an instance of a `SQLObject`_ class that was inserted in 
+    bulk.
+    
+    Its ``id`` is known right away; the instance is only fetched (with 
+    ``get()``) once another attribute is used.
+    """
+    def __init__(self, so_class, id, connection):
+        self._so_class = so_class
+        self.id = id
+        self._connection = connection
+        self._instance = None
+    
+    def __repr__(self):
+        return "<%s for %s %r>" % (
+                self.__class__.__name__, self._so_class.__name__, self.id)
+    
+    def materialize(self):
+        """returns the real instance, fetching it the first time"""
+        if self._instance is None:
+            self._instance = self._so_class.get(
+                                    self.id, connection=self._connection)
+        return self._instance
     
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+class _BulkState(object):
+    # stands in for SQLObjectState so that validators can find a connection
+    protocol = 'sql'
+    def __init__(self, connection):
+        self.soObject = self
+        self._connection = connection
+
+def so_value(value):
+    """returns the real instance for a :class:`LazySQLObject`, otherwise 
+    value"""
+    if isinstance(value, LazySQLObject):
+        return value.materialize()
+    return value
+    
+def destroys_more(so_class):
+    """Does ``destroySelf()`` on an instance of so_class do more than delete 
+    its row, i.e. free related joins, cascade to the rows of classes that 
+    depend on it or send ``RowDestroySignal`` to a listener"""
+    from sqlobject import events, joins
+    from sqlobject.include.pydispatch import dispatcher
+    for join in so_class.sqlmeta.joins:
+        if isinstance(join, joins.SORelatedJoin):
+            return True
+    if so_class._SO_depends():
+        return True
+    receivers = dispatcher.getAllReceivers(so_class, events.RowDestroySignal)
+    return bool(list(receivers))
+
 class SQLObjectMedium(DBLoadableFixture.StorageMediumAdapter):
     """
     Adapter for storing data using `SQLObject`_ classes
+    
+    If the loader has ``bulk=True`` then rows that declare their ``id`` are 
+    inserted ``batch_size`` at a time with one multi-row INSERT statement 
+    and stored as :class:`LazySQLObject` objects.  Other rows are saved by 
+    creating an instance of the class.  A :class:`LazySQLObject` that was 
+    never fetched is deleted by its ``id`` unless ``destroySelf()`` would do 
+    more than that (see :func:`destroys_more`).
     """
+    bulk = False
+    batch_size = 500
+    
+    def __init__(self, *a, **kw):
+        DBLoadableFixture.StorageMediumAdapter.__init__(self, *a, **kw)
+        self._pending = []
+    
     def clear(self, obj):
         """Delete this object from the DB"""
+        if (isinstance(obj, LazySQLObject) and obj._instance is None and 
+                not destroys_more(self.medium)):
+            sqlmeta = self.medium.sqlmeta
+            conn = obj._connection
+            conn.query("DELETE FROM %s WHERE %s = %s" % (
+                        sqlmeta.table, sqlmeta.idName, conn.sqlrepr(obj.id)))
+            conn.cache.expire(obj.id, self.medium)
+            return
         obj.destroySelf()
+    
+    def clear_many(self, primary_keys):
+        """Delete the rows with these ids with one statement, unless 
+        ``destroySelf()`` would do more than that (see :func:`destroys_more`)
+        """
+        from sqlobject import SQLObjectNotFound
+        if not primary_keys:
+            return
+        conn = self.transaction
+        if destroys_more(self.medium):
+            for primary_key in primary_keys:
+                try:
+                    obj = self.medium.get(primary_key[0], connection=conn)
+                except SQLObjectNotFound:
+                    continue
+                obj.destroySelf()
+            return
+        sqlmeta = self.medium.sqlmeta
+        conn.query("DELETE FROM %s WHERE %s IN (%s)" % (
+                    sqlmeta.table, sqlmeta.idName, 
+                    ", ".join([conn.sqlrepr(pk[0]) for pk in primary_keys])))
+        for primary_key in primary_keys:
+            conn.cache.expire(primary_key[0], self.medium)
+    
+    def save_many(self, rows):
+        """Save a chunk of generated rows like :meth:`save` and expire the 
+        instances it created from the connection's cache so that it does not 
+        grow"""
+        for values in rows:
+            obj = self.save(GeneratedRow(values), values.items())
+            if not isinstance(obj, LazySQLObject):
+                self.transaction.cache.expire(obj.id, self.medium)
         
     def save(self, row, column_vals):
         """Save this row to the DB"""
@@ -27,12 +157,77 @@ class SQLObjectMedium(DBLoadableFixture.StorageMediumAdapter):
                     "cannot name a key 'connection' in row %s" % row)
         dbvals = dict([(so_style.dbColumnToPythonAttr(k), v) 
                                                     for k,v in column_vals])
+        if self.bulk:
+            values = self._bulk_values(dbvals)
+            if values is not None:
+                self._pending.append(values)
+                if len(self._pending) >= self.batch_size:
+                    self.flush_rows()
+                return LazySQLObject(self.medium, dbvals['id'], 
+                                     self.transaction)
+            # keep rows in order :
+            self.flush_rows()
+        for k, v in dbvals.items():
+            dbvals[k] = so_value(v)
         dbvals['connection'] = self.transaction
         return self.medium(**dbvals)
     
+    def _bulk_values(self, dbvals):
+        """returns {db column: db value} for a row that can be inserted in 
+        bulk, or None."""
+        from sqlobject.main import getID, NoDefault
+        sqlmeta = self.medium.sqlmeta
+        if dbvals.get('id') is None:
+            return None
+        state = _BulkState(self.transaction)
+        values = {sqlmeta.idName: dbvals['id']}
+        for column in sqlmeta.columnList:
+            if column.name in dbvals:
+                value = dbvals[column.name]
+            elif column.foreignName in dbvals:
+                value = dbvals[column.foreignName]
+            else:
+                value = column.default
+                if value is NoDefault:
+                    # let SQLObject create it (or complain)
+                    return None
+            if isinstance(value, LazySQLObject):
+                value = value.id
+            elif column.foreignKey and value is not None:
+                value = getID(value)
+            if column.from_python:
+                value = column.from_python(value, state)
+            values[column.dbName] = value
+        known = set(['id'])
+        for column in sqlmeta.columnList:
+            known.add(column.name)
+            if column.foreignName:
+                known.add(column.foreignName)
+        for name in dbvals:
+            if name not in known:
+                return None
+        return values
+    
+    def flush_rows(self):
+        """Insert the rows waiting to be inserted with one statement"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        from sqlobject.sqlbuilder import Insert
+        names = pending[0].keys()
+        insert = Insert(self.medium.sqlmeta.table, valueList=pending, 
+                        template=names)
+        self.transaction.query(self.transaction.sqlrepr(insert))
+    
+    def flush(self):
+        """Insert the remaining rows"""
+        self.flush_rows()
+    
     def visit_loader(self, loader):
         """Visit the loader and store a reference to the transaction connection"""
         self.transaction = loader.transaction
+        self.bulk = getattr(loader, 'bulk', self.bulk)
+        self.batch_size = getattr(loader, 'batch_size', self.batch_size)
 
 class SQLObjectFixture(DBLoadableFixture):
     """
@@ -70,24 +265,51 @@ class SQLObjectFixture(DBLoadableFixture):
         True if the connection can be closed, helpful for releasing connections.  
         If you are passing in a connection object this will be False by default.
     
+    ``bulk``
+        If True, rows that declare their ``id`` are inserted ``batch_size`` 
+        (default 500) at a time and instances are only fetched when one of 
+        their attributes other than ``id`` is used.  See 
+        :class:`SQLObjectMedium`.
+    
+    ``count_statements``
+        Count the statements made to load and unload each DataSet in 
+        ``self.statements``.  See :func:`install_statement_hook`.
+    
+    ``query_budget``
+        The number of statements each DataSet may make, or a dict of 
+        DataSet class names to that number.  See 
+        :class:`LoadableFixture <fixture.loadable.loadable.LoadableFixture>`.
+    
     """
             
     def __init__(self,  connection=None, use_transaction=True, 
-                        close_conn=False, **kw ):
+                        close_conn=False, bulk=False, batch_size=500, **kw ):
         DBLoadableFixture.__init__(self, **kw)
         self.connection = connection
         self.close_conn = close_conn
         self.use_transaction = use_transaction
+        self.bulk = bulk
+        self.batch_size = batch_size
     
     SQLObjectMedium = SQLObjectMedium
     Medium = SQLObjectMedium
     
-    def create_transaction(self):
-        """Return a new transaction for connection"""
+    def connect(self):
+        """Create a connection from dsn unless one was passed in"""
         from sqlobject import connectionForURI
         if not self.connection:
             self.connection = connectionForURI(self.dsn)
             self.close_conn = True # because we made it
+    
+    def install_statement_hook(self):
+        """Counts the statements of connections of the same class as 
+        connection"""
+        self.connect()
+        install_statement_hook(self.connection.__class__)
+    
+    def create_transaction(self):
+        """Return a new transaction for connection"""
+        self.connect()
         if self.use_transaction:
             return self.connection.transaction()
         else:
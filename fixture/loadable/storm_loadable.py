@@ -8,14 +8,66 @@ See :ref:`Using LoadableFixture<using-loadable-fixture>` for examples.
 """
 
 from fixture.loadable import DBLoadableFixture
+from fixture.loadable.loadable import count_statement
 from fixture.util import _mklog
 
 stlog = _mklog('fixture.loadable.storm')
 
+class StatementCountingTracer(object):
+    """A Storm tracer that reports each statement to :func:`count_statement 
+    <fixture.loadable.loadable.count_statement>`"""
+    def connection_raw_execute(self, connection, raw_cursor, statement, 
+                                    params):
+        count_statement()
+
+_statement_tracer = None
+
+def install_statement_hook():
+    """installs a :class:`StatementCountingTracer` once"""
+    global _statement_tracer
+    if _statement_tracer is None:
+        from storm.tracer import install_tracer
+        _statement_tracer = StatementCountingTracer()
+        install_tracer(_statement_tracer)
+
 class StormMedium(DBLoadableFixture.StorageMediumAdapter):
 
     def clear(self, obj):
         self.transaction.remove(obj)
+    
+    def clear_many(self, primary_keys):
+        """Delete the rows with these primary keys without loading them; 
+        with one statement if the primary key has one column"""
+        from storm.info import get_cls_info
+        from storm.locals import And
+        if not primary_keys:
+            return
+        store = self.transaction
+        store.flush()
+        columns = get_cls_info(self.medium).primary_key
+        if len(columns) == 1:
+            store.find(self.medium, 
+                       columns[0].is_in([pk[0] for pk in primary_keys])
+                       ).remove()
+        else:
+            for primary_key in primary_keys:
+                store.find(self.medium, And(*[c == v for c, v in 
+                                zip(columns, primary_key)])).remove()
+        # objects of the deleted rows may still be cached :
+        store.invalidate()
+    
+    def save_many(self, rows):
+        """Save a chunk of generated rows and flush the store once.  
+        
+        Once flushed, the store only keeps the objects it caches (the 100 
+        most recent by default).
+        """
+        for values in rows:
+            obj = self.medium()
+            for n, v in values.iteritems():
+                setattr(obj, n, v)
+            self.transaction.add(obj)
+        self.transaction.flush()
 
     def save(self, row, column_vals):
         from storm.info import get_cls_info
@@ -76,6 +128,17 @@ class StormFixture(DBLoadableFixture):
 
     def create_transaction(self):
         return self.store
+    
+    def install_statement_hook(self):
+        """Counts statements with a Storm tracer"""
+        install_statement_hook()
+    
+    def unload_dataset(self, dataset):
+        """Unload data stored for this dataset, flushing the store when 
+        counting statements so that they are counted for dataset"""
+        DBLoadableFixture.unload_dataset(self, dataset)
+        if self.statements is not None:
+            self.transaction.flush()
 
 
 
@@ -32,26 +32,38 @@ class ChainedStyle(Style):
     """
     Combination of two styles, piping first translation 
     into second translation.
+    
+    Each chained method is made once and its methods on both styles are 
+    only looked up the first time it is called.
     """
     def __init__(self, first_style, next_style):
         self.first_style = first_style
         self.next_style = next_style
+        self._chained = {}
     
     def __getattribute__(self, c):
+        chained = object.__getattribute__(self, '_chained')
+        if c in chained:
+            return chained[c]
         def assert_callable(attr):
             if not callable(attr):
                 raise AttributeError(
                     "%s cannot chain %s" % (self.__class__, attr))
+        calls = []
         def chained_call(name):
-            f = object.__getattribute__(self, 'first_style')
-            first_call = getattr(f, c)
-            assert_callable(first_call)
+            if not calls:
+                f = object.__getattribute__(self, 'first_style')
+                first_call = getattr(f, c)
+                assert_callable(first_call)
             
-            n = object.__getattribute__(self, 'next_style')
-            next_call = getattr(n, c)
-            assert_callable(next_call)
+                n = object.__getattribute__(self, 'next_style')
+                next_call = getattr(n, c)
+                assert_callable(next_call)
+                calls[:] = [first_call, next_call]
             
+            first_call, next_call = calls
             return next_call(first_call(name))
+        chained[c] = chained_call
         return chained_call
     
     def __repr__(self):
@@ -0,0 +1,595 @@
+"""benchmarks for loading and unloading fixtures.
+
+A synthetic schema is generated for each combination of the options below.
+It is a chain of ``depth`` DataSet classes (Level0Data, Level1Data, ...)
+with ``rows`` rows each.  Every row has ``width`` plain columns and ``fanout``
+columns referencing rows of the previous DataSet by value
+(``Level0Data.row_00001.ref('id')``).  With ``--self-refs=1`` each row also
+references the row before it in the same DataSet (``row_00002.parent =
+row_00001``).
+
+For each schema these phases are timed:
+
+``import``
+    importing a module containing the generated DataSet source
+``instantiate``
+    creating an instance of every DataSet class
+``setup``
+    ``FixtureData.setup()`` of all DataSet classes
+``access``
+    reading every column of every loaded row
+``teardown``
+    ``FixtureData.teardown()``
+
+The loading phases are run for every available backend on SQLite:
+``sqlalchemy_table``, ``sqlalchemy_mapped``, ``sqlobject``, ``storm`` and
+``django``.  Backends that are not installed are skipped.
+
+Each timing is written as a line of JSON so that two runs can be compared.
+Timings of ``setup`` and ``access`` also count how often values read with
+``ref()`` came from the cache of loaded values (``ref_cache_hits``) or from
+the stored objects (``ref_cache_misses``).
+Run it like this from the root of a source checkout::
+
+    $ PYTHONPATH=. python fixture/test/profile/bench.py --rows=100,1000 \\
+                                            --output=before.json
+    $ PYTHONPATH=. python fixture/test/profile/bench.py --rows=100,1000 \\
+                                --output=after.json --compare=before.json
+
+With ``--compare`` a timing that got slower by more than ``--threshold``
+makes the script exit with status 1.
+
+"""
+
+import sys, os, types, timeit
+from optparse import OptionParser
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import fixture
+from fixture import DataSet, TempIO, NamedDataStyle
+from fixture.dataset import dataset_registry
+
+timer = timeit.default_timer
+
+PHASES = ('import', 'instantiate', 'setup', 'access', 'teardown')
+
+class Schema(object):
+    """a synthetic schema of DataSet classes.
+
+    ``prefix`` makes the names of storable objects unique since some ORMs
+    keep a registry of classes by name.
+    """
+    def __init__(self, rows, width, fanout, depth, self_refs, prefix):
+        self.rows = rows
+        self.width = width
+        self.fanout = fanout
+        self.depth = depth
+        self.self_refs = self_refs
+        self.prefix = prefix
+        self.key_format = "row_%%0%dd" % len(str(rows))
+
+    def params(self):
+        return dict(rows=self.rows, width=self.width, fanout=self.fanout,
+                    depth=self.depth, self_refs=self.self_refs)
+
+    def dataset_names(self):
+        return ['Level%sData' % d for d in range(self.depth)]
+
+    def storable_names(self):
+        return ['Level%s' % d for d in range(self.depth)]
+
+    def table_name(self, level):
+        return '%s_level%s' % (self.prefix.lower(), level)
+
+    def class_name(self, level):
+        return '%sLevel%s' % (self.prefix, level)
+
+    def columns(self, level):
+        """returns names of the columns at level, without id and parent."""
+        columns = ['name'] + ['c%s' % i for i in range(self.width)]
+        if level > 0:
+            columns.extend(['ref%s' % i for i in range(self.fanout)])
+        return columns
+
+    def source(self):
+        """returns Python source code declaring the DataSet classes."""
+        out = ["from fixture import DataSet", ""]
+        for level, name in enumerate(self.dataset_names()):
+            out.append("class %s(DataSet):" % name)
+            for r in range(1, self.rows + 1):
+                key = self.key_format % r
+                out.append("    class %s:" % key)
+                out.append("        id = %s" % r)
+                out.append("        name = %r" % ('%s %s' % (name, key)))
+                for i in range(self.width):
+                    out.append("        c%s = %r" % (i, 'value %s.%s' % (r, i)))
+                if level > 0:
+                    prev = self.dataset_names()[level - 1]
+                    for i in range(self.fanout):
+                        ref_key = self.key_format % ((r + i - 1) % self.rows + 1)
+                        out.append("        ref%s = %s.%s.ref('id')" % (
+                                                            i, prev, ref_key))
+                if self.self_refs and r > 1:
+                    out.append("    %s.parent = %s" % (
+                                            key, self.key_format % (r - 1)))
+            out.append("")
+        return "\n".join(out) + "\n"
+
+class Backend(object):
+    """creates storage for a :class:`Schema` and a fixture to load it with."""
+    name = None
+    supports_self_refs = True
+
+    def available(self):
+        raise NotImplementedError
+
+    def create(self, schema):
+        """creates tables and returns an env of storable objects."""
+        raise NotImplementedError
+
+    def fixture(self, env):
+        raise NotImplementedError
+
+    def dispose(self):
+        pass
+
+class SQLAlchemyTableBackend(Backend):
+    name = 'sqlalchemy_table'
+    # a stored row is not something that can be inserted as a column value
+    supports_self_refs = False
+
+    def available(self):
+        try:
+            import sqlalchemy
+        except ImportError:
+            return False
+        return True
+
+    def create_tables(self, schema):
+        from sqlalchemy import (
+            create_engine, MetaData, Table, Column, Integer, String, ForeignKey)
+        self.engine = create_engine('sqlite:///:memory:')
+        self.metadata = MetaData(bind=self.engine)
+        tables = []
+        for level in range(schema.depth):
+            cols = [Column('id', Integer, primary_key=True)]
+            for c in schema.columns(level):
+                if c.startswith('ref'):
+                    cols.append(Column(c, Integer, ForeignKey(
+                                    '%s.id' % schema.table_name(level - 1))))
+                else:
+                    cols.append(Column(c, String(60)))
+            if schema.self_refs:
+                cols.append(Column('parent_id', Integer, ForeignKey(
+                                    '%s.id' % schema.table_name(level))))
+            tables.append(Table(schema.table_name(level), self.metadata, *cols))
+        self.metadata.create_all()
+        return tables
+
+    def create(self, schema):
+        return dict(zip(schema.storable_names(), self.create_tables(schema)))
+
+    def fixture(self, env):
+        from fixture import SQLAlchemyFixture
+        self._fixture = SQLAlchemyFixture(
+                    env=env, engine=self.engine, style=NamedDataStyle())
+        return self._fixture
+
+    def dispose(self):
+        self._fixture.dispose()
+        self.metadata.drop_all()
+
+class SQLAlchemyMappedBackend(SQLAlchemyTableBackend):
+    name = 'sqlalchemy_mapped'
+    supports_self_refs = True
+
+    def create(self, schema):
+        from sqlalchemy.orm import mapper
+        try:
+            from sqlalchemy.orm import relation
+        except ImportError:
+            from sqlalchemy.orm import relationship as relation
+        env = {}
+        for level, table in enumerate(self.create_tables(schema)):
+            cls = type(schema.class_name(level), (object,), {})
+            properties = {}
+            if schema.self_refs:
+                properties['parent'] = relation(
+                                        cls, remote_side=[table.c.id])
+            mapper(cls, table, properties=properties)
+            env[schema.storable_names()[level]] = cls
+        return env
+
+    def dispose(self):
+        from sqlalchemy.orm import clear_mappers
+        SQLAlchemyTableBackend.dispose(self)
+        clear_mappers()
+
+class SQLObjectBackend(Backend):
+    name = 'sqlobject'
+
+    def available(self):
+        try:
+            import sqlobject
+        except ImportError:
+            return False
+        return True
+
+    def create(self, schema):
+        from sqlobject import (
+            SQLObject, StringCol, IntCol, ForeignKey, connectionForURI)
+        self.connection = connectionForURI('sqlite:/:memory:')
+        env = {}
+        self.classes = []
+        for level in range(schema.depth):
+            attrs = {
+                '_connection': self.connection,
+                'sqlmeta': types.ClassType('sqlmeta', (), {
+                                        'table': schema.table_name(level)})}
+            for c in schema.columns(level):
+                if c.startswith('ref'):
+                    attrs[c] = IntCol(default=None)
+                else:
+                    attrs[c] = StringCol(default=None)
+            if schema.self_refs:
+                attrs['parent'] = ForeignKey(
+                                    schema.class_name(level), default=None)
+            cls = type(schema.class_name(level), (SQLObject,), attrs)
+            cls.createTable()
+            self.classes.append(cls)
+            env[schema.storable_names()[level]] = cls
+        return env
+
+    def fixture(self, env):
+        from fixture import SQLObjectFixture
+        return SQLObjectFixture(
+                    env=env, connection=self.connection,
+                    style=NamedDataStyle())
+
+    def dispose(self):
+        from sqlobject.classregistry import registry
+        for cls in self.classes:
+            cls.dropTable()
+        # allow the names to be declared again :
+        for cls in self.classes:
+            registry(None).classes.pop(cls.__name__, None)
+        self.connection.close()
+
+class StormBackend(Backend):
+    name = 'storm'
+
+    def available(self):
+        try:
+            import storm
+        except ImportError:
+            return False
+        return True
+
+    def create(self, schema):
+        from storm.locals import (
+            Storm, Int, RawStr, Reference, Store, create_database)
+        self.store = Store(create_database('sqlite:'))
+        env = {}
+        for level in range(schema.depth):
+            attrs = {'__storm_table__': schema.table_name(level),
+                     'id': Int(primary=True)}
+            cols = ['id integer primary key']
+            for c in schema.columns(level):
+                if c.startswith('ref'):
+                    attrs[c] = Int()
+                    cols.append('%s integer' % c)
+                else:
+                    attrs[c] = RawStr()
+                    cols.append('%s text' % c)
+            if schema.self_refs:
+                attrs['parent_id'] = Int()
+                cols.append('parent_id integer')
+            cls = type(schema.class_name(level), (Storm,), attrs)
+            if schema.self_refs:
+                cls.parent = Reference(cls.parent_id, cls.id)
+            self.store.execute("CREATE TABLE %s (%s)" % (
+                                schema.table_name(level), ", ".join(cols)))
+            env[schema.storable_names()[level]] = cls
+        self.store.commit()
+        return env
+
+    def fixture(self, env):
+        from fixture import StormFixture
+        return StormFixture(
+                    env=env, store=self.store, style=NamedDataStyle())
+
+    def dispose(self):
+        self.store.close()
+
+class DjangoBackend(Backend):
+    name = 'django'
+
+    def available(self):
+        try:
+            from django.conf import settings
+        except ImportError:
+            return False
+        if not settings.configured:
+            settings.configure(
+                DATABASE_ENGINE='sqlite3', DATABASE_NAME=':memory:',
+                INSTALLED_APPS=())
+        return settings.DATABASE_ENGINE == 'sqlite3'
+
+    def create(self, schema):
+        from django.db import models, connection
+        from django.core.management.color import no_style
+        env = {}
+        self.tables = []
+        cursor = connection.cursor()
+        for level in range(schema.depth):
+            meta = types.ClassType('Meta', (), {
+                    'app_label': 'fixture_bench',
+                    'db_table': schema.table_name(level)})
+            attrs = {'__module__': __name__, 'Meta': meta}
+            for c in schema.columns(level):
+                if c.startswith('ref'):
+                    attrs[c] = models.IntegerField(null=True)
+                else:
+                    attrs[c] = models.CharField(max_length=60, null=True)
+            if schema.self_refs:
+                attrs['parent'] = models.ForeignKey('self', null=True)
+            model = type(schema.class_name(level), (models.Model,), attrs)
+            statements, pending = connection.creation.sql_create_model(
+                                                        model, no_style())
+            for sql in statements:
+                cursor.execute(sql)
+            self.tables.append(schema.table_name(level))
+            env[schema.storable_names()[level]] = model
+        return env
+
+    def fixture(self, env):
+        from fixture import DjangoFixture
+        return DjangoFixture(env=env, style=NamedDataStyle())
+
+    def dispose(self):
+        from django.db import connection
+        cursor = connection.cursor()
+        for table in self.tables:
+            cursor.execute("DROP TABLE %s" % table)
+
+BACKENDS = (SQLAlchemyTableBackend, SQLAlchemyMappedBackend,
+            SQLObjectBackend, StormBackend, DjangoBackend)
+
+class Run(object):
+    """times the phases of one schema and writes the results."""
+    def __init__(self, options, out):
+        self.options = options
+        self.out = out
+        self.tmp = TempIO()
+        sys.path.insert(0, str(self.tmp))
+        self.num_modules = 0
+        self.num_schemas = 0
+
+    def record(self, schema, backend, phase, times, **extra):
+        result = dict(
+            backend=backend, phase=phase,
+            best=min(times), mean=sum(times) / len(times),
+            repeat=len(times), python=sys.version.split()[0],
+            fixture=fixture.__version__)
+        result.update(schema.params())
+        result.update(extra)
+        self.out.write(json.dumps(result, sort_keys=True) + "\n")
+        self.out.flush()
+        line = "%-18s %-12s %-48s %9.4fs" % (
+                            backend, phase, key_label(result), result['best'])
+        if 'ref_cache_hits' in result:
+            line += "  ref cache %(ref_cache_hits)s hits " \
+                    "%(ref_cache_misses)s misses" % result
+        sys.stderr.write(line + "\n")
+
+    def import_datasets(self, schema):
+        """imports a new module of the schema's source.  returns the module
+        and the time it took to import.
+        """
+        self.num_modules += 1
+        modname = "fixture_bench_datasets_%s" % self.num_modules
+        self.tmp.putfile("%s.py" % modname, schema.source())
+        start = timer()
+        mod = __import__(modname)
+        elapsed = timer() - start
+        return mod, elapsed
+
+    def run_schema(self, params):
+        self.num_schemas += 1
+        schema = Schema(prefix='Bench%s' % self.num_schemas, **params)
+        repeat = self.options.repeat
+
+        times = []
+        for i in range(repeat):
+            mod, elapsed = self.import_datasets(schema)
+            times.append(elapsed)
+        self.record(schema, 'none', 'import', times)
+        datasets = [getattr(mod, n) for n in schema.dataset_names()]
+
+        times = []
+        for i in range(repeat):
+            start = timer()
+            for ds in datasets:
+                ds()
+            times.append(timer() - start)
+        self.record(schema, 'none', 'instantiate', times)
+
+        for backend_class in BACKENDS:
+            backend = backend_class()
+            if self.options.backends and \
+                    backend.name not in self.options.backends:
+                continue
+            if not backend.available():
+                sys.stderr.write("%s is not available, skipping\n" % (
+                                                                backend.name))
+                continue
+            if schema.self_refs and not backend.supports_self_refs:
+                sys.stderr.write("%s does not support self references, "
+                                 "skipping\n" % backend.name)
+                continue
+            self.run_backend(schema, datasets, backend)
+
+    def run_backend(self, schema, datasets, backend):
+        env = backend.create(schema)
+        try:
+            fxt = backend.fixture(env)
+            times = dict([(phase, []) for phase in PHASES])
+            cache = {}
+            for i in range(self.options.repeat):
+                dataset_registry.clear()
+                data = fxt.data(*datasets)
+
+                start = timer()
+                data.setup()
+                times['setup'].append(timer() - start)
+                cache['setup'] = ref_cache_stats(data)
+
+                start = timer()
+                read_all(data, schema)
+                times['access'].append(timer() - start)
+                cache['access'] = ref_cache_stats(data, since=cache['setup'])
+
+                start = timer()
+                data.teardown()
+                times['teardown'].append(timer() - start)
+            for phase in ('setup', 'access', 'teardown'):
+                self.record(schema, backend.name, phase, times[phase],
+                            **cache.get(phase, {}))
+        finally:
+            backend.dispose()
+
+    def close(self):
+        sys.path.remove(str(self.tmp))
+        del self.tmp
+
+def read_all(data, schema):
+    """reads every column of every row that was loaded."""
+    for level, name in enumerate(schema.dataset_names()):
+        columns = ['id'] + schema.columns(level)
+        for key, row in data[name]:
+            for c in columns:
+                getattr(row, c)
+
+def ref_cache_stats(data, since=None):
+    """returns hits and misses of the Ref value cache of all loaded datasets.
+    """
+    hits = misses = 0
+    for ds in data.meta.datasets.values():
+        store = ds.meta._stored_objects
+        hits += store.value_hits
+        misses += store.value_misses
+    if since:
+        hits -= since['ref_cache_hits']
+        misses -= since['ref_cache_misses']
+    return dict(ref_cache_hits=hits, ref_cache_misses=misses)
+
+def key_label(result):
+    return "rows=%(rows)s width=%(width)s fanout=%(fanout)s depth=%(depth)s " \
+           "self_refs=%(self_refs)s" % result
+
+def result_key(result):
+    """identifies a timing so that it can be compared to another run."""
+    return (result['backend'], result['phase'], result['rows'],
+            result['width'], result['fanout'], result['depth'],
+            result['self_refs'])
+
+def load_results(filename):
+    results = {}
+    f = open(filename)
+    try:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            result = json.loads(line)
+            results[result_key(result)] = result
+    finally:
+        f.close()
+    return results
+
+def compare(previous, current, threshold, stream=sys.stderr):
+    """compares two dicts of results from :func:`load_results`.
+
+    returns a list of (key, ratio) for every timing that got slower than
+    threshold.
+    """
+    regressions = []
+    for key in sorted(current.keys()):
+        if key not in previous:
+            continue
+        before, after = previous[key]['best'], current[key]['best']
+        if not before:
+            continue
+        ratio = after / before
+        flag = ""
+        if ratio > threshold:
+            regressions.append((key, ratio))
+            flag = " <-- REGRESSION"
+        stream.write("%-18s %-12s %-48s %9.4fs -> %9.4fs (x%.2f)%s\n" % (
+                        key[0], key[1], key_label(current[key]),
+                        before, after, ratio, flag))
+    return regressions
+
+def int_list(value):
+    return [int(v) for v in value.split(',')]
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('--rows', default='100',
+        help="comma separated numbers of rows per DataSet (default: %default)")
+    parser.add_option('--width', default='5',
+        help="comma separated numbers of plain columns (default: %default)")
+    parser.add_option('--fanout', default='2',
+        help="comma separated numbers of columns referencing the previous "
+             "DataSet (default: %default)")
+    parser.add_option('--depth', default='3',
+        help="comma separated lengths of the DataSet chain (default: %default)")
+    parser.add_option('--self-refs', default='0',
+        help="comma separated 0 or 1, whether rows reference the row before "
+             "them (default: %default)")
+    parser.add_option('--backend', action='append', dest='backends',
+        default=[], help="only run this backend (can be repeated)")
+    parser.add_option('--repeat', type='int', default=3,
+        help="number of times to repeat each phase (default: %default)")
+    parser.add_option('--output',
+        help="file to write JSON results to (default: stdout)")
+    parser.add_option('--compare',
+        help="JSON results of a previous run to compare against")
+    parser.add_option('--threshold', type='float', default=1.25,
+        help="slowdown ratio that counts as a regression (default: %default)")
+    options, args = parser.parse_args(argv)
+
+    if options.output:
+        out = open(options.output, 'w')
+    else:
+        out = sys.stdout
+    run = Run(options, out)
+    try:
+        for rows in int_list(options.rows):
+            for width in int_list(options.width):
+                for fanout in int_list(options.fanout):
+                    for depth in int_list(options.depth):
+                        for self_refs in int_list(options.self_refs):
+                            run.run_schema(dict(
+                                rows=rows, width=width, fanout=fanout,
+                                depth=depth, self_refs=self_refs))
+    finally:
+        run.close()
+        if options.output:
+            out.close()
+
+    if options.compare:
+        if not options.output:
+            parser.error("--compare requires --output")
+        regressions = compare(load_results(options.compare),
+                              load_results(options.output),
+                              options.threshold)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""micro-benchmark of registry lookups during reference-heavy loads.
+
+Run it like this::
+
+    $ PYTHONPATH=. python fixture/test/profile/registry_bench.py [--datasets=N] [--rows=N]
+
+It times :class:`fixture.util.ObjRegistry` lookups directly and then a 
+complete setup / teardown of a chain of DataSet classes where each row 
+references several rows of the previous DataSet.  The same work is repeated 
+with the old identity function (``hasattr`` / ``issubclass`` / 
+``types.ClassType`` per lookup, keyed by ``id()``) for comparison.
+
+"""
+
+import sys, os, types, timeit
+from optparse import OptionParser
+
+from fixture import DataSet
+from fixture.util import ObjRegistry
+from fixture.loadable import EnvLoadableFixture
+from fixture.loadable.loadable import LoadQueue
+
+class LegacyObjRegistry(ObjRegistry):
+    """the identity function ObjRegistry used before it was keyed by class."""
+    def key(self, object):
+        if hasattr(object, '__class__'):
+            if issubclass(object.__class__, type):
+                cls = object
+            else:
+                cls = object.__class__
+        elif type(object)==types.ClassType:
+            cls = object
+        else:
+            raise ValueError(
+                    "cannot identify object %s because it isn't an "
+                    "instance or a class" % object)
+        return id(cls)
+
+class LegacyLoadQueue(LoadQueue, LegacyObjRegistry):
+    key = LegacyObjRegistry.key
+
+class NoOpMedium(EnvLoadableFixture.StorageMediumAdapter):
+    def clear(self, obj):
+        pass
+    def save(self, row, column_vals):
+        for c, val in column_vals:
+            pass
+        return row
+
+class NoOpFixture(EnvLoadableFixture):
+    def attach_storage_medium(self, ds):
+        if ds.meta.storage_medium is None:
+            ds.meta.storage_medium = NoOpMedium(None, ds)
+    def rollback(self):
+        pass
+    def commit(self):
+        pass
+
+def make_datasets(num_datasets, num_rows, fanout=3):
+    """returns a chain of DataSet classes, the last one depends on all others.
+    
+    Each row references ``fanout`` rows of the previous DataSet by value and 
+    one row of the first DataSet.
+    """
+    datasets = []
+    for d in range(num_datasets):
+        attrs = {}
+        for r in range(num_rows):
+            row = {'id': r, 'name': 'row %s' % r}
+            if datasets:
+                prev = datasets[-1]
+                for f in range(fanout):
+                    ref_row = getattr(prev, 'row_%s' % ((r + f) % num_rows))
+                    row['ref_%s_id' % f] = ref_row.ref('id')
+                row['root_id'] = getattr(datasets[0], 'row_0').ref('id')
+            attrs['row_%s' % r] = types.ClassType('row_%s' % r, (), row)
+        datasets.append(type('Bench%sData' % d, (DataSet,), attrs))
+    return datasets
+
+def bench(name, stmt, number):
+    timer = timeit.Timer(stmt)
+    best = min(timer.repeat(3, number))
+    print "%-50s %12.2f usec/pass" % (name, best * 1e6 / number)
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('--datasets', type='int', default=20,
+        help="number of DataSet classes in the reference chain")
+    parser.add_option('--rows', type='int', default=50,
+        help="number of rows per DataSet")
+    parser.add_option('--number', type='int', default=100000,
+        help="number of lookups to time per repeat")
+    options, args = parser.parse_args(argv)
+    
+    datasets = make_datasets(options.datasets, options.rows)
+    instance = datasets[-1]()
+    
+    for registry_class in (ObjRegistry, LegacyObjRegistry):
+        registry = registry_class()
+        registry.register(instance)
+        label = registry_class.__name__
+        bench("%s: instance lookup" % label, 
+              lambda: registry[instance], options.number)
+        bench("%s: class lookup" % label, 
+              lambda: registry[datasets[-1]], options.number)
+        bench("%s: class __contains__" % label, 
+              lambda: datasets[0] in registry, options.number)
+    
+    for queue_class in (LoadQueue, LegacyLoadQueue):
+        fixture = NoOpFixture()
+        fixture.LoadQueue = queue_class
+        def load():
+            data = fixture.data(datasets[-1])
+            data.setup()
+            data.teardown()
+        bench("%s: setup/teardown of %s x %s rows" % (
+                queue_class.__name__, options.datasets, options.rows), 
+              load, 10)
+
+if __name__ == '__main__':
+    main()
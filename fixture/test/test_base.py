@@ -4,7 +4,8 @@ import sys
 import nose.tools, nose.case, nose.loader
 from nose.tools import eq_, raises
 from fixture.test import attr, SilentTestRunner
-from fixture.base import Fixture
+from fixture.base import Fixture, setup_all, teardown_all
+from fixture.util import ObjRegistry
 
 mock_call_log = []
 
@@ -34,6 +35,12 @@ class StubDataset:
 class StubDataset1(StubDataset): pass
 class StubDataset2(StubDataset): pass
     
+class FailingMockLoader(object):
+    def load(self, data):
+        raise ValueError("An exception during setup")
+    def unload(self):
+        mock_call_log.append((self.__class__, 'unload'))
+    
 class TestFixture:
     def setUp(self):
         reset_mock_call_log()
@@ -243,4 +250,78 @@ class TestFixture:
         eq_(mock_call_log[-3], ('some_callable', Fixture.Data))
         eq_(mock_call_log[-2], (MockLoader, 'unload'))
         eq_(mock_call_log[-1], 'my_custom_teardown')
-        
\ No newline at end of file
+        
+
+class TestSetupInBackground:
+    def setUp(self):
+        reset_mock_call_log()
+    
+    def tearDown(self):
+        reset_mock_call_log()
+    
+    @attr(unit=True)
+    def test_setup_in_background(self):
+        fxt = Fixture(loader=MockLoader(), dataclass=StubSuperSet)
+        data = fxt.data(StubDataset1).setup_in_background()
+        data.wait()
+        eq_(mock_call_log, [(MockLoader, 'load', StubSuperSet)])
+        data.teardown()
+        eq_(mock_call_log[-1], (MockLoader, 'unload'))
+    
+    @attr(unit=True)
+    @raises(ValueError)
+    def test_wait_raises_setup_error(self):
+        fxt = Fixture(loader=FailingMockLoader(), dataclass=StubSuperSet)
+        fxt.data(StubDataset1).setup_in_background().wait()
+    
+    def fixture(self, loader_class=MockLoader):
+        loader = loader_class()
+        loader.dataset_registry = ObjRegistry()
+        return Fixture(loader=loader, dataclass=StubSuperSet)
+    
+    @attr(unit=True)
+    def test_setup_all(self):
+        data = [self.fixture().data(ds) for ds in (StubDataset1, StubDataset2)]
+        setup_all(*data)
+        eq_(mock_call_log, [(MockLoader, 'load', StubSuperSet)] * 2)
+        teardown_all(*data)
+        eq_(mock_call_log[2:], [(MockLoader, 'unload')] * 2)
+    
+    @attr(unit=True)
+    def test_setup_all_tears_down_on_error(self):
+        good = self.fixture()
+        bad = self.fixture(FailingMockLoader)
+        try:
+            setup_all(good.data(StubDataset1), bad.data(StubDataset2))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+        eq_(mock_call_log, [(MockLoader, 'load', StubSuperSet), 
+                            (MockLoader, 'unload')])
+    
+    @attr(unit=True)
+    @raises(ValueError)
+    def test_setup_all_needs_separate_loaders(self):
+        fxt = self.fixture()
+        setup_all(fxt.data(StubDataset1), fxt.data(StubDataset2))
+    
+    @attr(unit=True)
+    def test_setup_all_needs_separate_registries(self):
+        registry = ObjRegistry()
+        data = []
+        for ds in (StubDataset1, StubDataset2):
+            fxt = self.fixture()
+            fxt.loader.dataset_registry = registry
+            data.append(fxt.data(ds))
+        for registries in ([registry, registry], [None, None]):
+            data[0].loader.dataset_registry = registries[0]
+            data[1].loader.dataset_registry = registries[1]
+            for all_at_once in (setup_all, teardown_all):
+                try:
+                    all_at_once(*data)
+                except ValueError:
+                    pass
+                else:
+                    raise AssertionError("expected ValueError")
+        eq_(mock_call_log, [])
@@ -1,23 +1,28 @@
 
 import sys
 import os
+import tempfile
+import shutil
 from nose.tools import eq_
 from nose.exc import SkipTest
 from fixture.test import conf
-from fixture.command.generate import DataSetGenerator, dataset_generator
+from fixture.command.generate import (
+        DataSetGenerator, dataset_generator, INDEX_SUFFIX)
 
 def setup():
     # every tests needs a real db conn :
     if not conf.HEAVY_DSN:
         raise SkipTest
 
-def compile_(code):
+def compile_(code, filename=None):
     """compiles code string for a module.
     
     returns dict w/ attributes of that module.
     """
     mod = {}
-    eval(compile(code, 'stdout', 'exec'), mod)
+    if filename:
+        mod['__file__'] = filename
+    eval(compile(code, filename or 'stdout', 'exec'), mod)
     return mod
 
 class GenerateTest(object):
@@ -44,32 +49,120 @@ class GenerateTest(object):
     def assert_data_loaded(self, data):
         raise NotImplementedError
     
+    def change_data(self, old_name, new_name):
+        """renames the offer named old_name in the source db."""
+        raise NotImplementedError
+    
     def create_fixture(self):
         raise NotImplementedError("must return a concrete LoadableFixture instance, i.e. SQLAlchemyFixture")
     
     def load_env(self, module):
         raise NotImplementedError
     
-    def dataset_generator(self, extra_args=[]):
+    def dataset_generator(self, extra_args=[], output=False):
         args = [a for a in self.args]
         if extra_args:
             args.extend(extra_args)
         
         self.assert_env_is_clean()
-        code = dataset_generator(args)
+        tmpdir, path = None, None
+        if output:
+            # data files (if any) are written next to the output file :
+            tmpdir = tempfile.mkdtemp()
+            path = os.path.join(tmpdir, 'generated.py')
         try:
-            self.env = compile_(code)
-            self.assert_env_generated_ok(self.env)
-            data = self.load_env(self.env)
-            self.assert_data_loaded(data)
-        except:
-            print code
-            raise
+            if output:
+                eq_(dataset_generator(args + ['--output', path]), None)
+                code = open(path).read()
+            else:
+                code = dataset_generator(args)
+            try:
+                self.env = compile_(code, filename=path)
+                self.assert_env_generated_ok(self.env)
+                data = self.load_env(self.env)
+                self.assert_data_loaded(data)
+            except:
+                print code
+                raise
+        finally:
+            if tmpdir:
+                shutil.rmtree(tmpdir)
     
     def test_query(self):        
         self.dataset_generator(['-w', "name = 'super cash back!'"])
     
+    def test_query_to_output(self):
+        self.dataset_generator(['-w', "name = 'super cash back!'"], output=True)
+    
+    def read_output(self, tmpdir):
+        """returns the content of each generated file in tmpdir, but the 
+        index"""
+        files = {}
+        for name in os.listdir(tmpdir):
+            if not name.endswith(INDEX_SUFFIX):
+                files[name] = open(os.path.join(tmpdir, name)).read()
+        return files
+    
+    def test_incremental(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'generated.py')
+        args = [a for a in self.args] + ['--output', path, '--incremental']
+        read_output = lambda: self.read_output(tmpdir)
+        try:
+            self.assert_env_is_clean()
+            eq_(dataset_generator(args), None)
+            code = read_output()
+            
+            os.utime(path, (0, 0))
+            self.assert_env_is_clean()
+            eq_(dataset_generator(args), None)
+            # nothing changed, the module is not rewritten :
+            eq_(os.stat(path).st_mtime, 0)
+            
+            self.change_data("super cash back!", "super duper cash back!")
+            self.assert_env_is_clean()
+            eq_(dataset_generator(args), None)
+            expected = {}
+            for name, content in code.items():
+                expected[name] = content.replace(
+                                "super cash back!", "super duper cash back!")
+            eq_(read_output(), expected)
+        finally:
+            shutil.rmtree(tmpdir)
+    
+    def test_incremental_regenerates_edited_output(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, 'generated.py')
+        args = [a for a in self.args] + ['--output', path, '--incremental']
+        try:
+            self.assert_env_is_clean()
+            eq_(dataset_generator(args), None)
+            code = self.read_output(tmpdir)
+            for name, content in code.items():
+                f = open(os.path.join(tmpdir, name), 'w')
+                f.write(content.replace("jersey", "sweater"))
+                f.close()
+            self.assert_env_is_clean()
+            eq_(dataset_generator(args), None)
+            # the edited rows are not copied :
+            eq_(self.read_output(tmpdir), code)
+        finally:
+            shutil.rmtree(tmpdir)
+    
     def test_query_no_data(self):
+        self.assert_usage_error(['-w', "name = 'fooobzarius'"])
+    
+    def test_limit(self):
+        self.dataset_generator(['--limit', '1'])
+    
+    def test_sample(self):
+        self.dataset_generator(['--sample', '1', '--seed', '1'])
+    
+    def test_stratify_by_unknown_column(self):
+        self.assert_usage_error(
+                    ['--limit', '1', '--stratify', 'fooobzarius'])
+    
+    def assert_usage_error(self, extra_args):
         _stderr = sys.stderr
         sys.stderr = sys.stdout
         def wrong_exc(exc=None):
@@ -77,7 +170,7 @@ class GenerateTest(object):
                     exc and ("(raised: %s: %s)" % (exc.__class__, exc)) or ""))
         try:
             try:
-                self.dataset_generator(['-w', "name = 'fooobzarius'"])
+                self.dataset_generator(extra_args)
             except SystemExit, e:
                 eq_(e.code, 2)
             except Exception, e:
@@ -111,4 +204,14 @@ class UsingFixtureTemplate(object):
         self.visit_loader(fixture.loader)
         d = fixture.data(*datasets)
         d.setup()
-        return d
\ No newline at end of file
+        return d
+
+class UsingDataFileTemplate(UsingFixtureTemplate):
+    def __init__(self, *a,**kw):
+        super(UsingDataFileTemplate, self).__init__(*a,**kw)
+        self.args = [a for a in self.args] + ["--template=datafile"]
+    
+    def dataset_generator(self, extra_args=[], output=True):
+        # rows can only be written next to an output file
+        return super(UsingDataFileTemplate, self).dataset_generator(
+                                                extra_args, output=True)
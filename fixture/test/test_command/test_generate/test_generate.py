@@ -1,8 +1,12 @@
 
+import os
+import shutil
 import sys
+import tempfile
 from nose.tools import eq_, raises, with_setup
 from fixture.test import attr
 from fixture.command.generate import *
+from fixture.command.generate.template import fixture as FixtureTemplate
     
 class Stranger(object):
     """something that cannot produce data."""
@@ -86,4 +90,414 @@ def test_resolve_path_to_module():
 @raises(ImportError)
 def test_resolve_bad_path():
     resolve_function_path("nomoduleshouldbenamedthis.nowhere:Babu")
-    
\ No newline at end of file
+    
+class StubFixtureSet(FixtureSet):
+    def __init__(self, model, id, parent_id=None, resolver=None):
+        FixtureSet.__init__(self, None)
+        self.model = model
+        self.data_dict = {'id': id, 'parent_id': parent_id}
+        if parent_id is not None:
+            resolver.defer(self, 'parent_id', model, parent_id)
+    
+    def get_id_attr(self):
+        return 'id'
+    
+    def set_id(self):
+        return self.data_dict['id']
+
+class StubModel(object):
+    pass
+
+class StubResolver(ForeignKeyResolver):
+    batch_size = 2
+    def __init__(self, parents):
+        ForeignKeyResolver.__init__(self)
+        self.parents = parents
+        self.fetched = []
+    def fetch(self, target, values):
+        self.fetched.append((target, values))
+        for v in values:
+            yield v, StubFixtureSet(
+                    target, v, parent_id=self.parents.get(v), resolver=self)
+
+class TestForeignKeyResolver(object):
+    
+    @attr(unit=1)
+    def test_fetches_each_level_once(self):
+        # 3 -> 2 -> 1 
+        r = StubResolver({3: 2, 2: 1})
+        sets = [StubFixtureSet(StubModel, i, parent_id=3, resolver=r) 
+                    for i in (10, 11)]
+        r.resolve()
+        eq_(r.fetched, [(StubModel, [3]), (StubModel, [2]), (StubModel, [1])])
+        eq_(sets[0].data_dict['parent_id'], sets[1].data_dict['parent_id'])
+        eq_(sets[0].data_dict['parent_id'].data_dict['id'], 3)
+        grandparent = sets[0].data_dict['parent_id'].data_dict['parent_id']
+        eq_(grandparent.data_dict['id'], 2)
+    
+    @attr(unit=1)
+    def test_cached_rows_are_not_fetched_again(self):
+        r = StubResolver({})
+        StubFixtureSet(StubModel, 10, parent_id=1, resolver=r)
+        r.resolve()
+        StubFixtureSet(StubModel, 11, parent_id=1, resolver=r)
+        StubFixtureSet(StubModel, 12, parent_id=2, resolver=r)
+        r.resolve()
+        eq_(r.fetched, [(StubModel, [1]), (StubModel, [2])])
+    
+    @attr(unit=1)
+    def test_keys_are_fetched_in_batches(self):
+        r = StubResolver({})
+        sets = [StubFixtureSet(StubModel, i, parent_id=i+100, resolver=r) 
+                    for i in range(5)]
+        resolved = list(r.iter_resolved(iter(sets)))
+        eq_(resolved, sets)
+        eq_(r.fetched, [(StubModel, [100, 101]), (StubModel, [102, 103]), 
+                        (StubModel, [104])])
+    
+    @attr(unit=1)
+    def test_forget(self):
+        r = StubResolver({})
+        kept = StubFixtureSet(StubModel, 10, parent_id=1, resolver=r)
+        left_out = StubFixtureSet(StubModel, 11, parent_id=2, resolver=r)
+        r.forget(left_out)
+        r.resolve()
+        eq_(r.fetched, [(StubModel, [1])])
+        eq_(left_out.data_dict['parent_id'], 2)
+    
+    @attr(unit=1)
+    @raises(LookupError)
+    def test_missing_row(self):
+        class EmptyResolver(StubResolver):
+            def fetch(self, target, values):
+                return []
+        r = EmptyResolver({})
+        StubFixtureSet(StubModel, 10, parent_id=1, resolver=r)
+        r.resolve()
+
+class StubParent(object):
+    pass
+
+def linked_sets(*parent_ids):
+    parents = {}
+    sets = []
+    for i, parent_id in enumerate(parent_ids):
+        if parent_id not in parents:
+            parents[parent_id] = StubFixtureSet(StubParent, parent_id)
+        fset = StubFixtureSet(StubModel, i)
+        fset.data_dict['parent_id'] = parents[parent_id]
+        sets.append(fset)
+    return sets
+
+def sample_ids(sampler, sets):
+    return [s.set_id() for s in sampler(iter(sets))]
+
+class TestSampler(object):
+    
+    @attr(unit=1)
+    def test_inactive_by_default(self):
+        assert not Sampler().is_active()
+        assert Sampler(limit=1).is_active()
+        assert Sampler(fraction=0.5).is_active()
+        assert Sampler(caps={'StubParent': 1}).is_active()
+    
+    @attr(unit=1)
+    def test_limit(self):
+        sampler = Sampler(limit=2)
+        eq_(sample_ids(sampler, linked_sets(1, 2, 3, 4)), [0, 1])
+        eq_(sampler.counts, {'StubModel': 2, 'StubParent': 2})
+    
+    @attr(unit=1)
+    def test_limit_stops_reading_sets(self):
+        read = []
+        def sets():
+            for s in linked_sets(1, 2, 3, 4):
+                read.append(s.set_id())
+                yield s
+        eq_([s.set_id() for s in Sampler(limit=1)(sets())], [0])
+        eq_(read, [0, 1])
+    
+    @attr(unit=1)
+    def test_fraction_is_reproducible(self):
+        sets = linked_sets(*range(100))
+        first = sample_ids(Sampler(fraction=0.3, seed=5), sets)
+        eq_(sample_ids(Sampler(fraction=0.3, seed=5), sets), first)
+        assert 0 < len(first) < 100, first
+    
+    @attr(unit=1)
+    def test_stratify(self):
+        sampler = Sampler(limit=1, stratify='parent_id')
+        eq_(sample_ids(sampler, linked_sets(1, 1, 2, 2, 3)), [0, 2, 4])
+    
+    @attr(unit=1)
+    def test_caps_leave_out_sets_linking_to_more(self):
+        sampler = Sampler(caps={'StubParent': 2})
+        eq_(sample_ids(sampler, linked_sets(1, 2, 3, 1, 2)), [0, 1, 3, 4])
+        eq_(sampler.counts['StubParent'], 2)
+
+    @attr(unit=1)
+    @raises(UnknownColumn)
+    def test_stratify_by_unknown_column(self):
+        sampler = Sampler(limit=1, stratify='parent')
+        sample_ids(sampler, linked_sets(1, 2))
+
+class SampleOptions(object):
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+class StubDeferringHandler(DataHandler):
+    """builds a set linking to each of parent_ids"""
+    def __init__(self, parent_ids):
+        self.parent_ids = parent_ids
+        self.resolver = StubResolver({})
+        self.limited = None
+    
+    def limit(self, count):
+        self.limited = count
+    
+    def build_sets(self):
+        parent_ids = self.parent_ids[:self.limited]
+        for i, parent_id in enumerate(parent_ids):
+            yield StubFixtureSet(StubModel, i, parent_id=parent_id, 
+                                    resolver=self.resolver)
+
+def fetched_ids(resolver):
+    ids = []
+    for target, values in resolver.fetched:
+        ids.extend(values)
+    return ids
+
+class TestGeneratorSample(object):
+    
+    @attr(unit=1)
+    def test_only_links_of_chosen_sets_are_fetched(self):
+        generate = DataSetGenerator(SampleOptions(sample=0.3, seed=5))
+        handler = StubDeferringHandler(range(100, 200))
+        kept = list(generate.sets(handler))
+        assert 0 < len(kept) < 100, kept
+        eq_(sorted(fetched_ids(handler.resolver)), 
+            [s.data_dict['parent_id'].set_id() for s in kept])
+        eq_(handler.limited, None)
+    
+    @attr(unit=1)
+    def test_limit_is_passed_to_handler(self):
+        generate = DataSetGenerator(SampleOptions(limit=2))
+        handler = StubDeferringHandler([100, 101, 102])
+        eq_([s.set_id() for s in generate.sets(handler)], [0, 1])
+        eq_(handler.limited, 2)
+        eq_(fetched_ids(handler.resolver), [100, 101])
+    
+    @attr(unit=1)
+    def test_limit_with_caps_is_applied_to_resolved_sets(self):
+        # caps may leave out a set, so all rows must be read 
+        generate = DataSetGenerator(SampleOptions(
+                                        limit=2, caps={'StubModel': 3}))
+        handler = StubDeferringHandler([100, 101, 100, 102])
+        eq_([s.set_id() for s in generate.sets(handler)], [0, 2])
+        eq_(handler.limited, None)
+
+class StubRowsHandler(DataHandler):
+    """yields the sets in rows[obj_path]"""
+    rows = {}
+    
+    @staticmethod
+    def recognizes(obj_path, obj=None):
+        return obj_path in StubRowsHandler.rows
+    
+    def add_fixture_set(self, fset):
+        pass
+    
+    def findall(self, query=None):
+        pass
+    
+    def sets(self):
+        return iter(self.rows[self.obj_path])
+
+class StubOtherRowsHandler(StubRowsHandler):
+    """yields the same sets for another type of fixture"""
+    
+    @staticmethod
+    def recognizes(obj_path, obj=None):
+        return obj_path == 'stub.other'
+    
+    def fxt_type(self):
+        return 'OtherFixture'
+    
+    def sets(self):
+        return iter(self.rows['stub.parents'])
+
+class CountingTemplate(FixtureTemplate):
+    begun = 0
+    def begin(self):
+        self.begun += 1
+        FixtureTemplate.begin(self)
+
+def register_stubrowshandler():
+    parents = linked_sets(1, 2)
+    StubRowsHandler.rows = {
+        'stub.children': parents,
+        'stub.parents': [p.data_dict['parent_id'] for p in parents] + [
+                                        StubFixtureSet(StubParent, 3)],
+    }
+    register_handler(StubRowsHandler)
+
+class TestGenerateAll(object):
+    
+    def setUp(self):
+        register_stubrowshandler()
+        class options:
+            where = None
+            prefix = ''
+            suffix = 'Data'
+        self.generator = DataSetGenerator(options, template=CountingTemplate())
+    
+    def tearDown(self):
+        reset_handlers()
+    
+    @attr(unit=1)
+    def test_merges_sets_of_all_paths(self):
+        code = self.generator.generate_all(['stub.children', 'stub.parents'])
+        eq_(code.count("class StubParentData(DataSet):"), 1)
+        eq_(code.count("class StubParent_1:"), 1)
+        assert "class StubParent_3:" in code, code
+        assert (code.index("class StubParentData(DataSet):") < 
+                    code.index("class StubModelData(DataSet):")), code
+        eq_(self.generator.class_handlers['StubModel'].obj_path, 
+                    'stub.children')
+    
+    @attr(unit=1)
+    def test_template_is_begun_once(self):
+        self.generator.generate_all(['stub.children', 'stub.parents'])
+        eq_(self.generator.template.begun, 1)
+    
+    @attr(unit=1)
+    @raises(MisconfiguredHandler)
+    def test_fixture_types_cannot_be_mixed(self):
+        register_handler(StubOtherRowsHandler)
+        self.generator.generate_all(['stub.children', 'stub.other'])
+    
+    @attr(unit=1)
+    def test_jobs(self):
+        code = self.generator.generate_all(
+                        ['stub.parents', 'stub.children'], jobs=1)
+        eq_(code.count("class StubParent_2:"), 1)
+    
+    @attr(unit=1)
+    @raises(NoData)
+    def test_no_data(self):
+        StubRowsHandler.rows['stub.empty'] = []
+        self.generator.generate_all(['stub.children', 'stub.empty'])
+
+class StubLinkedRowsHandler(DataHandler):
+    """builds a set for each item of rows, a dict of id to parent id"""
+    rows = {}
+    resolvers = []
+    
+    def __init__(self, *a, **kw):
+        DataHandler.__init__(self, *a, **kw)
+        self.resolver = StubResolver({})
+        self.resolvers.append(self.resolver)
+    
+    @staticmethod
+    def recognizes(obj_path, obj=None):
+        return obj_path == 'stub.linked'
+    
+    def add_fixture_set(self, fset):
+        pass
+    
+    def findall(self, query=None):
+        pass
+    
+    def build_sets(self):
+        for id, parent_id in sorted(self.rows.items()):
+            fset = StubFixtureSet(StubModel, id)
+            fset.data_dict['parent_id'] = parent_id
+            self.resolver.defer(fset, 'parent_id', StubParent, parent_id)
+            yield fset
+
+class TestStream(object):
+    
+    def setUp(self):
+        register_handler(StubLinkedRowsHandler)
+        StubLinkedRowsHandler.rows = {1: 100, 2: 101}
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, 'stub.py')
+    
+    def tearDown(self):
+        reset_handlers()
+        del StubLinkedRowsHandler.resolvers[:]
+        shutil.rmtree(self.tmpdir)
+    
+    def generator(self):
+        return DataSetGenerator(
+                    SampleOptions(where=None, prefix='', suffix='Data'), 
+                    template=FixtureTemplate())
+    
+    def update(self):
+        return update_object_data(self.generator(), 'stub.linked', self.output)
+    
+    def fetched(self):
+        return fetched_ids(StubLinkedRowsHandler.resolvers[-1])
+    
+    @attr(unit=1)
+    def test_more_rows_than_chunk_size(self):
+        StubLinkedRowsHandler.rows = dict([(i, 100 + i % 3) for i in range(10)])
+        generator = self.generator()
+        generator.chunk_size = 2
+        generator.cache_size = 2
+        out = open(self.output, 'w')
+        try:
+            index = generator.stream('stub.linked', out)
+        finally:
+            out.close()
+        eq_([row[0] for row in index['classes']['StubModel']['rows']], 
+            ["StubModel_%s" % i for i in range(10)])
+        eq_(sorted([row[0] for row in index['classes']['StubParent']['rows']]), 
+            ['StubParent_100', 'StubParent_101', 'StubParent_102'])
+        code = open(self.output).read()
+        eq_(code.count("class StubParent_100:"), 1)
+        eq_(code.count("class StubModel_9:"), 1)
+        
+        resolver = StubLinkedRowsHandler.resolvers[-1]
+        # evicted rows were fetched again :
+        assert fetched_ids(resolver).count(100) > 1, resolver.fetched
+        assert len(resolver.cache) <= generator.cache_size + resolver.batch_size
+    
+    @attr(unit=1)
+    def test_unchanged_rows_are_not_resolved(self):
+        self.update()
+        eq_(self.fetched(), [100, 101])
+        code = open(self.output).read()
+        eq_(self.update(), {})
+        eq_(self.fetched(), [])
+        eq_(open(self.output).read(), code)
+    
+    @attr(unit=1)
+    def test_only_changed_rows_are_resolved(self):
+        self.update()
+        StubLinkedRowsHandler.rows = {1: 100, 2: 102, 3: 100}
+        eq_(self.update(), {
+            'StubModel': (['StubModel_3'], ['StubModel_2'], []), 
+            'StubParent': (['StubParent_102'], [], ['StubParent_101'])})
+        eq_(self.fetched(), [100, 102])
+        
+        fresh = open(os.path.join(self.tmpdir, 'fresh.py'), 'w')
+        try:
+            self.generator().stream('stub.linked', fresh)
+        finally:
+            fresh.close()
+        eq_(open(self.output).read(), open(fresh.name).read())
+
+@attr(unit=1)
+def test_order_rows_keeps_previous_order():
+    rows = [('c', 'c1', 0, 1), ('a', 'a2', 1, 1), ('d', 'd1', 2, 1)]
+    previous = [['a', 'a1'], ['b', 'b1'], ['c', 'c1']]
+    eq_([r[0] for r in order_rows(rows, previous)], ['a', 'c', 'd'])
+    eq_([r[0] for r in order_rows(rows, [])], ['c', 'a', 'd'])
+
+@attr(unit=1)
+def test_diff_index():
+    rows = [['a', 'a2'], ['c', 'c1'], ['d', 'd1']]
+    previous = [['a', 'a1'], ['b', 'b1'], ['c', 'c1']]
+    eq_(diff_index(rows, previous), (['d'], ['a'], ['b']))
+    eq_(diff_index(rows, rows), ([], [], []))
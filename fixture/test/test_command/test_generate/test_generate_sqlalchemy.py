@@ -365,6 +365,10 @@ class TestSQLAlchemyGenerate(UsingFixtureTemplate, GenerateTest):
         # products.drop(bind=engine)
         # categories.drop(bind=engine)
     
+    def change_data(self, old_name, new_name):
+        realmeta.bind.execute(
+                offers.update(offers.c.name == old_name), name=new_name)
+    
     def create_fixture(self):
         return SQLAlchemyFixture(
             env = self.env,
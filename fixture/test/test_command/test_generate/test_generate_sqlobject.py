@@ -7,7 +7,8 @@ from fixture.command.generate import DataSetGenerator, dataset_generator
 from fixture.dataset import MergedSuperSet
 from fixture.style import NamedDataStyle
 from fixture.test.test_command.test_generate import (
-        compile_, GenerateTest, UsingTesttoolsTemplate, UsingFixtureTemplate)
+        compile_, GenerateTest, UsingTesttoolsTemplate, UsingFixtureTemplate, 
+        UsingDataFileTemplate)
 from fixture.test import env_supports, conf
 from fixture.examples.db.sqlobject_examples import (
                     Category, Product, Offer, setup_db, teardown_db)
@@ -73,6 +74,11 @@ class SQLObjectGenerateTest(GenerateTest):
         Product.clearTable(connection=realconn)
         Category.clearTable(connection=realconn)
     
+    def change_data(self, old_name, new_name):
+        sqlhub.processConnection = realconn
+        Offer.selectBy(name=old_name)[0].name = new_name
+        sqlhub.processConnection = None
+    
     def create_fixture(self):
         return SQLObjectFixture(
             env = self.env,
@@ -116,5 +122,47 @@ class TestSQLObjectTesttools(UsingTesttoolsTemplate, SQLObjectGenerateTest):
 class TestSQLObjectFixture(UsingFixtureTemplate, SQLObjectGenerateTest):
     def visit_loader(self, loader):
         loader.connection = memconn
+
+class TestSQLObjectDataFile(UsingDataFileTemplate, SQLObjectGenerateTest):
+    def visit_loader(self, loader):
+        loader.connection = memconn
+
+class TestSQLObjectSample(object):
+    """samples offers that each link to a category of their own."""
+    args = [
+        "fixture.examples.db.sqlobject_examples.Offer", 
+        "--dsn", str(conf.HEAVY_DSN), "--template=fixture" ]
+    
+    def setUp(self):
+        setup_db(realconn)
+        sqlhub.processConnection = realconn
+        parkas = Category(name="parkas")
+        for i in range(10):
+            jersey = Product(name="jersey %s" % i, category=parkas)
+            Offer(name="offer %s" % i, product=jersey, 
+                    category=Category(name="category %s" % i))
+        sqlhub.processConnection = None
+    
+    def tearDown(self):
+        sqlhub.processConnection = None
+        teardown_db(realconn)
+    
+    def generate(self, extra_args):
+        env = compile_(dataset_generator(self.args + extra_args))
+        return [sorted([key for key, row in env[name]()]) 
+                    for name in ('OfferData', 'ProductData', 'CategoryData')]
+    
+    def test_limit(self):
+        offers, products, categories = self.generate(['--limit', '3'])
+        eq_(len(offers), 3)
+        eq_(len(products), 3)
+        # the category of each offer and the category of all products :
+        eq_(len(categories), 4)
     
-    
\ No newline at end of file
+    def test_sample(self):
+        sample = self.generate(['--sample', '0.5', '--seed', '2'])
+        offers, products, categories = sample
+        assert 0 < len(offers) < 10, offers
+        eq_(len(products), len(offers))
+        eq_(len(categories), len(offers) + 1)
+        eq_(self.generate(['--sample', '0.5', '--seed', '2']), sample)
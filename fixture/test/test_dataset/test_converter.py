@@ -10,6 +10,8 @@ try:
 except ImportError:
     import simplejson as json
 from cStringIO import StringIO
+import os
+import tempfile
         
 class FooData(DataSet):
     class bar:
@@ -103,4 +105,66 @@ class TestDatasetToJson(object):
                      {'name': "name's foo",
                       'is_alive': True}]
                 }))
-                
\ No newline at end of file
+                
+class TestRowsFromJSON(object):
+    
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+    
+    def tearDown(self):
+        os.unlink(self.path)
+    
+    def write_rows(self, *rows):
+        f = open(self.path, 'w')
+        for row in rows:
+            key, values = row
+            f.write(json.dumps([key, encode_row(values)], 
+                                default=encode_row_value) + "\n")
+        f.close()
+    
+    @attr(unit=1)
+    def test_values_round_trip(self):
+        values = dict(
+            d = datetime.date(2008,1,1),
+            dt = datetime.datetime(2008,1,1,2,30,59),
+            dt_micro = datetime.datetime(2008,1,1,2,30,59,1200),
+            t = datetime.time(2,30,59),
+            dec = Decimal("1.45667"),
+            name = "foo")
+        self.write_rows(["mucho", values])
+        eq_(rows_from_json(None, self.path), [("mucho", values)])
+    
+    @attr(unit=1)
+    def test_values_with_offsets_round_trip(self):
+        values = dict(
+            dt = datetime.datetime(2008,1,1,2,30,59, tzinfo=FixedOffset(0)),
+            dt_micro = datetime.datetime(2008,1,1,2,30,59,1200, 
+                                            tzinfo=FixedOffset(-330)),
+            t = datetime.time(2,30,59, tzinfo=FixedOffset(60)))
+        self.write_rows(["mucho", values])
+        key, row = rows_from_json(None, self.path)[0]
+        eq_(row, values)
+        eq_(row['dt_micro'].utcoffset(), datetime.timedelta(minutes=-330))
+        eq_(row['t'].utcoffset(), datetime.timedelta(minutes=60))
+    
+    @attr(unit=1)
+    def test_str_that_is_not_utf8_round_trips(self):
+        values = dict(latin1 = "caf\xe9", blob = "\x00\xff\xfe", name = "foo")
+        self.write_rows(["mucho", values])
+        eq_(rows_from_json(None, self.path), [("mucho", values)])
+    
+    @attr(unit=1)
+    def test_dataset_with_refs(self):
+        self.write_rows(
+            ["bar_2", {"name": "bar", "foo_name": 
+                            {"__ref__": ["FooData", "foo", "name"]}}])
+        path = self.path
+        class BarData(DataSet):
+            class Meta:
+                references = [FooData]
+            def data(self):
+                return rows_from_json(self, path)
+        bar = BarData()
+        eq_(bar.bar_2.name, "bar")
+        eq_(bar.bar_2.foo_name, "name's foo")
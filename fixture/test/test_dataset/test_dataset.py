@@ -320,6 +320,37 @@ class TestMergedSuperSet(SuperSetTest):
         eq_(self.superset['pi'].title, 'life of pi')
         eq_(self.superset.peewee.director, 'Tim Burton')
         eq_(self.superset.aquatic.director, 'cant remember his name')
+    
+    @attr(unit=True)
+    def test_rows_are_made_when_accessed(self):
+        eq_(dict.keys(self.superset.meta.data), [])
+        assert 'lolita' in self.superset
+        assert 'lolita' in self.superset.meta.data
+        eq_(sorted(self.superset.meta.data.keys()), 
+            ['aquatic', 'lolita', 'peewee', 'pi'])
+        row = self.superset.lolita
+        assert isinstance(row, DataRow)
+        assert self.superset.lolita is row
+        eq_(dict.keys(self.superset.meta.data), ['lolita'])
+        eq_(self.superset.get('nope', 1), 1)
+    
+    @attr(unit=True)
+    @raises(AttributeError)
+    def test_unknown_row(self):
+        self.superset.nope
+    
+    @attr(unit=True)
+    def test_duplicate_keys(self):
+        class MoreBooks(DataSet):
+            class pi:
+                title = 'pi again'
+        try:
+            MergedSuperSet(Books(), MoreBooks())
+        except ValueError, e:
+            assert str(e).startswith(
+                "cannot add key 'pi' for <MoreBooks at"), str(e)
+        else:
+            raise AssertionError("expected ValueError")
 
 class ComplexRefTest:
     @attr(unit=True)
@@ -409,4 +440,102 @@ def test_DataSet_cant_add_refs_to_self():
     ds = Pals()
     eq_(ds.meta.references, [])
     
-        
\ No newline at end of file
+        
+class TestRowTable(object):
+    @attr(unit=True)
+    def test_rows_are_compiled_at_class_creation(self):
+        table = OfferData._row_table
+        eq_([key for key, row_class, columns in table.rows], 
+            ['discounted_spaceship', 'free_truck'])
+        key, row_class, columns = table.rows[1]
+        assert row_class is OfferData.free_truck
+        eq_([name for name, value in columns], 
+            ['category_id', 'id', 'name', 'product_id'])
+        eq_(table.references, [CategoryData, ProductData])
+    
+    @attr(unit=True)
+    def test_inherited_rows_are_resolved(self):
+        key, row_class, columns = EventData._row_table.rows[0]
+        eq_(key, 'activation')
+        eq_(dict(columns), {
+            'offer': 1, 'session': 'aaaaaaa', 'time': 'now', 
+            'type': 'activation'})
+    
+    @attr(unit=True)
+    def test_data_reads_from_row_table(self):
+        ds = OfferData()
+        eq_(ds.meta.references, [CategoryData, ProductData])
+        eq_(list(ds.free_truck.columns()), 
+            ['category_id', 'id', 'name', 'product_id'])
+        eq_(ds.free_truck.name, "it's a free truck")
+    
+    @attr(unit=True)
+    @raises(TypeError)
+    def test_bad_multi_value_column_raises_on_instantiation(self):
+        class BadListData(DataSet):
+            class row:
+                things = ['not', 'rowlike']
+        eq_(BadListData._row_table, None)
+        BadListData()
+
+class StoredThing(object):
+    reads = 0
+    def __init__(self, id):
+        self._id = id
+    def id(self):
+        self.reads += 1
+        return self._id
+    id = property(id)
+
+class TestRefValueCache:
+    def setUp(self):
+        class ThingData(DataSet):
+            class one:
+                name = 'one'
+        class OtherData(DataSet):
+            class first:
+                thing_id = ThingData.one.ref('id')
+        self.ThingData = ThingData
+        self.OtherData = OtherData
+        self.things = ThingData()
+        self.ThingData.one.ref.dataset_obj = self.things
+        self.store = self.things.meta._stored_objects
+        self.stored = StoredThing(1)
+        self.store.store('one', self.stored)
+    
+    def row(self):
+        # rows are classes until their dataset is loaded
+        other = self.OtherData()
+        return other.first(other)
+    
+    @attr(unit=True)
+    def test_ref_values_are_read_once(self):
+        other = self.row()
+        eq_(other.thing_id, 1)
+        eq_(other.thing_id, 1)
+        eq_(self.stored.reads, 1)
+        eq_(self.store.value_hits, 1)
+        eq_(self.store.value_misses, 1)
+    
+    @attr(unit=True)
+    def test_forget_values(self):
+        other = self.row()
+        eq_(other.thing_id, 1)
+        self.store.forget_values()
+        eq_(other.thing_id, 1)
+        eq_(self.stored.reads, 2)
+    
+    @attr(unit=True)
+    def test_storing_again_replaces_value(self):
+        other = self.row()
+        eq_(other.thing_id, 1)
+        self.store.store('one', StoredThing(2))
+        eq_(other.thing_id, 2)
+    
+    @attr(unit=True)
+    def test_none_is_not_cached(self):
+        self.stored._id = None
+        other = self.row()
+        eq_(other.thing_id, None)
+        self.stored._id = 1
+        eq_(other.thing_id, 1)
@@ -0,0 +1,90 @@
+
+from nose.tools import eq_, raises
+from fixture.test import attr
+from fixture.dataset import GeneratedDataSet, Sequence, Pick, SuperSet
+
+class UserData(GeneratedDataSet):
+    class Meta:
+        rows = 25
+        chunk_size = 10
+        columns = dict(
+            id = Sequence(),
+            name = lambda n, random: "user %s" % n,
+            score = lambda n, random: random.randint(1, 1000),
+            kind = 'generated')
+
+class OrderData(GeneratedDataSet):
+    class Meta:
+        rows = 100
+        seed = 3
+        columns = dict(
+            id = Sequence(start=10, step=10),
+            user_id = Pick(UserData))
+
+@attr(unit=True)
+def test_rows():
+    rows = list(UserData().generate())
+    eq_(len(rows), 25)
+    eq_(rows[0]['id'], 1)
+    eq_(rows[24]['id'], 25)
+    eq_(rows[3]['name'], 'user 3')
+    eq_(rows[3]['kind'], 'generated')
+    eq_(sorted(rows[3].keys()), ['id', 'kind', 'name', 'score'])
+
+@attr(unit=True)
+def test_rows_are_deterministic():
+    first = list(OrderData().generate())
+    eq_(first, list(OrderData().generate()))
+    scores = [r['score'] for r in UserData().generate()]
+    eq_(scores, [r['score'] for r in UserData().generate()])
+    assert len(set(scores)) > 1, scores
+    
+    # a row is the same however it is read :
+    eq_(list(UserData().generate(start=5, stop=6))[0]['score'], scores[5])
+    eq_(UserData.row_generator().value(5, 'score'), scores[5])
+
+@attr(unit=True)
+def test_seed_changes_values():
+    class OtherSeedData(UserData):
+        class Meta(UserData.Meta):
+            seed = 1
+    scores = [r['score'] for r in UserData().generate()]
+    eq_(len(scores), 25)
+    assert scores != [r['score'] for r in OtherSeedData().generate()]
+
+@attr(unit=True)
+def test_chunks():
+    chunks = list(UserData().chunks())
+    eq_([len(c) for c in chunks], [10, 10, 5])
+    chunks = list(UserData().chunks(columns=['id']))
+    eq_(chunks[2], [{'id': 21}, {'id': 22}, {'id': 23}, {'id': 24}, {'id': 25}])
+
+@attr(unit=True)
+def test_picks_reference_generated_values():
+    user_ids = set([r['id'] for r in UserData().generate()])
+    for row in OrderData().generate():
+        assert row['user_id'] in user_ids, row
+    eq_(OrderData().meta.references, [UserData])
+    eq_([ds.__class__ for ds in OrderData().ref], [UserData])
+
+@attr(unit=True)
+def test_no_rows_are_declared():
+    orders = OrderData()
+    eq_(list(orders), [])
+    eq_(orders.meta.rows, 100)
+    eq_(orders.meta.chunk_size, 1000)
+    SuperSet(orders)
+
+@attr(unit=True)
+@raises(ValueError)
+def test_primary_key_must_be_generated():
+    class NoIdData(GeneratedDataSet):
+        class Meta:
+            rows = 1
+            columns = dict(name='x')
+    NoIdData()
+
+@attr(unit=True)
+@raises(TypeError)
+def test_can_only_pick_generated_datasets():
+    Pick(dict)
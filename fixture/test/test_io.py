@@ -1,13 +1,17 @@
 # -*- coding: latin_1 -*-
 
 import os
+import sys
 from nose.tools import eq_
+from nose.exc import SkipTest
 from os.path import join, exists, isdir, basename
 from os import path
 from copy import copy
 from nose.tools import eq_, raises
-from fixture import TempIO
-from fixture.io import mkdirall, putfile
+import fixture.io
+from fixture import TempIO, TempTree, TempIOPool
+from fixture.io import (
+        mkdirall, putfile, memory_root, set_cleanup, BackgroundCleanup)
 from fixture.test import attr
 
 french = "tu pense qu'on peut m'utiliser comme ça?"
@@ -195,4 +199,151 @@ class TestTempIO(object):
     @attr(unit=True)
     def test_root(self):
         assert isdir(self.tmp)
-    
\ No newline at end of file
+    
+class TestTempTree(object):
+    tree = {
+        'frenchy.txt': french,
+        'petite': {
+            'grenouille/ribbit.txt': "ribbit",
+            'vide': None},
+        'empty': None}
+    
+    def assert_tree(self, tmp):
+        eq_(open(join(tmp, 'frenchy.txt')).read(), french)
+        eq_(open(join(tmp, 'petite/grenouille/ribbit.txt')).read(), "ribbit")
+        assert isdir(join(tmp, 'petite/vide'))
+        assert isdir(join(tmp, 'empty'))
+    
+    @attr(unit=True)
+    def test_copy(self):
+        tree = TempTree(self.tree)
+        tmp = TempIO(tree=tree)
+        self.assert_tree(tmp)
+        tmp.putfile('frenchy.txt', "changed")
+        # the tree is built once and not changed by copies :
+        self.assert_tree(TempIO(tree=tree))
+    
+    @attr(unit=True)
+    def test_link(self):
+        tree = TempTree(self.tree, mode='link')
+        tmp = TempIO(tree=tree)
+        self.assert_tree(tmp)
+        if hasattr(os, 'link'):
+            eq_(os.stat(join(tmp, 'frenchy.txt')).st_ino, 
+                os.stat(join(tree.source, 'frenchy.txt')).st_ino)
+    
+    @attr(unit=True)
+    def test_clone(self):
+        if sys.platform.startswith('win'):
+            raise SkipTest
+        tmp = TempIO(tree=TempTree(self.tree, mode='clone'))
+        self.assert_tree(tmp)
+    
+    @attr(unit=True)
+    def test_clone_falls_back_to_copy(self):
+        tree = TempTree(self.tree, mode='clone')
+        tree.can_clone = True
+        call = fixture.io.subprocess.call
+        def failing_cp(args, **kw):
+            # copies a part of the tree, then fails like a cp without 
+            # --reflink would
+            dest = args[-1]
+            os.mkdir(join(dest, 'petite'))
+            putfile(join(dest, 'frenchy.txt'), "partial")
+            return 1
+        fixture.io.subprocess.call = failing_cp
+        try:
+            self.assert_tree(TempIO(tree=tree))
+            assert not tree.can_clone
+        finally:
+            fixture.io.subprocess.call = call
+        self.assert_tree(TempIO(tree=tree))
+    
+    @attr(unit=True)
+    def test_existing_directory(self):
+        source = TempIO(tree=TempTree(self.tree))
+        tmp = TempIO(tree=TempTree(str(source), mode='link'))
+        self.assert_tree(tmp)
+    
+    @attr(unit=True)
+    @raises(ValueError)
+    def test_unknown_mode(self):
+        TempTree(self.tree, mode='teleport')
+
+@attr(unit=True)
+def test_in_memory():
+    tmp = TempIO(in_memory=True)
+    assert isdir(tmp)
+    root = memory_root()
+    if root is not None:
+        assert tmp.startswith(path.realpath(root)), tmp
+
+class TestTempIOPool(object):
+    
+    @attr(unit=True)
+    def test_recycle(self):
+        pool = TempIOPool(size=1)
+        tmp = pool.get()
+        tmp.putfile('frenchy.txt', french)
+        tmpdir = str(tmp)
+        del tmp
+        eq_(pool.free, [tmpdir])
+        # same path, but empty :
+        tmp = pool.get()
+        eq_(str(tmp), tmpdir)
+        eq_(os.listdir(tmp), [])
+        
+    @attr(unit=True)
+    def test_fill(self):
+        pool = TempIOPool(size=2)
+        dirs = [pool.get() for i in range(3)]
+        eq_(len(set(dirs)), 3)
+        for tmp in dirs:
+            assert isdir(tmp)
+    
+    @attr(unit=True)
+    def test_release_once(self):
+        pool = TempIOPool(size=1)
+        tmp = pool.get()
+        tmp.rmtree()
+        del tmp
+        eq_(len(pool.free), 1)
+    
+    @attr(unit=True)
+    def test_tree(self):
+        tmp = TempIOPool(size=1).get(tree=TempTree(TestTempTree.tree))
+        TestTempTree().assert_tree(tmp)
+
+class TestBackgroundCleanup(object):
+    
+    def setUp(self):
+        self.previous = set_cleanup(BackgroundCleanup())
+    
+    def tearDown(self):
+        set_cleanup(self.previous)
+    
+    @attr(unit=True)
+    def test_remove(self):
+        tmp = TempIO()
+        tmp.putfile('frenchy.txt', french)
+        tmpdir = str(tmp)
+        del tmp
+        # gone from its path right away :
+        assert not exists(tmpdir)
+        graveyards = fixture.io._cleanup.graveyards.values()
+        eq_(len(graveyards), 1)
+        fixture.io._cleanup.flush()
+        assert not exists(graveyards[0])
+    
+    @attr(unit=True)
+    def test_pool(self):
+        pool = TempIOPool(size=1)
+        tmp = pool.get()
+        tmp.putfile('frenchy.txt', french)
+        tmp.mkdir('incoming').putfile('foo.txt', "foo")
+        tmpdir = str(tmp)
+        tmp.rmtree()
+        fixture.io._cleanup.flush()
+        # the same directory, emptied in the background :
+        eq_(pool.free, [tmpdir])
+        eq_(os.listdir(tmpdir), [])
@@ -52,4 +52,35 @@ class DjangoDataSetWithMeta(DataSet):
         last_name = "Herbert"
     class guido:
         first_name = "Guido"
-        last_name = "Van rossum"
\ No newline at end of file
+        last_name = "Van rossum"
+class NumberedAuthorData(DataSet):
+    class Meta:
+        django_model = 'app.Author'
+    class frank_herbert:
+        id = 10
+        first_name = "Frank"
+        last_name = "Herbert"
+    class guido:
+        id = 11
+        first_name = "Guido"
+        last_name = "Van rossum"
+
+class NumberedBookData(DataSet):
+    class Meta:
+        django_model = 'app.Book'
+    class dune:
+        id = 20
+        title = "Dune"
+        author = NumberedAuthorData.frank_herbert
+    class python:
+        id = 21
+        title = 'Python'
+        author = NumberedAuthorData.guido
+
+class NumberedReviewerData(DataSet):
+    class Meta:
+        django_model = 'app.Reviewer'
+    class ben:
+        id = 30
+        name = 'ben'
+        reviewed = [NumberedBookData.dune, NumberedBookData.python]
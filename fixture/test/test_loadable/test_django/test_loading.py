@@ -1,6 +1,9 @@
 
+from django.db import connection
+from django.db.models import signals
 from fixture import DjangoFixture
 from fixture import DataSet, style
+from nose.tools import eq_
 
 from fixture.examples.django_example.app import models
 from fixtures import *
@@ -46,4 +49,126 @@ def test_dataset_with_meta():
     finally:
         data.teardown()
     assert_empty(models)
-    
\ No newline at end of file
+    
+def test_batched_rows():
+    assert_empty(models)
+    fixture = DjangoFixture(batch_size=1)
+    data = fixture.data(NumberedReviewerData)
+    try:
+        data.setup()
+        eq_(models.Author.objects.count(), 2)
+        dune = models.Book.objects.get(title='Dune')
+        eq_(dune.id, 20)
+        eq_(dune.author.first_name, 'Frank')
+        ben = models.Reviewer.objects.get(name='ben')
+        eq_(sorted([b.id for b in ben.reviewed.all()]), [20, 21])
+        eq_(data.NumberedBookData.python.author_id, 11)
+    finally:
+        data.teardown()
+    assert_empty(models)
+
+def test_get_or_create():
+    assert_empty(models)
+    models.Author.objects.create(first_name="Frank", last_name="Herbert")
+    data = DjangoFixture(get_or_create=True).data(AuthorData)
+    try:
+        data.setup()
+        eq_(models.Author.objects.count(), 2)
+    finally:
+        data.teardown()
+    assert_empty(models)
+
+def test_count_statements():
+    assert_empty(models)
+    data = DjangoFixture(count_statements=True, 
+                         batch_size=500).data(NumberedReviewerData)
+    try:
+        data.setup()
+        authors = data.statements.load['NumberedAuthorData']
+        # both authors are inserted at once :
+        eq_((authors.statements, authors.round_trips), (2, 1))
+        eq_(sorted(data.statements.load.keys()), 
+            ['NumberedAuthorData', 'NumberedBookData', 'NumberedReviewerData'])
+    finally:
+        data.teardown()
+    eq_(sorted(data.statements.unload.keys()), 
+        ['NumberedAuthorData', 'NumberedBookData', 'NumberedReviewerData'])
+    assert_empty(models)
+
+def assert_saved_authors(**kw):
+    saved = []
+    def saving(sender, instance, **kw):
+        saved.append(instance.first_name)
+    signals.pre_save.connect(saving, sender=models.Author)
+    assert_empty(models)
+    data = DjangoFixture(**kw).data(NumberedAuthorData)
+    try:
+        data.setup()
+        eq_(sorted(saved), ['Frank', 'Guido'])
+    finally:
+        signals.pre_save.disconnect(saving, sender=models.Author)
+        data.teardown()
+    assert_empty(models)
+
+def test_rows_are_saved_by_default():
+    assert_saved_authors()
+
+def test_rows_with_receivers_are_not_batched():
+    assert_saved_authors(batch_size=500)
+
+def test_sequence_is_reset_after_explicit_keys():
+    assert_empty(models)
+    reset = []
+    sequence_reset_sql = connection.ops.sequence_reset_sql
+    def record_reset(style, model_list):
+        reset.extend([m.__name__ for m in model_list])
+        return sequence_reset_sql(style, model_list)
+    connection.ops.sequence_reset_sql = record_reset
+    data = DjangoFixture(batch_size=500).data(NumberedBookData, AuthorData)
+    try:
+        data.setup()
+        eq_(sorted(reset), ['Author', 'Book'])
+    finally:
+        del connection.ops.sequence_reset_sql
+        data.teardown()
+    assert_empty(models)
+
+def test_generated_rows():
+    from django.contrib.sites.models import Site
+    from fixture.dataset import GeneratedDataSet, Sequence
+    from fixture.loadable.django_loadable import deletes_more
+    class GeneratedSiteData(GeneratedDataSet):
+        class Meta:
+            django_model = 'sites.Site'
+            rows = 30
+            chunk_size = 20
+            columns = dict(
+                id = Sequence(100),
+                domain = lambda n, random: "site%s.example.com" % n,
+                name = lambda n, random: "site %s" % n)
+    class GeneratedAuthorData(GeneratedDataSet):
+        class Meta:
+            django_model = 'app.Author'
+            rows = 30
+            chunk_size = 20
+            columns = dict(
+                id = Sequence(),
+                first_name = lambda n, random: "first %s" % n,
+                last_name = lambda n, random: "last %s" % n)
+    assert_empty(models)
+    sites = Site.objects.count()
+    data = DjangoFixture(count_statements=True).data(
+                                    GeneratedSiteData, GeneratedAuthorData)
+    try:
+        data.setup()
+        eq_(Site.objects.filter(id__gte=100).count(), 30)
+        eq_(models.Author.objects.count(), 30)
+    finally:
+        data.teardown()
+    eq_(Site.objects.count(), sites)
+    assert_empty(models)
+    # sites are deleted with one statement per chunk, authors through 
+    # their query sets since books refer to them :
+    assert not deletes_more(Site)
+    assert deletes_more(models.Author)
+    eq_(data.statements.unload['GeneratedSiteData'].statements, 2)
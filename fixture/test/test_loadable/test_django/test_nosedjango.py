@@ -0,0 +1,118 @@
+import os
+import sys
+import imp
+import tempfile
+from subprocess import Popen, PIPE
+from nose.tools import eq_
+from fixture import DataSet
+
+import fixture
+from fixture.examples import django_example
+
+# the plugin in src/ is not the nosedjango that is installed :
+NOSEDJANGO = os.path.join(os.path.dirname(os.path.dirname(fixture.__file__)), 
+                          'src', 'nosedjango-for-fixture', 'nosedjango', 
+                          'nosedjango.py')
+nosedjango = imp.load_source('nosedjango_for_fixture', NOSEDJANGO)
+
+def seed_data(author_last_name="Herbert"):
+    class SeedAuthorData(DataSet):
+        class Meta:
+            django_model = 'app.Author'
+        class frank_herbert:
+            first_name = "Frank"
+            last_name = author_last_name
+    class SeedBookData(DataSet):
+        class Meta:
+            django_model = 'app.Book'
+        class dune:
+            title = "Dune"
+            author = SeedAuthorData.frank_herbert
+    return SeedBookData
+
+SeedBookData = seed_data()
+
+def test_env_flag():
+    for value in ('1', 'true', 'Yes', 'on'):
+        eq_(nosedjango.env_flag(value), True)
+    for value in (None, '', '0', 'false', 'no', 'off'):
+        eq_(nosedjango.env_flag(value), False)
+
+def test_schema_hash_covers_seeded_rows():
+    global SeedBookData
+    name = '%s.SeedBookData' % __name__
+    seeded = nosedjango.schema_hash([name])
+    eq_(nosedjango.schema_hash([name]), seeded)
+    assert nosedjango.schema_hash() != seeded
+    # a row of the DataSet that SeedBookData references is edited :
+    SeedBookData = seed_data("Herbert Jr.")
+    try:
+        assert nosedjango.schema_hash([name]) != seeded
+    finally:
+        SeedBookData = seed_data()
+    eq_(nosedjango.schema_hash([name]), seeded)
+
+# a test run that reuses the database; it prints the authors and reviewers 
+# it finds, then commits rows like a test might :
+REUSE_RUN = """
+import sys, imp
+from django.conf import settings
+settings.TEST_DATABASE_NAME = sys.argv[1]
+nosedjango = imp.load_source('nosedjango_for_fixture', sys.argv[2])
+from django.db import connection, transaction
+from fixture.examples.django_example.app import models
+
+class Options(object):
+    django_reuse_db = True
+    django_seed_data = sys.argv[3]
+
+plugin = nosedjango.NoseDjango()
+plugin.options = Options()
+plugin.verbosity = 0
+plugin.old_db = settings.DATABASE_NAME
+plugin.reused_db = False
+plugin.reuse_test_db()
+assert plugin.reused_db
+print ' '.join(sorted([a.first_name for a in models.Author.objects.all()])), 
+print models.Reviewer.objects.count()
+models.Author.objects.create(first_name='Guido', last_name='Van rossum')
+models.Reviewer.objects.create(name='ben')
+transaction.commit_unless_managed()
+connection.close()
+"""
+
+class TestReuseDB(object):
+    
+    def setUp(self):
+        fd, self.db_file = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        os.remove(self.db_file)
+    
+    def tearDown(self):
+        if os.path.exists(self.db_file):
+            os.remove(self.db_file)
+    
+    def run(self, seed_data):
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = (
+                                'fixture.examples.django_example.settings')
+        env['PYTHONPATH'] = os.pathsep.join([
+                        os.path.dirname(os.path.dirname(fixture.__file__)), 
+                        os.path.dirname(django_example.__file__), 
+                        os.path.dirname(__file__)])
+        proc = Popen([sys.executable, '-c', REUSE_RUN, self.db_file, 
+                      NOSEDJANGO, seed_data], 
+                     env=env, stdout=PIPE, stderr=PIPE)
+        stdout, stderr = proc.communicate()
+        eq_(proc.returncode, 0, stderr)
+        return stdout.strip()
+    
+    def test_reuse(self):
+        # a new database is seeded :
+        eq_(self.run('fixtures.BookData'), 'Frank Guido 0')
+        # the hash matches so the database is reused; the author committed 
+        # by the last run is still there but the reviewer was flushed :
+        eq_(self.run('fixtures.BookData'), 
+            'Frank Guido Guido 0')
+        # other seed data, so the database is created again :
+        eq_(self.run('fixtures.AuthorData'), 'Frank Guido 0')
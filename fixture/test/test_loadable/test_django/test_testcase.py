@@ -0,0 +1,101 @@
+import unittest
+from django.db import connection, transaction
+from django.test import testcases
+from nose.exc import SkipTest
+from nose.tools import eq_
+from fixture import DjangoFixture
+from fixture import django_testcase
+from fixture.django_testcase import FixtureTestCase
+
+from fixture.examples.django_example.app import models
+from fixtures import *
+from util import *
+
+def class_data_cases(name, savepoints_work=None):
+    """returns a FixtureTestCase class with class_data whose tests each 
+    delete an author and record the authors they found in its seen list"""
+    class ClassDataCase(FixtureTestCase):
+        fixture = DjangoFixture()
+        datasets = [AuthorData]
+        class_data = True
+        seen = []
+        
+        def delete_author(self):
+            self.seen.append(models.Author.objects.count())
+            models.Author.objects.all()[0].delete()
+        
+        def test_one(self):
+            self.delete_author()
+        
+        def test_two(self):
+            self.delete_author()
+    
+    ClassDataCase.__name__ = name
+    if savepoints_work is not None:
+        ClassDataCase._savepoints_work = savepoints_work
+    return ClassDataCase
+
+def run(cls, class_fixtures=True):
+    """runs the tests of cls, in a suite that calls tearDownClass() unless 
+    class_fixtures is False"""
+    result = unittest.TestResult()
+    suite = unittest.makeSuite(cls)
+    if class_fixtures:
+        suite.run(result)
+    else:
+        for test in suite:
+            test(result)
+    eq_([str(e[1]) for e in result.errors + result.failures], [])
+    return result
+
+class TestClassData(object):
+    
+    def setUp(self):
+        self.savepoint = transaction.savepoint
+        self.savepoint_rollback = testcases.real_savepoint_rollback
+        self.created = []
+        self.rolled_back = []
+        def savepoint():
+            self.created.append('s%s' % len(self.created))
+            return self.created[-1]
+        transaction.savepoint = savepoint
+        testcases.real_savepoint_rollback = self.rolled_back.append
+    
+    def tearDown(self):
+        transaction.savepoint = self.savepoint
+        testcases.real_savepoint_rollback = self.savepoint_rollback
+        assert_empty(models)
+    
+    def test_each_test_is_rolled_back_to_its_savepoint(self):
+        ClassDataCase = class_data_cases('ClassDataCase', 
+                                         savepoints_work=True)
+        run(ClassDataCase)
+        eq_(self.created, ['s0', 's1'])
+        eq_(self.rolled_back, ['s0', 's1'])
+        eq_(ClassDataCase.__dict__['_class_fixture_data'], None)
+        eq_(django_testcase._class_with_data, None)
+    
+    def test_next_class_rolls_back_the_class_transaction(self):
+        # like a runner that never calls tearDownClass() :
+        OneCase = class_data_cases('OneCase', savepoints_work=True)
+        OtherCase = class_data_cases('OtherCase', savepoints_work=True)
+        try:
+            run(OneCase, class_fixtures=False)
+            eq_(django_testcase._class_with_data, OneCase)
+            run(OtherCase, class_fixtures=False)
+            eq_(OneCase.__dict__['_class_fixture_data'], None)
+            eq_(django_testcase._class_with_data, OtherCase)
+            # both classes found all authors when they started :
+            eq_(OneCase.seen[0], OtherCase.seen[0])
+        finally:
+            OtherCase.tearDownClass()
+        eq_(django_testcase._class_with_data, None)
+
+def test_savepoints_roll_back_each_test():
+    if not connection.features.uses_savepoints:
+        raise SkipTest("the database has no savepoints")
+    ClassDataCase = class_data_cases('SavepointCase')
+    run(ClassDataCase)
+    # each test found the authors the other deleted :
+    eq_(ClassDataCase.seen, [2, 2])
+    assert_empty(models)
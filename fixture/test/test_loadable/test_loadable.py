@@ -288,6 +288,72 @@ class TestEnvLoadableFixture(object):
         efixture = SomeEnvLoadableFixture(env={'MyDataSet': MyDataSet})
         data = efixture.data(MyDataSet)
         data.setup()
+    
+    @attr(unit=True)
+    def test_storage_media_are_remembered(self):
+        lookups = []
+        class CountingEnv(dict):
+            def get(self, name, default=None):
+                lookups.append(name)
+                return dict.get(self, name, default)
+        class Thing(object):
+            pass
+        class ThingData(DataSet):
+            class one:
+                name = 'one'
+        
+        efixture = EnvLoadableFixture(
+                        env=CountingEnv(Thing=Thing), style=NamedDataStyle())
+        for i in range(3):
+            ds = ThingData()
+            efixture.attach_storage_medium(ds)
+            eq_(ds.meta.storage_medium.medium, Thing)
+            eq_(ds.meta.storable_name, 'Thing')
+        eq_(lookups, ['Thing'])
+        
+        # replacing env forgets them :
+        efixture.env = CountingEnv(Thing=Thing)
+        efixture.attach_storage_medium(ThingData())
+        eq_(lookups, ['Thing', 'Thing'])
+        
+        # so does replacing Medium or medium_factory :
+        class OtherMedium(EnvLoadableFixture.StorageMediumAdapter):
+            pass
+        efixture.Medium = OtherMedium
+        ds = ThingData()
+        efixture.attach_storage_medium(ds)
+        eq_(type(ds.meta.storage_medium), OtherMedium)
+        def medium_factory(storable):
+            return EnvLoadableFixture.StorageMediumAdapter
+        efixture.medium_factory = medium_factory
+        ds = ThingData()
+        efixture.attach_storage_medium(ds)
+        eq_(type(ds.meta.storage_medium), 
+                        EnvLoadableFixture.StorageMediumAdapter)
+        eq_(lookups, ['Thing', 'Thing', 'Thing', 'Thing'])
+
+@attr(unit=True)
+def test_chained_style_is_remembered():
+    from fixture.style import TrimmedNameStyle, PaddedNameStyle
+    style = TrimmedNameStyle(suffix='Data') + PaddedNameStyle(prefix='tbl_')
+    assert style.guess_storable_name is style.guess_storable_name
+    eq_(style.guess_storable_name('EmployeeData'), 'tbl_Employee')
+    eq_(style.guess_storable_name('BookData'), 'tbl_Book')
+
+class DescribedValue(object):
+    def __init__(self, name):
+        self.name = name
+
+@attr(unit=True)
+def test_describe_value_without_address():
+    from fixture.loadable.loadable import describe_value
+    eq_(describe_value(DescribedValue('cars')), 
+        "<%s.DescribedValue {'name': 'cars'}>" % DescribedValue.__module__)
+    eq_(describe_value([DescribedValue('cars'), {'b': 2, 'a': 1}]), 
+        describe_value([DescribedValue('cars'), {'a': 1, 'b': 2}]))
+    eq_(describe_value(test_chained_style_is_remembered), 
+        "<function %s.test_chained_style_is_remembered>" % __name__)
+    eq_(describe_value(u'cars'), "u'cars'")
         
 class StubLoadableFixture(DBLoadableFixture):
     def create_transaction(self):
@@ -431,4 +497,46 @@ class TestDBLoadableRowReferences(object):
             ldr.loaded[PersonData].meta._stored_objects.get_object('bob')
         jenny_db_obj = \
             ldr.loaded[PersonData].meta._stored_objects.get_object('jenny')
-        eq_(jenny_db_obj.friend, bob_db_obj)
\ No newline at end of file
+        eq_(jenny_db_obj.friend, bob_db_obj)
+
+
+class TestLoadableFixtureDataSetRegistry(object):
+    @attr(unit=True)
+    def test_fixture_keeps_shared_instances_in_its_own_registry(self):
+        from fixture.dataset import dataset_registry
+        from fixture.util import ObjRegistry
+        class MockDataObject(object):
+            def save(self):
+                pass
+        class Person(MockDataObject):
+            name = None
+        class PersonData(DataSet):
+            class bob:
+                name = "Bob B. Chillingsworth"
+        class ClearableStorageMedium(MockStorageMedium):
+            def clear(self, obj):
+                pass
+        
+        registry = ObjRegistry()
+        ldr = StubLoadableFixture(
+            style=NamedDataStyle(), medium=ClearableStorageMedium, 
+            env=locals(), dataset_registry=registry)
+        data = ldr.data(PersonData)
+        data.setup()
+        assert PersonData in registry
+        assert PersonData not in dataset_registry
+        eq_(data.PersonData.bob.name, "Bob B. Chillingsworth")
+        
+        shared = PersonData.shared_instance()
+        dataset_registry.push(registry)
+        try:
+            assert PersonData.shared_instance() is data.PersonData
+        finally:
+            dataset_registry.pop()
+        assert shared is not data.PersonData
+        
+        data.teardown()
+        assert PersonData not in registry
+        # only the fixture's registry was cleared :
+        assert dataset_registry[PersonData] is shared
+        dataset_registry.clear()
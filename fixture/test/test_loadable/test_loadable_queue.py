@@ -4,8 +4,58 @@ import unittest
 from fixture.util import start_debug, stop_debug
 from fixture import DataSet
 from fixture.loadable import EnvLoadableFixture
+from fixture.loadable.loadable import LoadQueue
 import datetime
 
+class TestLoadQueue(unittest.TestCase):
+    def setUp(self):
+        class One(object): pass
+        class Two(object): pass
+        class Three(object): pass
+        self.one, self.two, self.three = One(), Two(), Three()
+        self.queue = LoadQueue()
+    
+    def test_unload_order_by_level(self):
+        self.queue.register(self.two, 2)
+        self.queue.register(self.one, 1)
+        self.queue.register(self.three, 3)
+        self.assertEqual(self.queue.unload_order(), 
+                            [self.one, self.two, self.three])
+        self.assertEqual(list(self.queue.to_unload()), 
+                            [self.one, self.two, self.three])
+    
+    def test_referenced_at_higher_level_moves_object(self):
+        self.queue.register(self.one, 1)
+        self.queue.register(self.two, 2)
+        self.queue.register(self.three, 2)
+        self.queue.referenced(self.two, 3)
+        self.assertEqual(self.queue.levels(), [
+                            (1, [self.one]), 
+                            (2, [self.three]), 
+                            (3, [self.two])])
+    
+    def test_referenced_at_lower_level_is_ignored(self):
+        self.queue.register(self.one, 3)
+        self.queue.register(self.two, 3)
+        self.queue.referenced(self.one, 1)
+        self.queue.referenced(self.one, 3)
+        self.assertEqual(self.queue.levels(), [(3, [self.one, self.two])])
+    
+    def test_objects_keep_push_order_within_a_level(self):
+        self.queue.register(self.one, 1)
+        self.queue.register(self.two, 2)
+        self.queue.register(self.three, 3)
+        self.queue.referenced(self.one, 3)
+        self.assertEqual(self.queue.levels(), [
+                            (2, [self.two]), 
+                            (3, [self.three, self.one])])
+    
+    def test_clear(self):
+        self.queue.register(self.one, 1)
+        self.queue.clear()
+        self.assertEqual(self.queue.levels(), [])
+        assert self.one not in self.queue
+
 class TestComplexLoadQueue(unittest.TestCase):
     def setUp(self):
         start_debug("fixture.loadable.tree")
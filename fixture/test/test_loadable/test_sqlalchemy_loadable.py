@@ -1,3 +1,4 @@
+import os
 
 import unittest
 from nose.tools import eq_, raises
@@ -596,3 +597,412 @@ def test_SQLAlchemyFixture_configured_with_bound_session_and_conn():
 #     import psycopg2.extensions
 #     self.conn.connection.connection.set_isolation_level(
 #             psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+
+class KeptCategoryData(DataSet):
+    class cars:
+        name = 'cars'
+    class free_stuff:
+        name = 'get free stuff'
+
+class TestKeepData(object):
+    
+    def setUp(self):
+        engine = create_engine(conf.LITE_DSN)
+        metadata.bind = engine
+        metadata.create_all()
+        Session = get_transactional_session()
+        self.session = Session()
+        clear_mappers()
+        mapper(Category, categories)
+    
+    def tearDown(self):
+        metadata.drop_all()
+        self.session.close()
+        metadata.bind.dispose()
+    
+    def categories(self):
+        self.session.clear()
+        rows = self.session.execute(categories.select()).fetchall()
+        return dict([(row.name, row.id) for row in rows])
+    
+    def assert_kept(self, storable):
+        fixture = SQLAlchemyFixture(
+            env={'KeptCategoryData': storable}, 
+            engine=metadata.bind, keep_data=True, count_statements=True)
+        data = fixture.data(KeptCategoryData)
+        data.setup()
+        ids = self.categories()
+        eq_(sorted(ids.keys()), ['cars', 'get free stuff'])
+        data.teardown()
+        eq_(self.categories(), ids)
+        
+        # unchanged, so nothing is saved again and the rows are fetched 
+        # with one statement :
+        data = fixture.data(KeptCategoryData)
+        data.setup()
+        eq_(data.KeptCategoryData.cars.id, ids['cars'])
+        eq_(data.KeptCategoryData.free_stuff.id, ids['get free stuff'])
+        eq_(data.statements.load['KeptCategoryData'].statements, 2)
+        eq_(self.categories(), ids)
+        data.teardown()
+        
+        # only the row that changed is updated :
+        data = fixture.data(self.edited(cars='fast cars', 
+                                        free_stuff='get free stuff'))
+        data.setup()
+        eq_(self.categories(), {'fast cars': ids['cars'], 
+                                'get free stuff': ids['get free stuff']})
+        # the fingerprints, the fetch, the update and the new fingerprints :
+        eq_(data.statements.load['KeptCategoryData'].statements, 4)
+        data.teardown()
+        
+        data = fixture.data(self.edited(cars='fast cars', boats='boats'))
+        data.setup()
+        changed = self.categories()
+        eq_(sorted(changed.keys()), ['boats', 'fast cars'])
+        eq_(changed['fast cars'], ids['cars'])
+        data.teardown()
+    
+    def edited(self, **names):
+        """returns a DataSet of categories with these names by key that 
+        passes for an edited KeptCategoryData"""
+        rows = {}
+        for key, name in names.items():
+            rows[key] = type(key, (object,), {'name': name})
+        edited = type('KeptCategoryData', (DataSet,), rows)
+        edited.__module__ = KeptCategoryData.__module__
+        return edited
+    
+    @attr(functional=1)
+    def test_mapped_class(self):
+        self.assert_kept(Category)
+    
+    @attr(functional=1)
+    def test_table(self):
+        self.assert_kept(categories)
+
+class ReleasedCategoryData(DataSet):
+    class cars:
+        name = 'cars'
+
+class ReleasedProductData(DataSet):
+    class truck:
+        name = 'truck'
+        category_id = ReleasedCategoryData.cars.ref('id')
+
+class TestStrictRelease(object):
+    
+    def setUp(self):
+        engine = create_engine(conf.LITE_DSN)
+        metadata.bind = engine
+        metadata.create_all()
+        clear_mappers()
+        mapper(Category, categories)
+        mapper(Product, products)
+        self.env = {'ReleasedCategoryData': Category, 
+                    'ReleasedProductData': Product}
+        # forget data leaked by other tests :
+        ReleasedCategoryData.cars.ref.dataset_obj = None
+    
+    def tearDown(self):
+        metadata.drop_all()
+        metadata.bind.dispose()
+    
+    def load(self, **kw):
+        fixture = SQLAlchemyFixture(env=self.env, engine=metadata.bind, 
+                                    track_memory=True, **kw)
+        data = fixture.data(ReleasedProductData)
+        data.setup()
+        eq_(data.memory.loaded().get(
+                    '%s.ReleasedCategoryData' % __name__), 1)
+        data.teardown()
+        return fixture, data
+    
+    @attr(functional=1)
+    def test_refs_are_kept_by_default(self):
+        fixture, data = self.load()
+        ref = ReleasedCategoryData.cars.ref
+        assert ref.dataset_obj is not None
+        assert fixture.session is not None
+        eq_(sorted(data.memory.retained_datasets().keys()), 
+            ['ReleasedCategoryData', 'ReleasedProductData'])
+        assert 'loaded by setup:' in str(data.memory)
+    
+    @attr(functional=1)
+    def test_strict_release(self):
+        fixture, data = self.load(strict_release=True)
+        ref = ReleasedCategoryData.cars.ref
+        eq_(ref.dataset_obj, None)
+        eq_(data.data, None)
+        eq_(fixture.session, None)
+        eq_(fixture.connection, None)
+        eq_(data.memory.retained_datasets(), {})
+        eq_(data.memory.retained().get(
+                    '%s.ReleasedCategoryData' % __name__), None)
+        
+        # can load again :
+        data = fixture.data(ReleasedProductData)
+        data.setup()
+        eq_(data.ReleasedProductData.truck.category_id, 
+            data.ReleasedCategoryData.cars.id)
+        data.teardown()
+
+class TestGeneratedData(object):
+    
+    def setUp(self):
+        from fixture.dataset import GeneratedDataSet, Sequence, Pick
+        engine = create_engine(conf.LITE_DSN)
+        metadata.bind = engine
+        metadata.create_all()
+        clear_mappers()
+        mapper(Category, categories)
+        mapper(Product, products)
+        
+        class GeneratedCategoryData(GeneratedDataSet):
+            class Meta:
+                rows = 50
+                chunk_size = 20
+                columns = dict(
+                    id = Sequence(),
+                    name = lambda n, random: "category %s" % n)
+        class GeneratedProductData(GeneratedDataSet):
+            class Meta:
+                rows = 120
+                chunk_size = 25
+                columns = dict(
+                    id = Sequence(),
+                    name = lambda n, random: "product %s" % n,
+                    category_id = Pick(GeneratedCategoryData))
+        self.GeneratedProductData = GeneratedProductData
+    
+    def tearDown(self):
+        metadata.drop_all()
+        metadata.bind.dispose()
+    
+    def count(self, table):
+        return metadata.bind.execute(table.count()).fetchone()[0]
+    
+    def assert_loaded(self, env):
+        fixture = SQLAlchemyFixture(env=env, engine=metadata.bind, 
+                                    count_statements=True)
+        data = fixture.data(self.GeneratedProductData)
+        data.setup()
+        eq_(self.count(categories), 50)
+        eq_(self.count(products), 120)
+        expected = list(self.GeneratedProductData().generate())
+        rows = metadata.bind.execute(
+                    products.select(order_by=[products.c.id])).fetchall()
+        eq_([(r.id, r.name, r.category_id) for r in rows], 
+            [(r['id'], r['name'], r['category_id']) for r in expected])
+        data.teardown()
+        eq_(self.count(categories), 0)
+        eq_(self.count(products), 0)
+        # one delete per chunk :
+        eq_(data.statements.unload['GeneratedCategoryData'].statements, 3)
+        eq_(data.statements.unload['GeneratedProductData'].statements, 5)
+    
+    @attr(functional=1)
+    def test_tables(self):
+        self.assert_loaded({'GeneratedCategoryData': categories, 
+                            'GeneratedProductData': products})
+    
+    @attr(functional=1)
+    def test_mapped_classes(self):
+        self.assert_loaded({'GeneratedCategoryData': Category, 
+                            'GeneratedProductData': Product})
+
+class CountedCategoryData(DataSet):
+    class cars:
+        name = 'cars'
+    class free_stuff:
+        name = 'get free stuff'
+
+class CountedProductData(DataSet):
+    class truck:
+        name = 'truck'
+        category_id = CountedCategoryData.cars.ref('id')
+
+class TestStatementCounting(object):
+    
+    def setUp(self):
+        engine = create_engine(conf.LITE_DSN)
+        metadata.bind = engine
+        metadata.create_all()
+        clear_mappers()
+        mapper(Category, categories)
+        mapper(Product, products)
+    
+    def tearDown(self):
+        metadata.drop_all()
+        metadata.bind.dispose()
+    
+    def count(self, table):
+        return metadata.bind.execute(table.count()).fetchone()[0]
+    
+    def assert_counted(self, env, product_statements):
+        fixture = SQLAlchemyFixture(env=env, engine=metadata.bind, 
+                                    count_statements=True)
+        data = fixture.data(CountedProductData)
+        data.setup()
+        counts = data.statements
+        eq_(sorted(counts.load.keys()), 
+            ['CountedCategoryData', 'CountedProductData'])
+        eq_(counts.load['CountedCategoryData'].statements, 2)
+        eq_(counts.load['CountedProductData'].statements, product_statements)
+        eq_(counts.total('load'), 2 + product_statements)
+        eq_(counts.unload, {})
+        data.teardown()
+        eq_(counts.unload['CountedCategoryData'].statements, 2)
+        eq_(counts.unload['CountedProductData'].statements, 1)
+        eq_(self.count(categories), 0)
+    
+    @attr(functional=1)
+    def test_tables(self):
+        # the stored category is selected to get its id :
+        self.assert_counted({'CountedCategoryData': categories, 
+                             'CountedProductData': products}, 2)
+    
+    @attr(functional=1)
+    def test_mapped_classes(self):
+        self.assert_counted({'CountedCategoryData': Category, 
+                             'CountedProductData': Product}, 1)
+    
+    @attr(functional=1)
+    def test_not_counted_by_default(self):
+        fixture = SQLAlchemyFixture(env={'CountedCategoryData': categories}, 
+                                    engine=metadata.bind)
+        data = fixture.data(CountedCategoryData)
+        data.setup()
+        eq_(data.statements, None)
+        data.teardown()
+    
+    @attr(functional=1)
+    def test_query_budget(self):
+        fixture = SQLAlchemyFixture(
+                    env={'CountedCategoryData': categories, 
+                         'CountedProductData': products}, 
+                    engine=metadata.bind, 
+                    query_budget={'CountedCategoryData': 2})
+        data = fixture.data(CountedProductData)
+        data.setup()
+        eq_(data.statements.load['CountedCategoryData'].statements, 2)
+        data.teardown()
+    
+    @attr(functional=1)
+    def test_query_budget_exceeded(self):
+        from fixture.exc import QueryBudgetExceeded
+        fixture = SQLAlchemyFixture(env={'CountedCategoryData': categories}, 
+                                    engine=metadata.bind, query_budget=1)
+        data = fixture.data(CountedCategoryData)
+        try:
+            data.setup()
+        except QueryBudgetExceeded, e:
+            eq_(str(e), "CountedCategoryData made 2 statements to load "
+                        "(budget: 1)")
+        else:
+            assert False, "expected QueryBudgetExceeded"
+        # the load was rolled back :
+        eq_(self.count(categories), 0)
+        # unloading is over budget too, but it is done :
+        try:
+            data.teardown()
+        except QueryBudgetExceeded, e:
+            eq_(str(e), "CountedCategoryData made 2 statements to unload "
+                        "(budget: 1)")
+        else:
+            assert False, "expected QueryBudgetExceeded"
+        eq_(fixture.loaded.unload_order(), [])
+    
+    @attr(functional=1)
+    def test_query_budget_of_unknown_dataset(self):
+        fixture = SQLAlchemyFixture(env={'CountedCategoryData': categories}, 
+                                    engine=metadata.bind, 
+                                    query_budget={'CountedCategory': 2})
+        data = fixture.data(CountedCategoryData)
+        try:
+            data.setup()
+        except ValueError, e:
+            eq_(str(e), "query_budget names DataSets that were not loaded: "
+                        "CountedCategory")
+        else:
+            assert False, "expected ValueError"
+        eq_(self.count(categories), 0)
+        data.teardown()
+    
+    @attr(unit=1)
+    def test_statement_hook_needs_cursor_methods(self):
+        import fixture.loadable.sqlalchemy_loadable as sa_loadable
+        from sqlalchemy.engine.base import Connection
+        installed = sa_loadable._statement_hook_installed
+        cursor_executemany = Connection.__dict__['_cursor_executemany']
+        sa_loadable._statement_hook_installed = False
+        del Connection._cursor_executemany
+        try:
+            try:
+                sa_loadable.install_statement_hook()
+            except NotImplementedError:
+                pass
+            else:
+                assert False, "expected NotImplementedError"
+        finally:
+            Connection._cursor_executemany = cursor_executemany
+            sa_loadable._statement_hook_installed = installed
+
+class ParallelCategoryData(DataSet):
+    class cars:
+        name = 'cars'
+
+class ParallelProductData(DataSet):
+    class truck:
+        name = 'truck'
+        category_id = ParallelCategoryData.cars.ref('id')
+
+class TestSetupAll(object):
+    
+    def setUp(self):
+        import tempfile
+        from fixture.util import ObjRegistry
+        self.files = []
+        self.engines = []
+        self.fixtures = []
+        for i in range(2):
+            fd, db_file = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            self.files.append(db_file)
+            # SQLite connections only work on the thread that made them :
+            engine = create_engine('sqlite:///%s' % db_file)
+            metadata.create_all(bind=engine)
+            self.engines.append(engine)
+            self.fixtures.append(SQLAlchemyFixture(
+                        env={'ParallelCategoryData': categories, 
+                             'ParallelProductData': products}, 
+                        engine=engine, dataset_registry=ObjRegistry()))
+        # so that the category of the second database gets another id :
+        for i in range(5):
+            self.engines[1].execute(categories.insert(), name='old %s' % i)
+    
+    def tearDown(self):
+        for engine in self.engines:
+            metadata.drop_all(bind=engine)
+            engine.dispose()
+        for db_file in self.files:
+            os.remove(db_file)
+    
+    def category_ids(self, engine):
+        return [r.category_id for r in engine.execute(products.select())]
+    
+    @attr(functional=1)
+    def test_each_loader_resolves_its_own_refs(self):
+        from fixture.base import setup_all, teardown_all
+        data = [f.data(ParallelProductData) for f in self.fixtures]
+        setup_all(*data)
+        try:
+            eq_(self.category_ids(self.engines[0]), [1])
+            eq_(self.category_ids(self.engines[1]), [6])
+            eq_(data[0].ParallelProductData.truck.category_id, 1)
+            eq_(data[1].ParallelProductData.truck.category_id, 6)
+        finally:
+            teardown_all(*data)
+        for engine in self.engines:
+            eq_(self.category_ids(engine), [])
+        eq_(engine.execute(categories.count()).fetchone()[0], 5)
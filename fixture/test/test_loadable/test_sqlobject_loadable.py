@@ -138,4 +138,158 @@ class TestSQLObjectFixtureCascadeAsRefInheritWithHeavyDB(
         HavingRefInheritedOfferProduct, SQLObjectFixtureCascadeTestWithHeavyDB, 
         LoadableTest):
     pass
-            
\ No newline at end of file
+            
+class SQLObjectBulkCascadeTest(SQLObjectFixtureCascadeTest):
+    fixture = SQLObjectFixture(
+                        style=( NamedDataStyle() + CamelAndUndersStyle()),
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=False, bulk=True, batch_size=1,
+                        dataclass=MergedSuperSet )
+
+class TestSQLObjectBulkCascade(
+        HavingOfferProductData, SQLObjectBulkCascadeTest, LoadableTest):
+    pass
+class TestSQLObjectBulkCascadeAsRef(
+        HavingReferencedOfferProduct, SQLObjectBulkCascadeTest, 
+        LoadableTest):
+    pass
+
+class SQLObjectMultiRowBulkCascadeTest(SQLObjectFixtureCascadeTest):
+    # more than one row waits for each INSERT :
+    fixture = SQLObjectFixture(
+                        style=( NamedDataStyle() + CamelAndUndersStyle()),
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=False, bulk=True, batch_size=2,
+                        dataclass=MergedSuperSet )
+
+class TestSQLObjectMultiRowBulkCascade(
+        HavingOfferProductData, SQLObjectMultiRowBulkCascadeTest, 
+        LoadableTest):
+    pass
+class TestSQLObjectMultiRowBulkCascadeAsRef(
+        HavingReferencedOfferProduct, SQLObjectMultiRowBulkCascadeTest, 
+        LoadableTest):
+    pass
+
+class TestSQLObjectBulk(SQLObjectFixtureTest):
+    fixture = SQLObjectFixture(
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=False, bulk=True)
+    
+    def test_rows_with_ids_are_lazy(self):
+        from fixture.loadable.sqlobject_loadable import LazySQLObject
+        class CategoryData(DataSet):
+            class Meta:
+                storable = Category
+            class cars:
+                id = 1
+                name = 'cars'
+            class no_id:
+                name = 'no id'
+        class ProductData(DataSet):
+            class Meta:
+                storable = Product
+            class truck:
+                id = 1
+                name = 'truck'
+                category = CategoryData.cars
+        data = self.fixture.data(ProductData)
+        data.setup()
+        try:
+            truck = data.ProductData.meta._stored_objects.get_object('truck')
+            assert isinstance(truck, LazySQLObject), truck
+            eq_(truck.name, 'truck')
+            eq_(Product.get(1).category.name, 'cars')
+            eq_(Category.select(Category.q.name=='no id').count(), 1)
+        finally:
+            data.teardown()
+        eq_(Category.select().count(), 0)
+        eq_(Product.select().count(), 0)
+    
+    def test_statements_are_counted(self):
+        class CategoryData(DataSet):
+            class Meta:
+                storable = Category
+            class cars:
+                id = 1
+                name = 'cars'
+            class free_stuff:
+                id = 2
+                name = 'get free stuff'
+        fixture = SQLObjectFixture(
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=False, bulk=True, 
+                        count_statements=True)
+        data = fixture.data(CategoryData)
+        data.setup()
+        try:
+            # both rows are inserted with one statement :
+            eq_(data.statements.load['CategoryData'].statements, 1)
+        finally:
+            data.teardown()
+        # each lazy row is deleted by id, without fetching it :
+        eq_(data.statements.unload['CategoryData'].statements, 2)
+        eq_(Category.select().count(), 0)
+
+class TestSQLObjectGeneratedData(SQLObjectFixtureTest):
+    
+    def datasets(self):
+        from fixture.dataset import GeneratedDataSet, Sequence, Pick
+        class GeneratedCategoryData(GeneratedDataSet):
+            class Meta:
+                storable = Category
+                rows = 50
+                chunk_size = 20
+                columns = dict(
+                    id = Sequence(),
+                    name = lambda n, random: "category %s" % n)
+        class GeneratedProductData(GeneratedDataSet):
+            class Meta:
+                storable = Product
+                rows = 60
+                chunk_size = 25
+                columns = dict(
+                    id = Sequence(),
+                    name = lambda n, random: "product %s" % n,
+                    category = Pick(GeneratedCategoryData))
+        return GeneratedProductData
+    
+    def assert_loaded(self, fixture):
+        GeneratedProductData = self.datasets()
+        data = fixture.data(GeneratedProductData)
+        data.setup()
+        try:
+            eq_(Category.select().count(), 50)
+            eq_(Product.select().count(), 60)
+            expected = list(GeneratedProductData().generate())
+            eq_([(p.id, p.name, p.categoryID) for p in 
+                    Product.select(orderBy=Product.q.id)], 
+                [(r['id'], r['name'], r['category']) for r in expected])
+        finally:
+            data.teardown()
+        eq_(Category.select().count(), 0)
+        eq_(Product.select().count(), 0)
+        return data
+    
+    def test_rows_are_saved_and_deleted(self):
+        data = self.assert_loaded(SQLObjectFixture(
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=False, count_statements=True))
+        # one delete per chunk :
+        eq_(data.statements.unload['GeneratedProductData'].statements, 3)
+    
+    def test_rows_are_saved_in_bulk(self):
+        data = self.assert_loaded(SQLObjectFixture(
+                        dsn=conf.LITE_DSN, env=globals(), 
+                        use_transaction=False, bulk=True, batch_size=10, 
+                        count_statements=True))
+        eq_(data.statements.load['GeneratedProductData'].statements, 7)
+    
+    def test_instances_are_not_cached(self):
+        data = self.fixture.data(self.datasets())
+        data.setup()
+        try:
+            eq_([self.conn.cache.tryGet(i, Product) for i in range(1, 61)], 
+                [None] * 60)
+        finally:
+            data.teardown()
@@ -149,3 +149,65 @@ class TestStormFixtureCascadeAsRefInheritWithHeavyDB(
         LoadableTest):
     pass
             
+
+class TestStormStatementCounting(StormFixtureTest):
+    fixture = StormFixture(
+                        style=( NamedDataStyle() + CamelAndUndersStyle()),
+                        env=globals(), use_transaction=True, 
+                        count_statements=True)
+    
+    def test_statements_are_counted(self):
+        class CategoryData(DataSet):
+            class gray_stuff:
+                id=1
+                name='gray'
+            class yellow_stuff:
+                id=2
+                name='yellow'
+        data = self.fixture.data(CategoryData)
+        data.setup()
+        try:
+            # each row is looked up by its primary key, then inserted :
+            eq_(data.statements.load['CategoryData'].statements, 4)
+        finally:
+            data.teardown()
+        eq_(data.statements.unload['CategoryData'].statements, 2)
+
+
+class TestStormGeneratedData(StormFixtureTest):
+    fixture = StormFixture(env=globals(), use_transaction=True, 
+                           count_statements=True)
+    
+    def test_rows_are_saved_and_deleted(self):
+        from fixture.dataset import GeneratedDataSet, Sequence, Pick
+        class GeneratedCategoryData(GeneratedDataSet):
+            class Meta:
+                storable = Category
+                rows = 50
+                chunk_size = 20
+                columns = dict(
+                    id = Sequence(),
+                    name = lambda n, random: "category %s" % n)
+        class GeneratedProductData(GeneratedDataSet):
+            class Meta:
+                storable = Product
+                rows = 60
+                chunk_size = 25
+                columns = dict(
+                    id = Sequence(),
+                    name = lambda n, random: "product %s" % n,
+                    category_id = Pick(GeneratedCategoryData))
+        data = self.fixture.data(GeneratedProductData)
+        data.setup()
+        try:
+            eq_(self.store.find(Category).count(), 50)
+            expected = list(GeneratedProductData().generate())
+            eq_([(p.id, p.name, p.category_id) for p in 
+                    self.store.find(Product).order_by(Product.id)], 
+                [(r['id'], r['name'], r['category_id']) for r in expected])
+        finally:
+            data.teardown()
+        eq_(self.store.find(Category).count(), 0)
+        eq_(self.store.find(Product).count(), 0)
+        # one delete per chunk :
+        eq_(data.statements.unload['GeneratedProductData'].statements, 3)
@@ -0,0 +1,90 @@
+
+import threading
+from nose.tools import eq_, raises
+from fixture import DataSet
+from fixture.util import ObjRegistry, ScopedRegistry
+
+class RegisteredData(DataSet):
+    class foo:
+        name = "foo"
+
+class NewStyle(object):
+    pass
+
+class Classic:
+    pass
+
+class TestObjRegistry:
+    def setUp(self):
+        self.registry = ObjRegistry()
+    
+    def test_dataset_instance_and_class_share_a_key(self):
+        ds = RegisteredData()
+        key = self.registry.register(ds)
+        eq_(key, RegisteredData)
+        assert RegisteredData in self.registry
+        assert self.registry[RegisteredData] is ds
+        assert self.registry[RegisteredData()] is ds
+    
+    def test_new_style_objects(self):
+        obj = NewStyle()
+        eq_(self.registry.key(obj), NewStyle)
+        eq_(self.registry.key(NewStyle), NewStyle)
+        self.registry.register(obj)
+        assert self.registry.has(NewStyle)
+    
+    def test_classic_objects(self):
+        obj = Classic()
+        eq_(self.registry.key(obj), Classic)
+        eq_(self.registry.key(Classic), Classic)
+        self.registry.register(obj)
+        assert self.registry[Classic] is obj
+    
+    def test_other_objects_are_keyed_by_type(self):
+        eq_(self.registry.key(None), type(None))
+        eq_(self.registry.key(1), int)
+    
+    def test_id_is_id_of_class(self):
+        eq_(self.registry.id(NewStyle()), id(NewStyle))
+    
+    @raises(KeyError)
+    def test_missing_object(self):
+        self.registry[NewStyle]
+    
+    def test_clear(self):
+        self.registry.register(NewStyle())
+        self.registry.clear()
+        assert NewStyle not in self.registry
+
+class TestScopedRegistry:
+    def setUp(self):
+        self.registry = ScopedRegistry()
+    
+    def test_each_thread_has_its_own_registry(self):
+        obj = NewStyle()
+        self.registry.register(obj)
+        found = []
+        def lookup():
+            found.append(NewStyle in self.registry)
+            self.registry.register(NewStyle())
+        t = threading.Thread(target=lookup)
+        t.start()
+        t.join()
+        eq_(found, [False])
+        assert self.registry[NewStyle] is obj
+    
+    def test_push_and_pop(self):
+        base = self.registry.current()
+        scoped = ObjRegistry()
+        self.registry.push(scoped)
+        obj = NewStyle()
+        self.registry.register(obj)
+        assert scoped[NewStyle] is obj
+        self.registry.clear()
+        assert NewStyle not in scoped
+        assert self.registry.pop() is scoped
+        assert self.registry.current() is base
+    
+    @raises(ValueError)
+    def test_cannot_pop_base_registry(self):
+        self.registry.pop()
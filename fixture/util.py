@@ -5,6 +5,7 @@ import sys
 import unittest
 import types
 import logging
+import threading
 
 __all__ = ['DataTestCase']
 
@@ -43,10 +44,15 @@ class DataTestCase(object):
     def tearDown(self):
         self.data.teardown()
 
+# type(obj) -> True if obj is a class, False if it is an instance, None if 
+# it is an instance of a classic class :
+_type_kinds = {type: True, types.ClassType: True, types.InstanceType: None}
+
 class ObjRegistry:
     """registers objects by class.
     
     all lookup methods expect to get either an instance or a class type.
+    The registry is a dict keyed by class.
     """
     def __init__(self):
         self.registry = {}
@@ -56,41 +62,101 @@ class ObjRegistry:
     
     def __getitem__(self, obj):
         try:
-            return self.registry[self.id(obj)]
+            return self.registry[self.key(obj)]
         except KeyError:
             etype, val, tb = sys.exc_info()
             raise KeyError("object %s is not in registry" % obj), None, tb
     
     def __contains__(self, object):
-        return self.has(object)
+        return self.key(object) in self.registry
     
     def clear(self):
         self.registry = {}
     
     def has(self, object):
-        return self.id(object) in self.registry
+        return self.key(object) in self.registry
+    
+    def key(self, object):
+        """returns the class that identifies object in the registry.
+        
+        Classes identify themselves and instances are identified by their 
+        class.  Every object is one or the other, so no object is rejected.
+        """
+        t = type(object)
+        try:
+            kind = _type_kinds[t]
+        except KeyError:
+            # first time this type is seen, remember if it's a metaclass ...
+            kind = _type_kinds[t] = issubclass(t, type)
+        if kind is False:
+            # instance, i.e. of a DataSet ...
+            return t
+        elif kind:
+            # then it's a class...
+            return object
+        # instance of a classic class ...
+        return object.__class__
     
     def id(self, object):
-        if hasattr(object, '__class__'):
-            if issubclass(object.__class__, type):
-                # then it's a class...
-                cls = object
-            else:
-                # instance ...
-                cls = object.__class__
-        elif type(object)==types.ClassType:
-            # then it's a classic class (no metaclass)...
-            cls = object
-        else:
-            raise ValueError(
-                    "cannot identify object %s because it isn't an "
-                    "instance or a class" % object)
-        return id(cls)
+        """returns id() of the class that identifies object."""
+        return id(self.key(object))
     
     def register(self, object):
-        id = self.id(object)
-        self.registry[id] = object
-        return id
+        key = self.key(object)
+        self.registry[key] = object
+        return key
+
+class ScopedRegistry(object):
+    """an :class:`ObjRegistry` whose storage is scoped to the calling thread.
+    
+    Each thread starts out with its own registry.  Another registry can be 
+    pushed to make it current for the calling thread until it is popped.  
+    :class:`LoadableFixture <fixture.loadable.loadable.LoadableFixture>` does this 
+    when it was created with its own ``dataset_registry``.
+    
+    All other attributes are those of the current registry.
+    """
+    def __init__(self, registryclass=ObjRegistry):
+        self.registryclass = registryclass
+        self._local = threading.local()
+    
+    def __repr__(self):
+        return "<%s at %s for %s>" % (
+                self.__class__.__name__, hex(id(self)), self.current())
+    
+    def __getitem__(self, obj):
+        return self.current()[obj]
+    
+    def __contains__(self, object):
+        return object in self.current()
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.current(), name)
+    
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = [self.registryclass()]
+            return self._local.stack
+    
+    def current(self):
+        """returns the registry in use by the calling thread."""
+        return self._stack()[-1]
+    
+    def push(self, registry):
+        """makes registry current for the calling thread."""
+        self._stack().append(registry)
+    
+    def pop(self):
+        """restores the registry that was current before the last push()."""
+        stack = self._stack()
+        if len(stack) == 1:
+            raise ValueError(
+                "cannot pop the base registry of this thread (%s)" % self)
+        return stack.pop()
 
 def with_debug(*channels, **kw):
     """
@@ -6,6 +6,10 @@ are run, and tears the test database (or schema) down after all tests are run.
 
 import os, sys
 import re
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
 
 from nose.plugins import Plugin
 import nose.case
@@ -15,6 +19,78 @@ os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
 
 SETTINGS_PATH = None
 
+REUSE_TABLE = 'nosedjango_test_db'
+
+def env_flag(value):
+    """Returns True if the value of an environment variable means yes, i.e. 
+    '1' or 'true', and False if it is unset or means no, i.e. '0' or 'false'
+    """
+    return (value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def schema_hash(seed_data=()):
+    """Returns a hash of the installed apps, their models and the rows of 
+    the DataSets to seed a test database with.
+    """
+    from django.conf import settings
+    from django.db import connection
+    from django.db.models import get_models
+    lines = [settings.DATABASE_ENGINE]
+    lines.extend(settings.INSTALLED_APPS)
+    for model in get_models():
+        opts = model._meta
+        lines.append("%s.%s %s" % (opts.app_label, opts.object_name, 
+                                    opts.db_table))
+        for f in opts.local_fields:
+            lines.append("  %s %s %s null=%s unique=%s pk=%s" % (
+                            f.column, f.__class__.__name__, f.db_type(), 
+                            f.null, f.unique, f.primary_key))
+        for f in opts.local_many_to_many:
+            lines.append("  %s %s" % (f.name, f.m2m_db_table()))
+    lines.extend(seed_data_lines(seed_data))
+    return md5("\n".join(lines)).hexdigest()
+
+def seed_data_lines(seed_data):
+    """Returns lines describing the rows of the DataSets named in seed_data 
+    and of the DataSets they reference, which are seeded with them.
+    """
+    from fixture.dataset import DataRow
+    from fixture.loadable.loadable import describe_value
+    lines = []
+    seen = set()
+    pending = [import_dataset(name) for name in seed_data]
+    while pending:
+        ds_class = pending.pop(0)
+        if ds_class in seen:
+            continue
+        seen.add(ds_class)
+        ds = ds_class()
+        lines.append("%s.%s" % (ds_class.__module__, ds_class.__name__))
+        for key, row in ds:
+            if isinstance(row, DataRow):
+                row = row.__class__
+            for name in row.columns():
+                lines.append("  %s.%s=%s" % (
+                            key, name, describe_value(getattr(row, name))))
+        pending.extend(ds.meta.references)
+    return lines
+
+def empty_tables(connection):
+    """Returns the names of the tables that have no rows"""
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    empty = []
+    for table in connection.introspection.table_names():
+        cursor.execute("SELECT COUNT(*) FROM %s" % qn(table))
+        if not cursor.fetchone()[0]:
+            empty.append(table)
+    return empty
+
+def import_dataset(name):
+    """imports a DataSet class from a name like 'package.module.ClassData'"""
+    module_name, class_name = name.rsplit('.', 1)
+    module = __import__(module_name, {}, {}, [class_name])
+    return getattr(module, class_name)
+
 class NoseDjango(Plugin):
     """
     Enable to set up django test environment before running all tests, and
@@ -74,18 +150,120 @@ class NoseDjango(Plugin):
         from django.db import connection
 
         self.old_db = settings.DATABASE_NAME
+        self.reused_db = False
 
         # setup the test env for each test case
         setup_test_environment()
-        connection.creation.create_test_db(verbosity=self.verbosity)
+        if self.options.django_reuse_db:
+            self.reuse_test_db()
+        else:
+            connection.creation.create_test_db(verbosity=self.verbosity)
 
         # exit the setup phase and let nose do it's thing
     
+    def reuse_test_db(self):
+        """Switch to the test database kept from the last run if its hash 
+        matches that of the current models and seed data, otherwise create 
+        it again, seed it with the DataSets given by --django-seed-data and 
+        keep it.
+        
+        Tables that were empty once the database was created and seeded are 
+        emptied again when it is reused, since tests that commit may have 
+        left rows in them.  Rows that tests commit to seeded tables (or to 
+        tables syncdb fills, like those of content types) stay.
+        """
+        from django.conf import settings
+        from django.db import connection, transaction
+        
+        seed_data = [n.strip() for n in 
+                        (self.options.django_seed_data or '').split(',') 
+                            if n.strip()]
+        current_hash = schema_hash(seed_data)
+        
+        if settings.DATABASE_ENGINE == 'sqlite3':
+            test_name = settings.TEST_DATABASE_NAME
+            if not test_name or test_name == ':memory:':
+                sys.stderr.write(
+                    "--django-reuse-db needs TEST_DATABASE_NAME to be a "
+                    "file when using sqlite3; creating a new test database\n")
+                connection.creation.create_test_db(verbosity=self.verbosity)
+                return
+        elif settings.TEST_DATABASE_NAME:
+            test_name = settings.TEST_DATABASE_NAME
+        else:
+            from django.db.backends.creation import TEST_DATABASE_PREFIX
+            test_name = TEST_DATABASE_PREFIX + settings.DATABASE_NAME
+        
+        connection.close()
+        settings.DATABASE_NAME = test_name
+        connection.settings_dict["DATABASE_NAME"] = test_name
+        qn = connection.ops.quote_name
+        kept_hash = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT %s, %s FROM %s" % (
+                        qn('hash'), qn('empty_tables'), qn(REUSE_TABLE)))
+            row = cursor.fetchone()
+            if row:
+                kept_hash, flushed = row[0], row[1].split()
+        except Exception:
+            # no test database yet, or not one of ours
+            transaction.rollback_unless_managed()
+        
+        if kept_hash == current_hash:
+            if self.verbosity >= 1:
+                print "Reusing test database..."
+            if flushed:
+                from django.core.management.color import no_style
+                for sql in connection.ops.sql_flush(no_style(), flushed, []):
+                    cursor.execute(sql)
+                transaction.commit_unless_managed()
+            connection.close()
+            can_rollback = connection.creation._rollback_works()
+            settings.DATABASE_SUPPORTS_TRANSACTIONS = can_rollback
+            connection.settings_dict[
+                            "DATABASE_SUPPORTS_TRANSACTIONS"] = can_rollback
+            self.reused_db = True
+            return
+        
+        connection.close()
+        settings.DATABASE_NAME = self.old_db
+        connection.settings_dict["DATABASE_NAME"] = self.old_db
+        connection.creation.create_test_db(verbosity=self.verbosity, 
+                                           autoclobber=True)
+        if seed_data:
+            from fixture import DjangoFixture
+            data = DjangoFixture().data(*[import_dataset(n) for n in seed_data])
+            data.setup()
+        
+        flushed = empty_tables(connection)
+        cursor = connection.cursor()
+        cursor.execute(
+            "CREATE TABLE %s (%s varchar(32) NOT NULL, %s text NOT NULL)" % (
+                            qn(REUSE_TABLE), qn('hash'), qn('empty_tables')))
+        cursor.execute("INSERT INTO %s (%s, %s) VALUES (%%s, %%s)" % (
+                            qn(REUSE_TABLE), qn('hash'), qn('empty_tables')), 
+                        [current_hash, " ".join(flushed)])
+        transaction.commit_unless_managed()
+        self.reused_db = True
+    
     def options(self, parser, env=os.environ):
         Plugin.options(self, parser, env)
         parser.add_option('--django-settings-path', action="store", help=(
             "Path to where your app's settings.py is stored.  I.E. the directory settings.py lives in."
         ))
+        parser.add_option('--django-reuse-db', action="store_true",
+            default=env_flag(env.get('NOSE_DJANGO_REUSE_DB')), help=(
+            "Keep the test database after the run and reuse it next time "
+            "unless installed apps or models changed.  With sqlite3, "
+            "TEST_DATABASE_NAME must be a file. [NOSE_DJANGO_REUSE_DB]"
+        ))
+        parser.add_option('--django-seed-data', action="store",
+            default=env.get('NOSE_DJANGO_SEED_DATA'), help=(
+            "Comma separated DataSet classes, i.e. app.datasets.UserData, to "
+            "load into a new test database kept by --django-reuse-db. "
+            "[NOSE_DJANGO_SEED_DATA]"
+        ))
             
     def beforeTest(self, test):
 
@@ -139,7 +317,13 @@ class NoseDjango(Plugin):
         from django.test.utils import teardown_test_environment
         from django.db import connection
         from django.conf import settings
-        connection.creation.destroy_test_db(self.old_db, verbosity=self.verbosity)   
+        if self.reused_db:
+            # keep it for the next run
+            connection.close()
+            settings.DATABASE_NAME = self.old_db
+            connection.settings_dict["DATABASE_NAME"] = self.old_db
+        else:
+            connection.creation.destroy_test_db(self.old_db, verbosity=self.verbosity)   
         teardown_test_environment()
 
         if hasattr(self, 'old_urlconf'):